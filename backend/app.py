@@ -1,8 +1,15 @@
+import contextvars
+import json
 import os
+import queue
 import re
-from flask import Flask, jsonify, request
+import threading
+import time
+
+_import_started = time.perf_counter()
+
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from flask_cors import CORS
-from google.cloud import documentai
 
 # --- IMPORT BLUEPRINTS ---
 # Only import the blueprint objects you will actually use.
@@ -11,13 +18,17 @@ from routes.export import export_bp
 from routes.translate import translate_bp
 from routes.upload import upload_bp
 from routes.qa import qa_bp
+from routes.jobs import jobs_bp, init_job_queue
+from routes.portfolio import portfolio_bp
 
 # --- IMPORT ML SERVICES ---
-from ml.embedding_service import (
-    generate_summary_with_gemini,
-    generate_clause_explanations_with_gemini,
-    generate_risk_scores_with_gemini
-)
+from ml.gateway import add_call_listener
+from ml.pipeline import run_analysis_pipeline, has_error_placeholders
+from ml.revisions import analyze_revision
+from services import metrics, registry
+from services.cache import cache_stats
+from services.extraction import extract_document_text
+from services.sessions import create_session, get_session
 
 # --- FLASK APP SETUP ---
 app = Flask(__name__)
@@ -28,16 +39,6 @@ app = Flask(__name__)
 origins_regex = re.compile(r"https?://(localhost:\d+|lexplain-.*\.vercel\.app)")
 CORS(app, origins=origins_regex, supports_credentials=True)
 
-# --- GCP CONFIGURATION ---
-# This is a critical production change.
-# It loads configuration from secure environment variables instead of hardcoding them.
-GCP_PROJECT_ID = os.environ.get("GCP_PROJECT_ID", "lexplain-472504")
-DOCAI_PROCESSOR_ID = os.environ.get("DOCAI_PROCESSOR_ID", "19531a9534629747")
-DOCAI_LOCATION = os.environ.get("DOCAI_LOCATION", "us")
-
-# --- INITIALIZE GOOGLE CLOUD SERVICES ---
-docai_client = documentai.DocumentProcessorServiceClient()
-
 # --- REGISTER BLUEPRINTS WITH /api PREFIX ---
 # This is a critical routing change for consistency.
 # It makes all your API endpoints start with /api (e.g., /api/upload, /api/qa).
@@ -45,6 +46,45 @@ app.register_blueprint(upload_bp, url_prefix='/api/upload')
 app.register_blueprint(qa_bp, url_prefix='/api/qa')
 app.register_blueprint(export_bp, url_prefix='/api/export')
 app.register_blueprint(translate_bp, url_prefix='/api/translate')
+app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
+app.register_blueprint(portfolio_bp, url_prefix='/api/portfolio')
+
+
+# --- REQUEST INSTRUMENTATION ---
+# Every request gets an ID (taken from X-Request-ID when the caller sends a sane one) and, once the
+# response has been sent, one JSON log line with its duration and the time spent in each stage and
+# external call. For streamed responses the line is written when the stream ends.
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+add_call_listener(metrics.record_gemini_call)
+
+
+@app.before_request
+def start_request_timing():
+    request_id = request.headers.get("X-Request-ID", "")
+    g.timings = metrics.start_request(request_id if REQUEST_ID_PATTERN.match(request_id) else None)
+
+
+@app.after_request
+def finish_request_timing(response):
+    timings = g.get("timings")
+    if timings is None:
+        return response
+    response.headers["X-Request-ID"] = timings.request_id
+    # Read everything from the request now; the close callback runs after the request context is gone.
+    method, path = request.method, request.path
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    status = response.status_code
+
+    def log_request():
+        record = timings.log_record(method=method, endpoint=endpoint, path=path, status=status)
+        metrics.http_requests.inc(method=method, endpoint=endpoint, status=status)
+        metrics.http_duration.observe(record["duration_ms"] / 1000, method=method, endpoint=endpoint)
+        print(json.dumps(record), flush=True)
+        metrics.flush()
+
+    response.call_on_close(log_request)
+    return response
 
 
 # --- HEALTH CHECK ROUTE ---
@@ -54,6 +94,47 @@ def home():
     return "Lexplain Backend is running!"
 
 
+@app.route("/metrics")
+def get_metrics():
+    """Prometheus scrape endpoint: request, stage and external call latencies, sizes, tokens, cache hits and errors."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/api/startup")
+def get_startup_report():
+    """Reports how long this worker took to import the app and to construct each external client."""
+    return jsonify(registry.startup_report())
+
+
+@app.route("/api/cache/stats")
+def get_cache_stats():
+    """Reports hit/miss counters for the OCR and Gemini caches in this worker."""
+    return jsonify(cache_stats())
+
+
+# --- DOCUMENT ANALYSIS ---
+def analyze_gcs_document(gcs_uri, mime_type, on_event=None):
+    """Extracts the document text, runs the analysis pipeline and returns the Dashboard payload."""
+    # Step 1: Extract document text locally where possible, with Document AI for scanned pages (cached by file content)
+    with metrics.stage("extract"):
+        extracted_text = extract_document_text(gcs_uri, mime_type)
+    if on_event is not None:
+        on_event("text", {"originalText": extracted_text})
+
+    # Step 2: Summary and clause explanations run concurrently; risk scoring starts once clauses are ready
+    analysis = run_analysis_pipeline(extracted_text, on_event=on_event)
+
+    # Step 3: Keep the text server-side so Q&A, export and translate can refer to it by ID
+    document_id = create_session(extracted_text, analysis)
+
+    return {
+        "documentId": document_id,
+        "summary": analysis["summary"],
+        "originalText": extracted_text,
+        "clauses": analysis["clauses"]
+    }
+
+
 # --- CORE DOCUMENT ANALYSIS ROUTE ---
 @app.route("/api/analyze", methods=["POST"])
 def analyze_document():
@@ -69,29 +150,7 @@ def analyze_document():
         return jsonify({"error": "gcs_uri and mime_type are required fields"}), 400
 
     try:
-        # Step 1: Extract document text with Document AI
-        processor_name = docai_client.processor_path(GCP_PROJECT_ID, DOCAI_LOCATION, DOCAI_PROCESSOR_ID)
-        docai_request = documentai.ProcessRequest(
-            name=processor_name,
-            gcs_document=documentai.GcsDocument(gcs_uri=gcs_uri, mime_type=mime_type),
-        )
-        result = docai_client.process_document(request=docai_request)
-        extracted_text = result.document.text
-
-        # Step 2: Generate summary and clause explanations with Gemini
-        summary_points = generate_summary_with_gemini(extracted_text)
-        clauses = generate_clause_explanations_with_gemini(extracted_text)
-
-        # Step 3: Generate risk scores for each clause
-        clauses_with_risk = generate_risk_scores_with_gemini(clauses)
-
-        dashboard_data = {
-            "summary": summary_points,
-            "originalText": extracted_text,
-            "clauses": clauses_with_risk
-        }
-
-        return jsonify(dashboard_data)
+        return jsonify(analyze_gcs_document(gcs_uri, mime_type))
 
     except Exception as e:
         # This is a critical error handling change.
@@ -99,6 +158,135 @@ def analyze_document():
         print(f"An error occurred during /api/analyze: {e}")
         return jsonify({"error": "An internal server error occurred during analysis."}), 500
 
+
+# --- REVISED DOCUMENT ANALYSIS ROUTE ---
+@app.route("/api/analyze/revision", methods=["POST"])
+def analyze_document_revision():
+    """
+    Analyzes a new version of a previously analyzed document. Only added and modified clauses are
+    sent to Gemini again; the response includes the clause diff against the previous version.
+    """
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "Invalid JSON in request body"}), 400
+
+    gcs_uri = data.get("gcs_uri")
+    mime_type = data.get("mime_type")
+    previous_id = data.get("previousDocumentId")
+
+    if not gcs_uri or not mime_type or not previous_id:
+        return jsonify({"error": "gcs_uri, mime_type and previousDocumentId are required fields"}), 400
+
+    previous = get_session(previous_id)
+    if previous is None:
+        return jsonify({"error": "Previous document session not found or expired. Please analyze it again."}), 404
+
+    try:
+        with metrics.stage("extract"):
+            extracted_text = extract_document_text(gcs_uri, mime_type)
+        analysis, units, revision = analyze_revision(extracted_text, previous)
+        document_id = create_session(extracted_text, analysis, units=units, previousDocumentId=previous_id)
+
+        return jsonify({
+            "documentId": document_id,
+            "previousDocumentId": previous_id,
+            "summary": analysis["summary"],
+            "originalText": extracted_text,
+            "clauses": analysis["clauses"],
+            "revision": revision,
+        })
+
+    except Exception as e:
+        print(f"An error occurred during /api/analyze/revision: {e}")
+        return jsonify({"error": "An internal server error occurred during analysis."}), 500
+
+
+# --- ASYNCHRONOUS ANALYSIS JOBS ---
+# /api/jobs runs the same steps as /api/analyze on background workers. Each step is retried on
+# its own, so a failure in the Gemini stage does not repeat OCR.
+def _job_extract(payload, results, final_attempt):
+    with metrics.stage("extract"):
+        return extract_document_text(payload["gcs_uri"], payload["mime_type"])
+
+
+def _job_analyze(payload, results, final_attempt):
+    analysis = run_analysis_pipeline(results["extract"])
+    # Generators that already succeeded are served from the cache, so a retry only repeats the failed calls.
+    if has_error_placeholders(analysis) and not final_attempt:
+        raise RuntimeError("Analysis returned error placeholders")
+    return analysis
+
+
+def _job_session(payload, results, final_attempt):
+    return create_session(results["extract"], results["analyze"])
+
+
+init_job_queue([
+    ("extract", _job_extract),
+    ("analyze", _job_analyze),
+    ("session", _job_session),
+])
+
+
+# --- STREAMING DOCUMENT ANALYSIS ROUTE ---
+SSE_KEEPALIVE_SECONDS = 15
+
+
+def _sse_event(name, payload):
+    return f"event: {name}\ndata: {json.dumps(payload)}\n\n"
+
+
+@app.route("/api/analyze/stream", methods=["GET", "POST"])
+def analyze_document_stream():
+    """
+    Server-Sent Events variant of /api/analyze. Emits "text", "summary_token", "summary",
+    "clause" and "risk" events as each part is ready, then a "done" event with the same
+    payload /api/analyze returns (or an "error" event). GET with query parameters works with EventSource.
+    """
+    data = request.get_json(silent=True) or request.args
+    gcs_uri = data.get("gcs_uri")
+    mime_type = data.get("mime_type")
+
+    if not gcs_uri or not mime_type:
+        return jsonify({"error": "gcs_uri and mime_type are required fields"}), 400
+
+    events = queue.Queue()
+
+    def run_analysis():
+        try:
+            payload = analyze_gcs_document(gcs_uri, mime_type, on_event=lambda name, data: events.put((name, data)))
+            events.put(("done", payload))
+        except Exception as e:
+            print(f"An error occurred during /api/analyze/stream: {e}")
+            events.put(("error", {"error": "An internal server error occurred during analysis."}))
+
+    # The analysis runs in its own thread so this response can yield events while it progresses.
+    # It runs in a copy of this request's context so its calls are included in the request's timing line.
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(run_analysis,), name="analysis-stream", daemon=True).start()
+
+    def generate():
+        while True:
+            try:
+                name, payload = events.get(timeout=SSE_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                # Comment lines keep proxies from closing an idle connection during long stages.
+                yield ": keep-alive\n\n"
+                continue
+            yield _sse_event(name, payload)
+            if name in ("done", "error"):
+                return
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+registry.record_startup("app_import", time.perf_counter() - _import_started)
+
+
 # --- MAIN EXECUTION BLOCK ---
 if __name__ == "__main__":
     # This is needed for deployment platforms like Render.
@@ -0,0 +1,90 @@
+import io
+import random
+
+# --- SYNTHETIC CONTRACTS ---
+# Deterministic stand-ins for uploaded documents: the same seed always produces the same text,
+# so the fake OCR backend can rebuild a page's text from nothing but the document's bytes.
+
+CLAUSE_TITLES = [
+    "Definitions", "Term", "Payment", "Late Fees", "Termination", "Confidentiality",
+    "Indemnification", "Limitation of Liability", "Warranties", "Intellectual Property",
+    "Non-Compete", "Assignment", "Force Majeure", "Notices", "Governing Law", "Dispute Resolution",
+]
+
+SENTENCES = [
+    "The Tenant shall pay the amount due within thirty (30) days of the invoice date.",
+    "Either party may terminate this Agreement upon written notice to the other party.",
+    "The Receiving Party shall not disclose Confidential Information to any third party.",
+    "The Contractor shall indemnify and hold harmless the Client against all claims and losses.",
+    "In no event shall either party be liable for indirect or consequential damages.",
+    "This Agreement shall be governed by the laws of the State of Delaware.",
+    "Any dispute arising under this Agreement shall be resolved by binding arbitration.",
+    "A late fee of five percent (5%) shall apply to any payment not received when due.",
+    "The Employee agrees not to engage in any competing business for a period of two years.",
+    "All notices shall be in writing and delivered to the addresses set out above.",
+]
+
+
+def synthetic_contract(seed, sections=12, sentences_per_section=4, first_section=1) -> str:
+    """Returns the text of a contract with numbered sections, e.g. "3. Payment" followed by its body."""
+    rng = random.Random(seed)
+    parts = [f"SERVICES AGREEMENT No. {seed}"] if first_section == 1 else []
+    for number in range(first_section, first_section + sections):
+        title = CLAUSE_TITLES[(number - 1) % len(CLAUSE_TITLES)]
+        parts.append(f"{number}. {title}")
+        parts.append(" ".join(rng.choice(SENTENCES) for _ in range(sentences_per_section)))
+    return "\n".join(parts)
+
+
+def synthetic_page(seed, page_number, sections_per_page=2) -> str:
+    """Returns the text of one page of a scanned contract, as the fake OCR backend reads it."""
+    first_section = (page_number - 1) * sections_per_page + 1
+    return synthetic_contract(f"{seed}-p{page_number}", sections=sections_per_page, first_section=first_section)
+
+
+# --- FILE BUILDERS ---
+
+def make_docx(text) -> bytes:
+    from docx import Document
+
+    document = Document()
+    for line in text.split("\n"):
+        document.add_paragraph(line)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def make_scanned_pdf(seed, pages=4) -> bytes:
+    """
+    Returns a PDF whose pages are images with no text layer, so every page is routed to OCR;
+    the seed makes the bytes unique.
+    """
+    from PyPDF2 import PageObject, PdfWriter
+    from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject, NumberObject
+
+    writer = PdfWriter()
+    image = DecodedStreamObject()
+    image.set_data(b"\xff")
+    image.update({
+        NameObject("/Type"): NameObject("/XObject"),
+        NameObject("/Subtype"): NameObject("/Image"),
+        NameObject("/Width"): NumberObject(1),
+        NameObject("/Height"): NumberObject(1),
+        NameObject("/ColorSpace"): NameObject("/DeviceGray"),
+        NameObject("/BitsPerComponent"): NumberObject(8),
+    })
+    image_ref = writer._add_object(image)
+    for _ in range(pages):
+        page = PageObject.create_blank_page(width=612, height=792)
+        contents = DecodedStreamObject()
+        contents.set_data(b"q 612 0 0 792 0 0 cm /Scan Do Q")
+        page[NameObject("/Contents")] = writer._add_object(contents)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/XObject"): DictionaryObject({NameObject("/Scan"): image_ref}),
+        })
+        writer.add_page(page)
+    writer.add_metadata({"/Title": f"Scanned agreement {seed}"})
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
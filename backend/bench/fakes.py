@@ -0,0 +1,327 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+from google.api_core import exceptions as google_exceptions
+
+from bench.documents import synthetic_page
+from services import registry
+
+# --- CONFIGURATION ---
+# Every fake reads FAKE_<SERVICE>_LATENCY_MS, FAKE_<SERVICE>_JITTER_MS and FAKE_<SERVICE>_ERROR_RATE,
+# plus a service-specific size knob. Errors are transient API errors, so they exercise the retry paths.
+FAKE_GCS_DIR = os.environ.get("FAKE_GCS_DIR", "/tmp/lexplain-fake-gcs")
+
+
+class ServiceProfile:
+    """Latency, error rate and response size of one fake backend."""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, size=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.size = size
+
+    @classmethod
+    def from_env(cls, service, latency_ms, size=0):
+        prefix = f"FAKE_{service.upper()}_"
+        return cls(
+            latency_ms=float(os.environ.get(prefix + "LATENCY_MS", latency_ms)),
+            jitter_ms=float(os.environ.get(prefix + "JITTER_MS", latency_ms / 4)),
+            error_rate=float(os.environ.get(prefix + "ERROR_RATE", 0.0)),
+            size=int(os.environ.get(prefix + "SIZE", size)),
+        )
+
+    def simulate(self, service):
+        """Sleeps for one call's latency and raises a transient error at the configured rate."""
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        time.sleep(max(0.0, delay) / 1000)
+        if random.random() < self.error_rate:
+            raise google_exceptions.ServiceUnavailable(f"Injected {service} failure")
+
+
+# --- GEMINI ---
+
+NUMBERED_HEADING = re.compile(r"^\s*(\d+)\.\s+(.+?)\s*$", re.MULTILINE)
+SECTION_MARKER = re.compile(r"^\s*=== Section (\S+) ===\s*$", re.MULTILINE)
+CLAUSE_ID = re.compile(r"^\s*Clause ID:\s*(.+?)\s*$", re.MULTILINE)
+RISK_LEVELS = ("Low", "Medium", "High")
+
+
+def _filler(words, seed):
+    rng = random.Random(seed)
+    vocabulary = ("party", "shall", "agreement", "notice", "payment", "term", "obligation", "liability", "days", "written")
+    return " ".join(rng.choice(vocabulary) for _ in range(words)).capitalize() + "."
+
+
+def _document_text(prompt):
+    parts = prompt.split("---")
+    return parts[1] if len(parts) >= 3 else prompt
+
+
+class FakeGenerativeModel:
+    """Answers each Gemini prompt in the format its parser expects; `size` is the words per generated passage."""
+
+    def __init__(self, model_name, profile):
+        self.model_name = model_name
+        self.profile = profile
+
+    def _respond(self, prompt):
+        words = self.profile.size
+        if '"risk_assessments"' in prompt:
+            assessments = [
+                {"id": clause_id, "risk_level": RISK_LEVELS[int(hashlib.md5(clause_id.encode()).hexdigest(), 16) % 3],
+                 "justification": _filler(min(words, 20), clause_id)}
+                for clause_id in CLAUSE_ID.findall(prompt)
+            ]
+            return json.dumps({"risk_assessments": assessments})
+        if '"section"' in prompt:
+            parts = SECTION_MARKER.split(_document_text(prompt))[1:]
+            clauses = [
+                {"section": section, "id": number, "title": title, "explanation": _filler(words, title)}
+                for section, body in zip(parts[::2], parts[1::2])
+                for number, title in NUMBERED_HEADING.findall(body) or [("1", "General")]
+            ]
+            return json.dumps({"clauses": clauses})
+        if '"clauses"' in prompt:
+            headings = NUMBERED_HEADING.findall(_document_text(prompt)) or [("1", "General")]
+            clauses = [{"id": number, "title": title, "explanation": _filler(words, title)} for number, title in headings]
+            return json.dumps({"clauses": clauses})
+        if "**Question:**" in prompt:
+            return _filler(words, prompt[-200:])
+        if "**Checklist:**" in prompt:
+            return "\n".join(f"- [ ] {_filler(12, i)}" for i in range(max(1, words // 12)))
+        return "\n".join(f"- {_filler(max(5, words // 5), i + len(prompt))}" for i in range(4))
+
+    def _response(self, prompt, text):
+        usage = SimpleNamespace(prompt_token_count=len(prompt) // 4, candidates_token_count=len(text) // 4)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        self.profile.simulate("Gemini")
+        text = self._respond(prompt)
+        if not stream:
+            return self._response(prompt, text)
+        return _FakeStream(self._response(prompt, text), self.profile)
+
+
+class _FakeStream:
+    def __init__(self, response, profile, chunks=8):
+        self.usage_metadata = response.usage_metadata
+        size = max(1, len(response.text) // chunks + 1)
+        self._chunks = [response.text[i:i + size] for i in range(0, len(response.text), size)]
+        self._delay = profile.latency_ms / 1000 / chunks
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            time.sleep(self._delay)
+            yield SimpleNamespace(text=chunk)
+
+
+class FakeGemini:
+    """Stands in for the configured google.generativeai module."""
+
+    def __init__(self, profile, embedding_dim=768):
+        self.profile = profile
+        self.embedding_dim = embedding_dim
+
+    def GenerativeModel(self, model_name):
+        return FakeGenerativeModel(model_name, self.profile)
+
+    def embed_content(self, model, content, task_type=None, request_options=None):
+        self.profile.simulate("Gemini embedding")
+        texts = [content] if isinstance(content, str) else content
+        vectors = []
+        for text in texts:
+            rng = random.Random(hashlib.md5(text.encode("utf-8")).hexdigest())
+            vectors.append([rng.gauss(0.0, 1.0) for _ in range(self.embedding_dim)])
+        return {"embedding": vectors if not isinstance(content, str) else vectors[0]}
+
+
+# --- DOCUMENT AI ---
+
+class FakeDocumentAI:
+    """Returns synthetic OCR text; each page's text is derived from the document bytes, so results are stable."""
+
+    def __init__(self, profile):
+        self.profile = profile
+
+    def process_document(self, request):
+        self.profile.simulate("Document AI")
+        if request.raw_document.content:
+            seed = hashlib.sha256(request.raw_document.content).hexdigest()[:12]
+        else:
+            seed = hashlib.sha256(request.gcs_document.gcs_uri.encode("utf-8")).hexdigest()[:12]
+        pages = list(request.process_options.individual_page_selector.pages) or list(range(1, self.profile.size + 1))
+
+        text, page_layouts = "", []
+        for number in pages:
+            page_text = synthetic_page(seed, number) + "\n"
+            segment = SimpleNamespace(start_index=len(text), end_index=len(text) + len(page_text))
+            layout = SimpleNamespace(text_anchor=SimpleNamespace(text_segments=[segment]))
+            page_layouts.append(SimpleNamespace(page_number=number, layout=layout))
+            text += page_text
+        return SimpleNamespace(document=SimpleNamespace(text=text, pages=page_layouts))
+
+    def batch_process_documents(self, request):
+        """Writes one JSON shard per input document to the (fake) output bucket, as the real service does."""
+        self.profile.simulate("Document AI")
+        bucket_name, _, prefix = request.document_output_config.gcs_output_config.gcs_uri.removeprefix("gs://").partition("/")
+        bucket = registry.get("storage").bucket(bucket_name)
+        statuses = []
+        for number, document in enumerate(request.input_documents.gcs_documents.documents):
+            seed = hashlib.sha256(document.gcs_uri.encode("utf-8")).hexdigest()[:12]
+            text = "".join(synthetic_page(seed, page) + "\n" for page in range(1, self.profile.size + 1))
+            output = f"{prefix.rstrip('/')}/{number}"
+            with bucket.blob(f"{output}/document-0.json").open("wb") as writer:
+                writer.write(json.dumps({"text": text, "shardInfo": {"shardIndex": 0, "shardCount": 1}}).encode("utf-8"))
+            statuses.append(SimpleNamespace(
+                input_gcs_source=document.gcs_uri,
+                output_gcs_destination=f"gs://{bucket_name}/{output}",
+                status=SimpleNamespace(code=0, message=""),
+            ))
+        metadata = SimpleNamespace(individual_process_statuses=statuses)
+        return SimpleNamespace(result=lambda timeout=None: None, metadata=metadata)
+
+
+# --- CLOUD STORAGE ---
+# Objects live in a local directory so every gunicorn worker sees what another one uploaded.
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.path = os.path.join(bucket.root, name)
+
+    @property
+    def md5_hash(self):
+        with open(self.path, "rb") as f:
+            return hashlib.md5(f.read()).hexdigest()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def open(self, mode="wb", if_generation_match=None, **kwargs):
+        self.bucket.profile.simulate("GCS")
+        if if_generation_match == 0 and self.exists():
+            raise google_exceptions.PreconditionFailed(f"{self.name} already exists")
+        return _AtomicWriter(self.path)
+
+    def upload_from_file(self, file_obj, content_type=None):
+        with self.open("wb") as writer:
+            writer.write(file_obj.read())
+
+    def download_as_bytes(self):
+        self.bucket.profile.simulate("GCS")
+        if not self.exists():
+            raise google_exceptions.NotFound(f"{self.name} not found")
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def delete(self):
+        self.bucket.profile.simulate("GCS")
+        os.remove(self.path)
+
+
+class _AtomicWriter:
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self.file = open(self.tmp_path, "wb")
+
+    def write(self, data):
+        return self.file.write(data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.file.close()
+        if exc_type is None:
+            os.replace(self.tmp_path, self.path)
+        else:
+            os.remove(self.tmp_path)
+
+
+class FakeBucket:
+    def __init__(self, name, root, profile):
+        self.name = name
+        self.root = os.path.join(root, name)
+        self.profile = profile
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+    def get_blob(self, name):
+        self.profile.simulate("GCS")
+        blob = FakeBlob(self, name)
+        return blob if blob.exists() else None
+
+    def copy_blob(self, blob, destination_bucket, new_name):
+        with open(blob.path, "rb") as source, destination_bucket.blob(new_name).open("wb") as writer:
+            writer.write(source.read())
+
+
+class FakeStorageClient:
+    def __init__(self, profile, root=None):
+        self.profile = profile
+        self.root = root or FAKE_GCS_DIR
+
+    def bucket(self, name):
+        return FakeBucket(name, self.root, self.profile)
+
+    def list_blobs(self, bucket_name, prefix=None):
+        self.profile.simulate("GCS")
+        bucket = self.bucket(bucket_name)
+        names = []
+        for directory, _, files in os.walk(bucket.root):
+            for filename in files:
+                name = os.path.relpath(os.path.join(directory, filename), bucket.root).replace(os.sep, "/")
+                if not prefix or name.startswith(prefix):
+                    names.append(name)
+        return [FakeBlob(bucket, name) for name in sorted(names)]
+
+
+# --- TRANSLATE ---
+
+class FakeTranslateClient:
+    def __init__(self, profile):
+        self.profile = profile
+
+    def translate(self, values, target_language=None, **kwargs):
+        self.profile.simulate("Translate")
+        return [{"translatedText": f"[{target_language}] {value}", "input": value} for value in values]
+
+
+# --- INSTALLATION ---
+
+def default_profiles():
+    """Latency defaults are rough production medians; override any of them through the environment."""
+    return {
+        "gemini": ServiceProfile.from_env("gemini", latency_ms=800, size=40),
+        "docai": ServiceProfile.from_env("docai", latency_ms=1500, size=4),
+        "storage": ServiceProfile.from_env("gcs", latency_ms=40),
+        "translate": ServiceProfile.from_env("translate", latency_ms=150),
+    }
+
+
+def install(profiles=None):
+    """
+    Registers the fakes in place of the real clients. They are registered as factories rather than
+    instances, so each gunicorn worker still builds its own after the fork.
+    """
+    # The real modules register their factories on import, so import them first to be replaced.
+    import ml.gateway, services.docai, services.storage, services.translation  # noqa: F401
+
+    profiles = profiles or default_profiles()
+    registry.register("gemini", lambda: FakeGemini(profiles["gemini"]))
+    registry.register("docai", lambda: FakeDocumentAI(profiles["docai"]))
+    registry.register("storage", lambda: FakeStorageClient(profiles["storage"]))
+    registry.register("translate", lambda: FakeTranslateClient(profiles["translate"]))
+    registry.reset()
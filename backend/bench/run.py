@@ -0,0 +1,253 @@
+"""
+Load test for the API against local fakes of Gemini, Document AI, GCS and Translate.
+
+Starts gunicorn on bench.wsgi:app, drives upload -> analyze -> qa -> translate -> export checklist
+from concurrent virtual users, reports p50/p95/p99 latency and requests per second per endpoint
+(over the span from its first request to its last response), and compares them with a stored baseline. Run from the backend directory:
+
+    python -m bench.run --concurrency 8 --iterations 5
+    python -m bench.run --save-baseline          # record the current numbers as the baseline
+
+Fake latencies, error rates and sizes come from FAKE_* environment variables (see bench/fakes.py).
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from bench.documents import make_docx, make_scanned_pdf, synthetic_contract
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, "bench", "baseline.json")
+ENDPOINTS = ["upload", "analyze", "qa", "translate", "export"]
+QUESTIONS = [
+    "When is payment due?",
+    "How can the agreement be terminated?",
+    "Which law governs this agreement?",
+    "What happens if a payment is late?",
+]
+DOCX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+PDF_MIME_TYPE = "application/pdf"
+
+
+# --- SERVER ---
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, workdir):
+    """Starts gunicorn with the fakes installed and waits until it answers the health check."""
+    port = _free_port()
+    env = dict(os.environ)
+    env.setdefault("CACHE_DIR", os.path.join(workdir, "cache"))
+    env.setdefault("FAKE_GCS_DIR", os.path.join(workdir, "gcs"))
+    env.setdefault("JOB_DB_PATH", os.path.join(workdir, "jobs.sqlite3"))
+    env.setdefault("METRICS_DIR", os.path.join(workdir, "metrics"))
+    command = [
+        sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+        "--bind", f"127.0.0.1:{port}", "--workers", str(args.workers), "--threads", str(args.threads),
+        "bench.wsgi:app",
+    ]
+    log = open(os.path.join(workdir, "gunicorn.log"), "w")
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {process.returncode}; see {log.name}")
+        try:
+            requests.get(url + "/", timeout=1)
+            return process, url
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start within 60 seconds")
+
+
+# --- WORKLOAD ---
+
+def build_documents(count, document_type):
+    documents = []
+    for index in range(count):
+        if document_type == "scanned-pdf":
+            documents.append((f"scan-{index}.pdf", make_scanned_pdf(f"bench-{index}"), PDF_MIME_TYPE))
+        else:
+            text = synthetic_contract(f"bench-{index}")
+            documents.append((f"contract-{index}.docx", make_docx(text), DOCX_MIME_TYPE))
+    return documents
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {name: [] for name in ENDPOINTS}
+        self.errors = {name: 0 for name in ENDPOINTS}
+        self.spans = {}  # name -> [first request start, last response end]
+        self._lock = threading.Lock()
+
+    def call(self, name, session, method, url, **kwargs):
+        """Times one request; returns the response, or None if it failed."""
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=300, **kwargs)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            response, ok = None, False
+        finished = time.perf_counter()
+        with self._lock:
+            self.samples[name].append(finished - started)
+            span = self.spans.setdefault(name, [started, finished])
+            span[0], span[1] = min(span[0], started), max(span[1], finished)
+            if not ok:
+                self.errors[name] += 1
+        return response if ok else None
+
+
+def run_user(user, args, url, documents, recorder):
+    session = requests.Session()
+    for iteration in range(args.iterations):
+        filename, content, mime_type = documents[(user * args.iterations + iteration) % len(documents)]
+        uploaded = recorder.call("upload", session, "POST", url + "/api/upload/",
+                                 files={"file": (filename, content, mime_type)})
+        if uploaded is None:
+            continue
+        analyzed = recorder.call("analyze", session, "POST", url + "/api/analyze",
+                                 json={"gcs_uri": uploaded.json()["gcs_uri"], "mime_type": mime_type})
+        if analyzed is None:
+            continue
+        document_id = analyzed.json()["documentId"]
+        question = QUESTIONS[iteration % len(QUESTIONS)]
+        recorder.call("qa", session, "POST", url + "/api/qa/", json={"documentId": document_id, "question": question})
+        recorder.call("translate", session, "POST", url + "/api/translate/", json={"documentId": document_id, "target": "es"})
+        recorder.call("export", session, "POST", url + "/api/export/checklist", json={"documentId": document_id})
+
+
+# --- REPORTING ---
+
+def summarize(recorder):
+    report = {}
+    for name in ENDPOINTS:
+        samples = np.asarray(recorder.samples[name]) * 1000
+        if not len(samples):
+            continue
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+        first_start, last_end = recorder.spans[name]
+        report[name] = {
+            "requests": int(len(samples)),
+            "errors": recorder.errors[name],
+            "p50_ms": round(float(p50), 1),
+            "p95_ms": round(float(p95), 1),
+            "p99_ms": round(float(p99), 1),
+            "rps": round(len(samples) / (last_end - first_start), 2),
+        }
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """
+    Returns a list of regressions: p50/p95 latency above, or throughput below, the tolerance band.
+    p99 is reported but not gated on; with a few dozen samples per endpoint it is too noisy.
+    """
+    regressions = []
+    for name, current in report.items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if not previous:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            if current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f"{name} {metric}: {previous[metric]} -> {current[metric]}")
+        if current["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{name} rps: {previous['rps']} -> {current['rps']}")
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{name} errors: {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+def print_report(report, baseline):
+    previous = baseline.get("endpoints", {}) if baseline else {}
+    print(f"{'endpoint':<10}{'requests':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rps':>8}  vs baseline p95")
+    for name, row in report.items():
+        delta = ""
+        if name in previous and previous[name]["p95_ms"]:
+            delta = f"{(row['p95_ms'] / previous[name]['p95_ms'] - 1) * 100:+.0f}%"
+        print(f"{name:<10}{row['requests']:>9}{row['errors']:>8}{row['p50_ms']:>10}{row['p95_ms']:>10}"
+              f"{row['p99_ms']:>10}{row['rps']:>8}  {delta}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=8, help="virtual users running the workflow in parallel")
+    parser.add_argument("--iterations", type=int, default=5, help="workflows run by each virtual user")
+    parser.add_argument("--documents", type=int, default=20, help="distinct documents; fewer means more cache hits")
+    parser.add_argument("--document-type", choices=["docx", "scanned-pdf"], default="docx",
+                        help="docx is extracted locally; scanned-pdf sends every page to (fake) Document AI")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker")
+    parser.add_argument("--url", help="benchmark an already running server instead of starting gunicorn")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write this run's results to --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown before failing")
+    parser.add_argument("--output", help="also write the report as JSON to this path")
+    args = parser.parse_args(argv)
+
+    config = {key: getattr(args, key) for key in ("concurrency", "iterations", "documents", "document_type", "workers", "threads")}
+    documents = build_documents(args.documents, args.document_type)
+
+    with tempfile.TemporaryDirectory(prefix="lexplain-bench-") as workdir:
+        process, url = (None, args.url) if args.url else start_server(args, workdir)
+        try:
+            recorder = Recorder()
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                for future in [pool.submit(run_user, user, args, url, documents, recorder) for user in range(args.concurrency)]:
+                    future.result()
+            wall_seconds = time.perf_counter() - started
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=30)
+
+    report = summarize(recorder)
+    total_requests = sum(row["requests"] for row in report.values())
+    result = {"config": config, "wall_seconds": round(wall_seconds, 2),
+              "total_rps": round(total_requests / wall_seconds, 2), "endpoints": report}
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    print(f"{total_requests} requests in {wall_seconds:.1f}s ({result['total_rps']} req/s)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if baseline is None:
+        return 0
+    if baseline.get("config") != config:
+        print(f"Warning: baseline was recorded with a different configuration: {baseline.get('config')}")
+    regressions = compare(report, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
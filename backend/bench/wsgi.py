@@ -0,0 +1,5 @@
+"""WSGI entry point for load tests: the real app with every external service replaced by a local fake."""
+from bench.fakes import install
+from app import app
+
+install()
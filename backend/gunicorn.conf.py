@@ -0,0 +1,37 @@
+import os
+
+# Picked up automatically by `gunicorn app:app` when started from the backend directory.
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 180))
+
+# Importing the app once in the master lets forked workers share the loaded modules. External clients
+# and the SQLite job store's connections are opened on first use in each worker process, so no socket,
+# gRPC channel or database handle created in the master is used after the fork.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# Construct the external clients in each worker before it accepts traffic, so the first requests
+# do not pay for credential discovery and channel setup. post_worker_init runs after the fork and
+# after the app is loaded, so it works with or without preload_app.
+WARM_UP_SERVICES = os.environ.get("WARM_UP_SERVICES", "true").lower() == "true"
+
+
+def post_worker_init(worker):
+    if not WARM_UP_SERVICES:
+        return
+    from services import registry
+
+    failures = {name: error for name, error in registry.warm_up().items() if error}
+    if failures:
+        worker.log.warning("Worker %s could not warm up: %s", worker.pid, failures)
+    worker.log.info("Worker %s startup: %s", worker.pid, registry.startup_report())
+
+
+def on_starting(server):
+    # Metric snapshots left by a previous server run would otherwise be added to this run's totals.
+    metrics_dir = os.environ.get("METRICS_DIR")
+    if metrics_dir and os.path.isdir(metrics_dir):
+        for name in os.listdir(metrics_dir):
+            if name.endswith(".json"):
+                os.remove(os.path.join(metrics_dir, name))
@@ -1,27 +1,53 @@
-import os
-import google.generativeai as genai
+import functools
 import json
 import re
 
-# --- CONFIGURATION ---
-# The library will automatically look for the API key in this environment variable.
-# Ensure GEMINI_API_KEY is set in your Render environment.
-try:
-    genai.configure(api_key=os.environ["GEMINI_API_KEY"])
-except KeyError:
-    print("FATAL: GEMINI_API_KEY environment variable not set.")
-    # You might want to exit or handle this more gracefully depending on your setup
-    # For now, subsequent calls will fail, which is informative enough.
+from ml.gateway import generate_text, stream_text
+from services import metrics
+from services.cache import content_hash, get_cache
 
+# --- CONFIGURATION ---
+# All Gemini traffic goes through ml/gateway.py, which configures the API key and handles
+# client reuse, rate limits, retries and request coalescing.
 MODEL_NAME = "gemini-2.0-flash-001"
 
+# Bump PROMPT_VERSION whenever a prompt below changes so cached generations from the old prompt are ignored.
+PROMPT_VERSION = "2"
+
+# --- RESPONSE CACHE ---
+
+def _generation_cache_key(func_name, args):
+    return content_hash(func_name, MODEL_NAME, PROMPT_VERSION, json.dumps(args, sort_keys=True))
+
+
+def _cached_generation(is_error):
+    """Caches a generator's result by its inputs, model and prompt version, skipping error placeholders."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            key = _generation_cache_key(func.__name__, args)
+            with metrics.gemini_generator(func.__name__):
+                return get_cache("gemini").get_or_compute(
+                    key, lambda: func(*args), should_cache=lambda result: not is_error(result)
+                )
+        return wrapper
+    return decorator
+
+
+def _parse_bullet_points(summary_text):
+    """Strips bullet markers and empty lines from a bullet-point response."""
+    summary_points = []
+    for point in summary_text.strip().split('\n'):
+        if point.strip():
+            cleaned_point = re.sub(r'^\s*[\*\-\•]+\s*', '', point).strip().strip('*').strip()
+            if cleaned_point:
+                summary_points.append(cleaned_point)
+    return summary_points
+
 # --- CORE FUNCTIONS ---
 
-def generate_summary_with_gemini(text_content):
-    """Generates a summary using the Gemini model with robust cleaning and error handling."""
-    try:
-        model = genai.GenerativeModel(MODEL_NAME)
-        prompt = f"""
+def _summary_prompt(text_content):
+    return f"""
         You are an expert legal assistant. Provide a clear, concise summary of the following legal document as 3 to 5 key bullet points. Do not use markdown formatting like asterisks for bolding.
         **Document Text:**
         ---
@@ -29,25 +55,61 @@ def generate_summary_with_gemini(text_content):
         ---
         **Summary (as bullet points):**
         """
-        response = model.generate_content(prompt)
-        summary_text = response.text.strip()
-        
-        summary_points = []
-        for point in summary_text.split('\n'):
-            if point.strip():
-                cleaned_point = re.sub(r'^\s*[\*\-\•]+\s*', '', point).strip().strip('*').strip()
-                if cleaned_point:
-                    summary_points.append(cleaned_point)
-        return summary_points
+
+
+@_cached_generation(is_error=lambda points: any(p.startswith("Error:") for p in points))
+def generate_summary_with_gemini(text_content):
+    """Generates a summary using the Gemini model with robust cleaning and error handling."""
+    try:
+        response_text = generate_text(_summary_prompt(text_content), MODEL_NAME)
+        return _parse_bullet_points(response_text)
     except Exception as e:
         print(f"Error generating summary with Gemini: {e}")
         return ["Error: Could not generate summary due to an API or processing issue."]
 
 
+def stream_summary_with_gemini(text_content, on_token):
+    """Same as generate_summary_with_gemini, but passes each streamed text chunk to `on_token` as it arrives."""
+    cache = get_cache("gemini")
+    key = _generation_cache_key("generate_summary_with_gemini", (text_content,))
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    try:
+        with metrics.gemini_generator("stream_summary_with_gemini"):
+            response_text = stream_text(_summary_prompt(text_content), MODEL_NAME, on_token)
+        summary_points = _parse_bullet_points(response_text)
+        cache.set(key, summary_points)
+        return summary_points
+    except Exception as e:
+        print(f"Error streaming summary with Gemini: {e}")
+        return ["Error: Could not generate summary due to an API or processing issue."]
+
+
+@_cached_generation(is_error=lambda points: any(p.startswith("Error:") for p in points))
+def merge_summaries_with_gemini(partial_points):
+    """Condenses the summary points of each document section into one 3 to 5 point summary."""
+    try:
+        points_text = "\n".join(f"- {point}" for point in partial_points)
+        prompt = f"""
+        You are an expert legal assistant. The following bullet points summarize consecutive sections of one legal document.
+        Combine them into a clear, concise summary of the whole document as 3 to 5 key bullet points. Do not use markdown formatting like asterisks for bolding.
+        **Section Summaries:**
+        ---
+        {points_text}
+        ---
+        **Summary (as bullet points):**
+        """
+        return _parse_bullet_points(generate_text(prompt, MODEL_NAME))
+    except Exception as e:
+        print(f"Error merging summaries with Gemini: {e}")
+        return ["Error: Could not generate summary due to an API or processing issue."]
+
+
+@_cached_generation(is_error=lambda clauses: any(c.get("id") == "error" for c in clauses))
 def generate_clause_explanations_with_gemini(text_content):
     """Generates clause explanations, ensuring output is valid JSON."""
     try:
-        model = genai.GenerativeModel(MODEL_NAME)
         prompt = f"""
         You are a specialized AI legal assistant. Analyze the provided legal document text, identify distinct clauses, and explain each one in simple language.
         Return the output as a single, valid JSON object with a single key "clauses" which is an array of objects.
@@ -58,8 +120,7 @@ def generate_clause_explanations_with_gemini(text_content):
         ---
         **JSON Output:**
         """
-        response = model.generate_content(prompt)
-        response_text = response.text.strip().lstrip("```json").rstrip("```")
+        response_text = generate_text(prompt, MODEL_NAME).strip().lstrip("```json").rstrip("```")
         data = json.loads(response_text)
         return data.get("clauses", [])
     except (json.JSONDecodeError, Exception) as e:
@@ -67,13 +128,43 @@ def generate_clause_explanations_with_gemini(text_content):
         return [{"id": "error", "title": "Error Processing Clauses", "explanation": "Could not parse clauses from the model's response."}]
 
 
+@_cached_generation(is_error=lambda clauses: any(c.get("id") == "error" for c in clauses))
+def explain_sections_with_gemini(sections):
+    """
+    Generates clause explanations for several separate sections of a document in one call.
+    `sections` is a list of {"section", "text"}; each returned clause carries the "section" it came from.
+    """
+    try:
+        sections_text = "\n".join(f"=== Section {s['section']} ===\n{s['text']}\n" for s in sections)
+        prompt = f"""
+        You are a specialized AI legal assistant. The text below contains several sections of one legal document, each starting with a line "=== Section <number> ===".
+        Within each section, identify distinct clauses and explain each one in simple language.
+        Return the output as a single, valid JSON object with a single key "clauses" which is an array of objects.
+        Each object must have "section" (the number of the section it belongs to), "id", "title", and "explanation" keys.
+        **Sections to Analyze:**
+        ---
+        {sections_text}
+        ---
+        **JSON Output:**
+        """
+        response_text = generate_text(prompt, MODEL_NAME).strip().lstrip("```json").rstrip("```")
+        data = json.loads(response_text)
+        return data.get("clauses", [])
+    except (json.JSONDecodeError, Exception) as e:
+        print(f"Error decoding or getting section clauses from Gemini: {e}")
+        return [{"id": "error", "title": "Error Processing Clauses", "explanation": "Could not parse clauses from the model's response."}]
+
+
+@_cached_generation(is_error=lambda clauses: any(c.get("riskLevel") == "Error" for c in clauses))
 def generate_risk_scores_with_gemini(clauses):
-    """Generates risk scores for a list of clauses."""
+    """Generates risk scores for a list of clauses from their titles and explanations."""
     try:
-        model = genai.GenerativeModel(MODEL_NAME)
         clauses_text_for_prompt = ""
         for clause in clauses:
-            clauses_text_for_prompt += f"Clause ID: {clause['id']}\nTitle: {clause['title']}\n\n"
+            clauses_text_for_prompt += (
+                f"Clause ID: {clause['id']}\nTitle: {clause['title']}\n"
+                f"Content: {clause.get('explanation', '')}\n\n"
+            )
 
         prompt = f"""
         You are a legal risk assessment expert. For each clause in the provided list, assess its potential risk.
@@ -88,8 +179,7 @@ def generate_risk_scores_with_gemini(clauses):
         ---
         **JSON Output:**
         """
-        response = model.generate_content(prompt)
-        response_text = response.text.strip().lstrip("```json").rstrip("```")
+        response_text = generate_text(prompt, MODEL_NAME).strip().lstrip("```json").rstrip("```")
         risk_data = json.loads(response_text)
         risk_assessments = {item['id']: item for item in risk_data.get('risk_assessments', [])}
 
@@ -110,10 +200,10 @@ def generate_risk_scores_with_gemini(clauses):
         return clauses
 
 
+@_cached_generation(is_error=lambda answer: answer.startswith("Error:"))
 def generate_answer_with_gemini(text_content, question):
     """Answers a question based on the provided text."""
     try:
-        model = genai.GenerativeModel(MODEL_NAME)
         prompt = f"""
         You are a helpful legal assistant. Answer a specific question based ONLY on the provided legal document text.
         If the answer is not found in the text, state that clearly. Provide a concise answer.
@@ -125,17 +215,16 @@ def generate_answer_with_gemini(text_content, question):
         {question}
         **Answer:**
         """
-        response = model.generate_content(prompt)
-        return response.text.strip()
+        return generate_text(prompt, MODEL_NAME).strip()
     except Exception as e:
         print(f"Error generating answer with Gemini: {e}")
         return "Error: Could not get an answer due to an API issue."
 
 
+@_cached_generation(is_error=lambda checklist: checklist.startswith("Error:"))
 def generate_checklist_with_gemini(text_content):
     """Generates a checklist from the text using the Gemini API."""
     try:
-        model = genai.GenerativeModel(MODEL_NAME)
         prompt = f"""
         You are an AI assistant specializing in legal document analysis. Your task is to extract an action checklist from the provided document text.
         **Instructions:**
@@ -148,8 +237,7 @@ def generate_checklist_with_gemini(text_content):
         ---
         **Checklist:**
         """
-        response = model.generate_content(prompt)
-        return response.text.strip()
+        return generate_text(prompt, MODEL_NAME).strip()
     except Exception as e:
         print(f"Error generating checklist with Gemini: {e}")
         return "Error: Could not generate checklist due to an API issue."
@@ -0,0 +1,297 @@
+import contextvars
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+
+from google.api_core import exceptions as google_exceptions
+
+from services import registry
+from services.cache import content_hash
+
+# --- CONFIGURATION ---
+# Limits apply per model and per process; divide the project quota by the number of gunicorn workers.
+GEMINI_RPM = float(os.environ.get("GEMINI_RPM", 300))
+GEMINI_TPM = float(os.environ.get("GEMINI_TPM", 1_000_000))
+GEMINI_MAX_CONCURRENCY = int(os.environ.get("GEMINI_MAX_CONCURRENCY", 8))
+GEMINI_MAX_RETRIES = int(os.environ.get("GEMINI_MAX_RETRIES", 4))
+GEMINI_BACKOFF_BASE_SECONDS = float(os.environ.get("GEMINI_BACKOFF_BASE_SECONDS", 1.0))
+GEMINI_BACKOFF_MAX_SECONDS = float(os.environ.get("GEMINI_BACKOFF_MAX_SECONDS", 30.0))
+# Output tokens are unknown before the call, so this much is reserved against the TPM budget.
+GEMINI_OUTPUT_TOKEN_ESTIMATE = int(os.environ.get("GEMINI_OUTPUT_TOKEN_ESTIMATE", 1024))
+
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+
+
+class CallDeadlineExceeded(Exception):
+    """Raised when a call's deadline passes before it could be made or retried; it is not retried."""
+
+
+# --- DEADLINES ---
+# Pipeline stages give the calls made on their behalf a deadline. Each attempt then carries the time
+# left as its request timeout, and rate-limit waits and retries give up once it has passed, so a stage
+# that timed out releases its executor thread instead of holding it for the full retry schedule.
+
+_deadline = contextvars.ContextVar("gemini_deadline", default=None)
+
+
+@contextmanager
+def call_deadline(at):
+    """Applies a time.monotonic() deadline to the Gemini calls made inside the block."""
+    token = _deadline.set(at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _time_left():
+    """Seconds until the current deadline (None without one); raises once it has passed."""
+    at = _deadline.get()
+    if at is None:
+        return None
+    remaining = at - time.monotonic()
+    if remaining <= 0:
+        raise CallDeadlineExceeded("The stage deadline passed before the Gemini call completed")
+    return remaining
+
+
+# --- RATE LIMITING ---
+
+class TokenBucket:
+    """Blocking token bucket refilled continuously at `per_minute` tokens per minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1, deadline=None):
+        """Waits for `amount` tokens; raises CallDeadlineExceeded if they cannot be had before `deadline`."""
+        # Requests larger than the whole bucket are capped so they can still run once it is full.
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                raise CallDeadlineExceeded("The rate limit would delay the call past its deadline")
+            time.sleep(wait)
+
+
+class _ModelLimits:
+    def __init__(self):
+        self.requests = TokenBucket(GEMINI_RPM)
+        self.tokens = TokenBucket(GEMINI_TPM)
+        self.concurrency = threading.BoundedSemaphore(GEMINI_MAX_CONCURRENCY)
+
+
+# --- GATEWAY STATE ---
+
+def _create_client():
+    # Ensure GEMINI_API_KEY is set in your Render environment.
+    import google.generativeai as genai
+
+    try:
+        genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+    except KeyError:
+        print("FATAL: GEMINI_API_KEY environment variable not set.")
+        # Calls will fail and be reported by the generators, which is informative enough.
+    return genai
+
+
+registry.register("gemini", _create_client)
+
+_models = {}
+_limits = {}
+_inflight = {}
+_listeners = []
+_lock = threading.Lock()
+_stats = {"calls": 0, "errors": 0, "retries": 0, "coalesced": 0, "prompt_tokens": 0, "output_tokens": 0}
+
+
+def add_call_listener(listener):
+    """Registers `listener(call_info)`, called after every call with its model, latency, tokens and outcome."""
+    _listeners.append(listener)
+
+
+def gateway_stats():
+    with _lock:
+        return dict(_stats)
+
+
+def _get_model(model_name):
+    # Models are created once per process and reused by every call. They are tied to the client that
+    # made them, so a new client (after fork or a registry override) gets new ones.
+    client = registry.get("gemini")
+    with _lock:
+        cached = _models.get(model_name)
+        if cached is None or cached[0] is not client:
+            cached = (client, client.GenerativeModel(model_name))
+            _models[model_name] = cached
+        return cached[1]
+
+
+def _get_limits(model_name):
+    with _lock:
+        if model_name not in _limits:
+            _limits[model_name] = _ModelLimits()
+        return _limits[model_name]
+
+
+def _record(info):
+    with _lock:
+        _stats["calls"] += 1
+        _stats["errors"] += 0 if info["ok"] else 1
+        _stats["retries"] += info["retries"]
+        _stats["prompt_tokens"] += info["prompt_tokens"]
+        _stats["output_tokens"] += info["output_tokens"]
+    for listener in _listeners:
+        try:
+            listener(info)
+        except Exception as e:
+            print(f"Gemini call listener failed: {e}")
+
+
+def _backoff(attempt):
+    # "Full jitter": a random delay up to the exponential cap spreads out retries from concurrent callers.
+    return random.uniform(0, min(GEMINI_BACKOFF_MAX_SECONDS, GEMINI_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def _usage(response):
+    usage = getattr(response, "usage_metadata", None)
+    return (
+        getattr(usage, "prompt_token_count", 0) or 0,
+        getattr(usage, "candidates_token_count", 0) or 0,
+    )
+
+
+def _call_with_retries(model_name, prompt, operation):
+    """
+    Runs `operation(timeout)` under the model's rate and concurrency limits, retrying transient errors.
+    `timeout` is the time left before the current deadline, or None without one.
+    """
+    limits = _get_limits(model_name)
+    deadline = _deadline.get()
+    started = time.monotonic()
+    retries = 0
+    info = {"model": model_name, "operation": operation.__name__, "retries": 0,
+            "prompt_tokens": 0, "output_tokens": 0, "prompt_chars": len(prompt), "ok": False}
+    try:
+        while True:
+            limits.requests.acquire(deadline=deadline)
+            limits.tokens.acquire(len(prompt) // 4 + GEMINI_OUTPUT_TOKEN_ESTIMATE, deadline=deadline)
+            if not limits.concurrency.acquire(timeout=_time_left()):
+                raise CallDeadlineExceeded("No Gemini call slot became free before the deadline")
+            try:
+                try:
+                    result, response = operation(_time_left())
+                finally:
+                    limits.concurrency.release()
+                info["prompt_tokens"], info["output_tokens"] = _usage(response)
+                info["output_chars"] = len(result) if isinstance(result, str) else 0
+                info["ok"] = True
+                return result
+            except RETRYABLE_ERRORS as e:
+                if retries >= GEMINI_MAX_RETRIES:
+                    raise
+                delay = _backoff(retries)
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    raise
+                retries += 1
+                print(f"Gemini call to {model_name} failed ({type(e).__name__}); retry {retries} in {delay:.1f}s.")
+                time.sleep(delay)
+    finally:
+        info["retries"] = retries
+        info["latency"] = time.monotonic() - started
+        _record(info)
+
+
+# --- PUBLIC API ---
+
+def _request_options(timeout):
+    # Per-request timeout for the SDK; without a deadline the SDK default applies.
+    return {} if timeout is None else {"request_options": {"timeout": timeout}}
+
+
+def generate_text(prompt, model_name):
+    """
+    Returns the text of a single Gemini completion. Identical prompts in flight at the same time
+    share one API call ("single-flight"); errors that survive the retries are raised to the caller.
+    """
+    key = content_hash(model_name, prompt)
+    with _lock:
+        leader = key not in _inflight
+        if leader:
+            _inflight[key] = Future()
+        else:
+            _stats["coalesced"] += 1
+        future = _inflight[key]
+    if not leader:
+        try:
+            return future.result(timeout=_time_left())
+        except FutureTimeoutError:
+            raise CallDeadlineExceeded("The shared Gemini call did not finish before the deadline") from None
+
+    def generate(timeout):
+        response = _get_model(model_name).generate_content(prompt, **_request_options(timeout))
+        return response.text, response
+
+    try:
+        text = _call_with_retries(model_name, prompt, generate)
+        future.set_result(text)
+        return text
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+
+
+def stream_text(prompt, model_name, on_chunk):
+    """Streams a completion, passing each text chunk to `on_chunk`, and returns the full text."""
+
+    def stream(timeout):
+        chunks = []
+        response = _get_model(model_name).generate_content(prompt, stream=True, **_request_options(timeout))
+        try:
+            for chunk in response:
+                if chunk.text:
+                    chunks.append(chunk.text)
+                    on_chunk(chunk.text)
+        except RETRYABLE_ERRORS as e:
+            # Retrying is only safe before any chunk has been handed to the caller.
+            if chunks:
+                raise RuntimeError(f"Gemini stream interrupted after {len(chunks)} chunks") from e
+            raise
+        return "".join(chunks), response
+
+    return _call_with_retries(model_name, prompt, stream)
+
+
+def embed_texts(texts, model_name, task_type):
+    """Returns embeddings for a batch of texts through the same rate limits and retries."""
+
+    def embed(timeout):
+        response = registry.get("gemini").embed_content(
+            model=model_name, content=texts, task_type=task_type, **_request_options(timeout)
+        )
+        return response["embedding"], None
+
+    return _call_with_retries(model_name, "".join(texts), embed)
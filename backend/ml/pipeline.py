@@ -0,0 +1,316 @@
+import os
+import time
+from typing import NamedTuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+
+from ml.embedding_service import (
+    generate_summary_with_gemini,
+    stream_summary_with_gemini,
+    merge_summaries_with_gemini,
+    generate_clause_explanations_with_gemini,
+    generate_risk_scores_with_gemini
+)
+from ml import risk_engine
+from ml.gateway import CallDeadlineExceeded, call_deadline
+from services import metrics
+from utils.segmenter import iter_segments
+
+# --- CONFIGURATION ---
+# The executor is shared by every request in this process, so ANALYSIS_MAX_WORKERS
+# caps the number of Gemini calls that can be in flight from one gunicorn worker.
+ANALYSIS_MAX_WORKERS = int(os.environ.get("ANALYSIS_MAX_WORKERS", 8))
+# A stage's timeout counts from when it starts running, so time spent queued behind other requests'
+# stages does not use it up; the request timeout bounds the whole analysis, queueing included.
+STAGE_TIMEOUT_SECONDS = float(os.environ.get("ANALYSIS_STAGE_TIMEOUT", 120))
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get("ANALYSIS_REQUEST_TIMEOUT", 600))
+RISK_BATCH_SIZE = int(os.environ.get("RISK_BATCH_SIZE", 10))
+# Documents longer than MAP_REDUCE_THRESHOLD_CHARS are split into segments of at most
+# SEGMENT_MAX_CHARS that are analyzed in parallel and merged.
+MAP_REDUCE_THRESHOLD_CHARS = int(os.environ.get("MAP_REDUCE_THRESHOLD_CHARS", 60000))
+SEGMENT_MAX_CHARS = int(os.environ.get("SEGMENT_MAX_CHARS", 20000))
+
+_executor = ThreadPoolExecutor(max_workers=ANALYSIS_MAX_WORKERS, thread_name_prefix="analysis")
+
+
+# --- STAGE SCHEDULER ---
+
+class _Stage:
+    def __init__(self):
+        self.future = None
+        self.deadline = None  # Set when the stage starts running.
+
+
+class StageScheduler:
+    """
+    Runs named pipeline stages on the shared executor. Each stage has `timeout` seconds from when it
+    starts running, and every stage must finish within `request_timeout` of the scheduler's creation.
+    """
+
+    # How often waiters re-check a queued stage, whose deadline is only known once it starts.
+    POLL_SECONDS = 1.0
+
+    def __init__(self, executor=None, timeout=STAGE_TIMEOUT_SECONDS, request_timeout=REQUEST_TIMEOUT_SECONDS):
+        self.executor = executor or _executor
+        self.timeout = timeout
+        self.request_deadline = time.monotonic() + request_timeout
+        self._stages = {}
+
+    def submit(self, name, fn, *args, **kwargs):
+        """
+        Schedules a stage. The Gemini calls it makes carry its deadline, so a stage that times out
+        stops waiting and retrying and frees its executor thread.
+        """
+        stage = _Stage()
+        stage.future = metrics.submit_in_context(self.executor, self._run_stage, stage, name, fn, *args, **kwargs)
+        self._stages[name] = stage
+        return stage.future
+
+    def _run_stage(self, stage, name, fn, *args, **kwargs):
+        stage.deadline = min(time.monotonic() + self.timeout, self.request_deadline)
+        if stage.deadline <= time.monotonic():
+            raise CallDeadlineExceeded(f"The request deadline passed before stage '{name}' started")
+        with metrics.stage(name), call_deadline(stage.deadline):
+            return fn(*args, **kwargs)
+
+    def _deadline(self, stage):
+        return self.request_deadline if stage.deadline is None else stage.deadline
+
+    def result(self, name, fallback):
+        """
+        Waits for a stage until its deadline and returns `fallback()` on timeout. A stage still queued
+        is cancelled; one already running ends on its own once its Gemini calls reach the deadline.
+        """
+        stage = self._stages[name]
+        while True:
+            remaining = self._deadline(stage) - time.monotonic()
+            try:
+                return stage.future.result(timeout=max(min(remaining, self.POLL_SECONDS), 0))
+            except FutureTimeoutError:
+                if time.monotonic() >= self._deadline(stage):
+                    break
+        stage.future.cancel()
+        print(f"Analysis stage '{name}' timed out ({'running' if stage.deadline else 'still queued'}).")
+        return fallback()
+
+    def as_completed(self, names):
+        """Yields stage names as they finish; stages still running at their deadline are yielded last."""
+        pending = {self._stages[name].future: name for name in names}
+        while pending:
+            remaining = max(self._deadline(self._stages[n]) for n in pending.values()) - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = wait(pending, timeout=min(remaining, self.POLL_SECONDS), return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future)
+        for name in names:
+            if name in pending.values():
+                yield name
+
+    def cancel_all(self):
+        """Cancels every stage that has not started yet."""
+        for stage in self._stages.values():
+            stage.future.cancel()
+
+
+# --- PIPELINE ---
+# `on_event(name, payload)` is an optional callback used by the streaming endpoint. It is called
+# with "summary_token", "summary", "clause" and "risk" events as each piece of the analysis is ready.
+# "summary_token" is called from a worker thread, so the callback must be thread-safe.
+
+def _emit(on_event, name, payload):
+    if on_event is not None:
+        on_event(name, payload)
+
+
+def has_error_placeholders(analysis):
+    """True if any stage fell back to an error placeholder instead of a real result."""
+    return (
+        any(point.startswith("Error:") for point in analysis["summary"])
+        or any(clause.get("title", "").startswith("Error Processing Clauses") for clause in analysis["clauses"])
+        or any(clause.get("riskLevel") == "Error" for clause in analysis["clauses"])
+    )
+
+
+def _summary_timeout():
+    return ["Error: Could not generate summary because the request timed out."]
+
+
+def _clauses_timeout():
+    return [{"id": "error", "title": "Error Processing Clauses", "explanation": "The clause analysis timed out."}]
+
+
+def _risk_timeout(clauses):
+    for clause in clauses:
+        clause['riskLevel'] = 'Error'
+        clause['riskJustification'] = 'Risk analysis timed out.'
+    return clauses
+
+
+class RiskPlan(NamedTuple):
+    clauses: list   # copies of the clauses; locally scored ones already carry riskLevel/riskJustification
+    batches: list   # positions in `clauses` of each batch escalated to Gemini
+
+
+def submit_risk_batches(scheduler, clauses, prefix="risk", batch_size=RISK_BATCH_SIZE):
+    """
+    Scores all clauses with the local risk engine in one pass, then schedules Gemini batches for
+    only the clauses it is not confident about.
+    """
+    # Work on copies so a timed-out call cannot mutate clauses we already returned.
+    scored = [dict(c) for c in clauses]
+    uncertain = risk_engine.prescore(scored)
+    batches = [uncertain[i:i + batch_size] for i in range(0, len(uncertain), batch_size)]
+    for index, positions in enumerate(batches):
+        scheduler.submit(f"{prefix}-{index}", generate_risk_scores_with_gemini, [dict(scored[p]) for p in positions])
+    return RiskPlan(scored, batches)
+
+
+def _emit_risk(on_event, clause):
+    _emit(on_event, "risk", {
+        "id": clause.get("id"),
+        "riskLevel": clause.get("riskLevel"),
+        "riskJustification": clause.get("riskJustification")
+    })
+
+
+def collect_risk_batches(scheduler, plan, prefix="risk", on_event=None):
+    """Emits the local scores, then each Gemini batch as it completes; returns the clauses in original order."""
+    clauses = list(plan.clauses)
+    escalated = {position for positions in plan.batches for position in positions}
+    for position, clause in enumerate(clauses):
+        if position not in escalated:
+            _emit_risk(on_event, clause)
+
+    names = [f"{prefix}-{index}" for index in range(len(plan.batches))]
+    for name in scheduler.as_completed(names):
+        positions = plan.batches[names.index(name)]
+        batch = [dict(clauses[p]) for p in positions]
+        scored = scheduler.result(name, fallback=lambda batch=batch: _risk_timeout(batch))
+        risk_engine.record_assessments(scored)
+        for position, clause in zip(positions, scored):
+            clauses[position] = clause
+            _emit_risk(on_event, clause)
+    return clauses
+
+
+def score_risks_in_batches(scheduler, clauses, batch_size=RISK_BATCH_SIZE, on_event=None):
+    """Scores clauses locally where possible and the rest in parallel Gemini batches, in their original order."""
+    plan = submit_risk_batches(scheduler, clauses, batch_size=batch_size)
+    return collect_risk_batches(scheduler, plan, on_event=on_event)
+
+
+def run_analysis_pipeline(extracted_text, scheduler=None, on_event=None):
+    """Runs summary and clause extraction concurrently, then scores clause risk as soon as clauses arrive."""
+    scheduler = scheduler or StageScheduler()
+    if len(extracted_text) > MAP_REDUCE_THRESHOLD_CHARS:
+        return run_map_reduce_pipeline(extracted_text, scheduler, on_event=on_event)
+    try:
+        if on_event is None:
+            scheduler.submit("summary", generate_summary_with_gemini, extracted_text)
+        else:
+            scheduler.submit("summary", stream_summary_with_gemini, extracted_text,
+                             lambda token: on_event("summary_token", {"text": token}))
+        scheduler.submit("clauses", generate_clause_explanations_with_gemini, extracted_text)
+
+        # Risk scoring only depends on the clause list, so it starts while the summary may still be running.
+        risk_plan = RiskPlan([], [])
+        for name in scheduler.as_completed(["summary", "clauses"]):
+            if name == "summary":
+                summary_points = scheduler.result("summary", fallback=_summary_timeout)
+                _emit(on_event, "summary", {"summary": summary_points})
+            else:
+                clauses = scheduler.result("clauses", fallback=_clauses_timeout)
+                for clause in clauses:
+                    _emit(on_event, "clause", clause)
+                risk_plan = submit_risk_batches(scheduler, clauses)
+        clauses_with_risk = collect_risk_batches(scheduler, risk_plan, on_event=on_event)
+    finally:
+        scheduler.cancel_all()
+
+    return {
+        "summary": summary_points,
+        "clauses": clauses_with_risk
+    }
+
+
+# --- MAP-REDUCE PIPELINE FOR LONG DOCUMENTS ---
+
+def submit_summary(scheduler, extracted_text, prefix="summary", max_chars=None):
+    """
+    Schedules a document's summary on its own and returns the stage names to pass to collect_summary().
+    Documents over MAP_REDUCE_THRESHOLD_CHARS are summarized per segment, as in run_map_reduce_pipeline.
+    """
+    if len(extracted_text) <= MAP_REDUCE_THRESHOLD_CHARS:
+        scheduler.submit(prefix, generate_summary_with_gemini, extracted_text)
+        return [prefix]
+    names = []
+    for segment in iter_segments(extracted_text, max_chars=max_chars or SEGMENT_MAX_CHARS):
+        names.append(f"{prefix}-{segment.index}")
+        scheduler.submit(names[-1], generate_summary_with_gemini, segment.text)
+    return names
+
+
+def collect_summary(scheduler, names):
+    partial_summaries = [scheduler.result(name, fallback=_summary_timeout) for name in names]
+    if len(partial_summaries) == 1:
+        return partial_summaries[0]
+    return _reduce_summaries(partial_summaries)
+
+
+def _number_segment_clauses(segment, clauses):
+    """Gives a segment's clauses stable "<segment>-<n>" IDs so they stay unique once merged."""
+    numbered = []
+    for position, clause in enumerate(clauses, start=1):
+        clause = dict(clause)
+        if clause.get("id") == "error":
+            clause["title"] = f"Error Processing Clauses (part {segment.index + 1})"
+        clause["id"] = f"{segment.index + 1}-{position}"
+        numbered.append(clause)
+    return numbered
+
+
+def _reduce_summaries(partial_summaries):
+    points = [p for partial in partial_summaries for p in partial if not p.startswith("Error:")]
+    if not points:
+        return partial_summaries[0] if partial_summaries else _summary_timeout()
+    if len(partial_summaries) == 1:
+        return points
+    return merge_summaries_with_gemini(points)
+
+
+def run_map_reduce_pipeline(extracted_text, scheduler, max_chars=SEGMENT_MAX_CHARS, on_event=None):
+    """Analyzes each structural segment in parallel, then merges clauses and reduces the partial summaries."""
+    segments = list(iter_segments(extracted_text, max_chars=max_chars))
+    try:
+        for segment in segments:
+            scheduler.submit(f"summary-{segment.index}", generate_summary_with_gemini, segment.text)
+            scheduler.submit(f"clauses-{segment.index}", generate_clause_explanations_with_gemini, segment.text)
+
+        # Score each segment's clauses as soon as that segment's extraction finishes.
+        risk_plans = {}
+        clause_stages = [f"clauses-{segment.index}" for segment in segments]
+        for name in scheduler.as_completed(clause_stages):
+            segment = segments[clause_stages.index(name)]
+            clauses = _number_segment_clauses(segment, scheduler.result(name, fallback=_clauses_timeout))
+            for clause in clauses:
+                _emit(on_event, "clause", clause)
+            risk_plans[segment.index] = submit_risk_batches(scheduler, clauses, prefix=f"risk-{segment.index}")
+
+        partial_summaries = [
+            scheduler.result(f"summary-{segment.index}", fallback=_summary_timeout) for segment in segments
+        ]
+        summary_points = _reduce_summaries(partial_summaries)
+        _emit(on_event, "summary", {"summary": summary_points})
+
+        clauses_with_risk = []
+        for segment in segments:
+            clauses_with_risk.extend(collect_risk_batches(
+                scheduler, risk_plans[segment.index], prefix=f"risk-{segment.index}", on_event=on_event
+            ))
+    finally:
+        scheduler.cancel_all()
+
+    return {
+        "summary": summary_points,
+        "clauses": clauses_with_risk
+    }
@@ -0,0 +1,320 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from ml.pipeline import has_error_placeholders, run_analysis_pipeline
+from services import docai
+from services.cache import get_cache
+from services.extraction import DOCX_MIME_TYPE, PDF_MIME_TYPE, extract_text_locally, extraction_cache_key
+from services.sessions import DOCUMENT_ID_PATTERN, create_session, get_session
+from services.storage import list_objects
+
+# --- CONFIGURATION ---
+PORTFOLIO_MAX_DOCUMENTS = int(os.environ.get("PORTFOLIO_MAX_DOCUMENTS", 1000))
+# Documents analyzed at once by this process, across every portfolio. Their Gemini calls still go through
+# the shared analysis executor and the gateway's rate limits, so this bounds how much work queues there
+# (and how much an interactive /api/analyze request has to wait behind) rather than the call rate itself.
+PORTFOLIO_CONCURRENCY = int(os.environ.get("PORTFOLIO_CONCURRENCY", 4))
+# Documents that need OCR are sent to Document AI batch processing in groups of this size, so the first
+# results stream back before the whole portfolio has been through OCR.
+PORTFOLIO_OCR_BATCH_SIZE = int(os.environ.get("PORTFOLIO_OCR_BATCH_SIZE", 25))
+PORTFOLIO_OCR_CONCURRENCY = int(os.environ.get("PORTFOLIO_OCR_CONCURRENCY", 2))
+# An analysis with error placeholders (usually Gemini quota exhaustion outlasting the gateway's retries)
+# is retried after a backoff; generators that succeeded are served from the cache.
+PORTFOLIO_MAX_ATTEMPTS = int(os.environ.get("PORTFOLIO_MAX_ATTEMPTS", 3))
+PORTFOLIO_RETRY_BACKOFF_SECONDS = float(os.environ.get("PORTFOLIO_RETRY_BACKOFF_SECONDS", 10))
+PORTFOLIO_MAX_PORTFOLIOS = int(os.environ.get("PORTFOLIO_MAX_PORTFOLIOS", 100))
+PORTFOLIO_TTL_SECONDS = float(os.environ.get("PORTFOLIO_TTL_SECONDS", 24 * 3600))
+PORTFOLIO_KEEPALIVE_SECONDS = 15
+
+MIME_TYPES_BY_EXTENSION = {
+    ".pdf": PDF_MIME_TYPE,
+    ".docx": DOCX_MIME_TYPE,
+    ".tif": "image/tiff",
+    ".tiff": "image/tiff",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".gif": "image/gif",
+    ".bmp": "image/bmp",
+    ".webp": "image/webp",
+}
+
+SUCCEEDED, FAILED = "succeeded", "failed"
+# Reported, never stored: the document was analyzed but its session was evicted before it could be
+# streamed. Resuming the portfolio once the current run has finished analyzes it again.
+EXPIRED = "expired"
+
+_prepare_executor = ThreadPoolExecutor(max_workers=PORTFOLIO_CONCURRENCY, thread_name_prefix="portfolio-extract")
+_ocr_executor = ThreadPoolExecutor(max_workers=PORTFOLIO_OCR_CONCURRENCY, thread_name_prefix="portfolio-ocr")
+_analysis_executor = ThreadPoolExecutor(max_workers=PORTFOLIO_CONCURRENCY, thread_name_prefix="portfolio-analysis")
+
+
+def _store():
+    return get_cache("portfolios", max_entries=PORTFOLIO_MAX_PORTFOLIOS, ttl_seconds=PORTFOLIO_TTL_SECONDS)
+
+
+# --- INPUTS ---
+
+def guess_mime_type(gcs_uri: str):
+    _, extension = os.path.splitext(gcs_uri.lower())
+    return MIME_TYPES_BY_EXTENSION.get(extension)
+
+
+def resolve_documents(data: dict):
+    """
+    Returns ([{"gcs_uri", "mime_type"}], error_message) from either `gcs_uris` (strings or
+    {"gcs_uri", "mime_type"} objects) or a `gcs_prefix`, whose supported files are all included.
+    """
+    gcs_prefix = data.get("gcs_prefix")
+    if gcs_prefix:
+        if not isinstance(gcs_prefix, str) or not gcs_prefix.startswith("gs://"):
+            return None, "gcs_prefix must be a gs:// URI"
+        entries = [uri for uri in list_objects(gcs_prefix) if guess_mime_type(uri)]
+    else:
+        entries = data.get("gcs_uris")
+        if not isinstance(entries, list) or not entries:
+            return None, "Either gcs_uris (a non-empty list) or gcs_prefix is required"
+
+    documents, seen = [], set()
+    for entry in entries:
+        if isinstance(entry, dict):
+            gcs_uri, mime_type = entry.get("gcs_uri"), entry.get("mime_type")
+        else:
+            gcs_uri, mime_type = entry, None
+        if not isinstance(gcs_uri, str) or not gcs_uri.startswith("gs://"):
+            return None, f"Not a gs:// URI: {gcs_uri!r}"
+        mime_type = mime_type or guess_mime_type(gcs_uri)
+        if not mime_type:
+            return None, f"Unsupported file type: {gcs_uri}"
+        if gcs_uri not in seen:
+            seen.add(gcs_uri)
+            documents.append({"gcs_uri": gcs_uri, "mime_type": mime_type})
+
+    if not documents:
+        return None, "No supported documents found"
+    if len(documents) > PORTFOLIO_MAX_DOCUMENTS:
+        return None, f"A portfolio can contain at most {PORTFOLIO_MAX_DOCUMENTS} documents"
+    return documents, None
+
+
+# --- PROGRESS RECORDS ---
+# A portfolio's progress is kept in the "portfolios" cache: its documents and, for each finished
+# one, its outcome and session ID. The analyses themselves are ordinary sessions.
+
+def create_portfolio(documents: list) -> str:
+    portfolio_id = uuid.uuid4().hex
+    _store().set(portfolio_id, {"documents": documents, "results": {}, "created_at": time.time()})
+    return portfolio_id
+
+
+def get_portfolio(portfolio_id: str):
+    if not portfolio_id or not DOCUMENT_ID_PATTERN.match(portfolio_id):
+        return None
+    return _store().get(portfolio_id)
+
+
+def document_line(result: dict):
+    """The NDJSON line for a finished document; its status is "expired" if its session has since been evicted."""
+    line = {"event": "document", **result}
+    if result["status"] == SUCCEEDED:
+        session = get_session(result["documentId"])
+        if session is None:
+            line.update(status=EXPIRED, error="The analysis expired before it was delivered; resume the portfolio to analyze it again.")
+            return line
+        line["summary"] = session["analysis"]["summary"]
+        line["clauses"] = session["analysis"]["clauses"]
+    return line
+
+
+# --- RUNS ---
+
+class PortfolioRun:
+    """
+    Processes a portfolio's unfinished documents in this process. Documents whose embedded text is
+    usable are analyzed straight away; the rest go through Document AI batch processing in groups.
+    Each outcome is merged into the stored record as soon as it is known, so a resumed run only
+    processes what is left, and runs resumed on other workers at the same time do not overwrite each
+    other. Streams follow the run through stream(), from any point.
+    """
+
+    def __init__(self, portfolio_id, record):
+        self.portfolio_id = portfolio_id
+        self.record = record
+        # Failed documents are retried, and succeeded ones whose session expired are analyzed again. A run
+        # already in progress is reused by resume_portfolio(), so expiries during it take effect on the next run.
+        self.results = sorted(
+            (r for r in record["results"].values() if r["status"] == SUCCEEDED and get_session(r["documentId"])),
+            key=lambda r: r["seq"],
+        )
+        finished = {r["gcsUri"] for r in self.results}
+        self.pending = [d for d in record["documents"] if d["gcs_uri"] not in finished]
+        # Results recorded after this point come from this run or one running concurrently elsewhere.
+        self._baseline_seq = max((r["seq"] for r in record["results"].values()), default=0)
+        self._remaining = len(self.pending)
+        self._changed = threading.Condition()
+
+    @property
+    def done(self):
+        return self._remaining == 0
+
+    def start(self):
+        if self.pending:
+            threading.Thread(target=self._run, name=f"portfolio-{self.portfolio_id[:8]}", daemon=True).start()
+
+    def _run(self):
+        ocr_batch = []
+        futures = [_prepare_executor.submit(self._prepare, document) for document in self.pending]
+        for future in as_completed(futures):
+            document, text = future.result()
+            if text is not None:
+                _analysis_executor.submit(self._analyze, document, text)
+                continue
+            ocr_batch.append(document)
+            if len(ocr_batch) >= PORTFOLIO_OCR_BATCH_SIZE:
+                _ocr_executor.submit(self._ocr, ocr_batch)
+                ocr_batch = []
+        if ocr_batch:
+            _ocr_executor.submit(self._ocr, ocr_batch)
+
+    @staticmethod
+    def _prepare(document):
+        """Returns (document, text) from the extraction cache or the local text layer; text is None if OCR is needed."""
+        try:
+            cache_key = extraction_cache_key(document["gcs_uri"], document["mime_type"])
+            text = get_cache("docai").get(cache_key)
+            if text is None:
+                text = extract_text_locally(document["gcs_uri"], document["mime_type"])
+                if text is not None:
+                    get_cache("docai").set(cache_key, text)
+            return document, text
+        except Exception as e:
+            print(f"Could not prepare {document['gcs_uri']}, leaving it to Document AI: {e}")
+            return document, None
+
+    def _ocr(self, documents):
+        try:
+            texts = docai.batch_parse_documents([(d["gcs_uri"], d["mime_type"]) for d in documents])
+        except Exception as e:
+            print(f"Document AI batch processing failed for portfolio {self.portfolio_id}: {e}")
+            texts = {}
+        for document in documents:
+            text = texts.get(document["gcs_uri"])
+            if text is None:
+                self._finish(document, status=FAILED, error="Text extraction failed.")
+                continue
+            # Stored under the same key as single-document extraction, so /api/analyze reuses it.
+            get_cache("docai").set(extraction_cache_key(document["gcs_uri"], document["mime_type"]), text)
+            _analysis_executor.submit(self._analyze, document, text)
+
+    def _finished_elsewhere(self, document):
+        """True if another worker's run has analyzed the document since this run started."""
+        record = _store().get(self.portfolio_id, fresh=True) or {"results": {}}
+        result = record["results"].get(document["gcs_uri"])
+        return bool(result and result["status"] == SUCCEEDED and result["seq"] > self._baseline_seq)
+
+    def _analyze(self, document, text):
+        try:
+            if self._finished_elsewhere(document):
+                # _finish() adopts the other run's analysis.
+                self._finish(document, status=SUCCEEDED)
+                return
+            for attempt in range(1, PORTFOLIO_MAX_ATTEMPTS + 1):
+                analysis = run_analysis_pipeline(text)
+                if not has_error_placeholders(analysis) or attempt == PORTFOLIO_MAX_ATTEMPTS:
+                    break
+                time.sleep(PORTFOLIO_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+            document_id = create_session(text, analysis)
+            self._finish(document, status=SUCCEEDED, documentId=document_id)
+        except Exception as e:
+            print(f"Portfolio {self.portfolio_id} could not analyze {document['gcs_uri']}: {e}")
+            self._finish(document, status=FAILED, error="An internal server error occurred during analysis.")
+
+    def _finish(self, document, **outcome):
+        gcs_uri = document["gcs_uri"]
+        result = {}
+
+        def merge(record):
+            record = record or self.record
+            existing = record["results"].get(gcs_uri)
+            if existing and existing["status"] == SUCCEEDED and existing["seq"] > self._baseline_seq:
+                # Another worker's run finished this document first; its analysis stands.
+                outcome.clear()
+                outcome.update(status=SUCCEEDED, documentId=existing["documentId"])
+            # Sequence numbers continue from every recorded result, failed ones included, so a retried or
+            # adopted document is always numbered after anything a resuming client has already seen.
+            seq = max((r["seq"] for r in record["results"].values()), default=0) + 1
+            result.update(seq=seq, gcsUri=gcs_uri, **outcome)
+            record["results"][gcs_uri] = dict(result)
+            return record
+
+        # Merged while holding the condition, so this run's results are appended in sequence order.
+        with self._changed:
+            self.record = _store().update(self.portfolio_id, merge)
+            self.results.append(result)
+            self._remaining -= 1
+            if self.done:
+                with _runs_lock:
+                    if _runs.get(self.portfolio_id) is self:
+                        del _runs[self.portfolio_id]
+            self._changed.notify_all()
+
+    def stream(self, after=0):
+        """
+        Yields NDJSON-ready dicts: a "portfolio" header, one "document" line per finished document
+        with a sequence number above `after`, "progress" lines while waiting, and a final "done" line.
+        Documents whose session expired before they were streamed are reported as "expired" and are
+        not counted as succeeded.
+        """
+        total = len(self.record["documents"])
+        yield {"event": "portfolio", "portfolioId": self.portfolio_id, "total": total,
+               "completed": total - self._remaining}
+        position, expired = 0, 0
+        while True:
+            with self._changed:
+                if position == len(self.results) and not self.done:
+                    self._changed.wait(timeout=PORTFOLIO_KEEPALIVE_SECONDS)
+                new, position = self.results[position:], len(self.results)
+                done = self.done
+            if not new and not done:
+                # Keeps proxies from closing the connection while a large batch is in OCR.
+                yield {"event": "progress", "total": total, "completed": total - self._remaining}
+            for result in new:
+                if result["seq"] > after:
+                    line = document_line(result)
+                    expired += line["status"] == EXPIRED
+                    yield line
+            if done:
+                failed = sum(1 for r in self.results if r["status"] == FAILED)
+                yield {"event": "done", "total": total, "succeeded": len(self.results) - failed - expired,
+                       "failed": failed, "expired": expired}
+                return
+
+
+_runs = {}
+_runs_lock = threading.Lock()
+
+
+def start_portfolio(documents: list) -> PortfolioRun:
+    return resume_portfolio(create_portfolio(documents))
+
+
+def resume_portfolio(portfolio_id: str):
+    """Returns the run processing a portfolio in this process, starting one for its unfinished documents if needed."""
+    with _runs_lock:
+        run = _runs.get(portfolio_id)
+        if run is not None:
+            return run
+    record = get_portfolio(portfolio_id)
+    if record is None:
+        return None
+    with _runs_lock:
+        run = _runs.get(portfolio_id)
+        if run is None:
+            run = PortfolioRun(portfolio_id, record)
+            if not run.done:
+                _runs[portfolio_id] = run
+                run.start()
+    return run
@@ -0,0 +1,288 @@
+import difflib
+import os
+import re
+from typing import NamedTuple
+
+from ml.embedding_service import explain_sections_with_gemini
+from ml.pipeline import (
+    SEGMENT_MAX_CHARS,
+    StageScheduler,
+    _clauses_timeout,
+    collect_risk_batches,
+    collect_summary,
+    run_analysis_pipeline,
+    submit_risk_batches,
+    submit_summary,
+)
+from services.cache import content_hash
+from utils.segmenter import split_clauses
+
+# --- CONFIGURATION ---
+# A modified clause is one whose text is at least this similar to the clause it replaces;
+# less similar pairs are reported as one clause removed and another added.
+REVISION_MODIFIED_SIMILARITY = float(os.environ.get("REVISION_MODIFIED_SIMILARITY", 0.5))
+# The summary is regenerated when at least this share of the text changed, or when a change touches a
+# High-risk clause or changes a clause's risk level.
+REVISION_MATERIAL_CHANGE_RATIO = float(os.environ.get("REVISION_MATERIAL_CHANGE_RATIO", 0.1))
+# Above this share of changed clauses, incremental re-analysis saves little; the whole document is re-analyzed.
+REVISION_FULL_REANALYSIS_RATIO = float(os.environ.get("REVISION_FULL_REANALYSIS_RATIO", 0.6))
+
+# Section numbers shift whenever a clause is inserted above, so they are not part of a clause's identity.
+LEADING_NUMBER = re.compile(r"^\s*(?:(?:article|section|clause)\s+)?\d+(?:\.\d+)*[.)]?\s+", re.IGNORECASE)
+TITLE_MATCH_THRESHOLD = 0.5
+# If fewer of a previous analysis's clauses than this can be attributed to units, its results are not reused.
+MIN_ASSIGNED_SHARE = 0.8
+
+UNCHANGED, MODIFIED, ADDED, REMOVED = "unchanged", "modified", "added", "removed"
+
+
+class ClauseUnit(NamedTuple):
+    index: int
+    heading: str
+    text: str
+    fingerprint: str
+
+
+def _normalize(text: str) -> str:
+    return " ".join(LEADING_NUMBER.sub("", text, count=1).split())
+
+
+def clause_units(text: str) -> list:
+    """Splits a document into clause units, each fingerprinted by its number-independent, whitespace-normalized text."""
+    return [
+        ClauseUnit(segment.index, segment.heading, segment.text, content_hash(_normalize(segment.text)))
+        for segment in split_clauses(text)
+    ]
+
+
+def _similarity(a: str, b: str) -> float:
+    return difflib.SequenceMatcher(None, _normalize(a).split(), _normalize(b).split(), autojunk=False).ratio()
+
+
+# --- DIFF ---
+
+def diff_units(old_units, new_units):
+    """
+    Aligns two versions' clause units and returns one change per unit, in document order:
+    {"status", "previousIndex", "index", "heading"} with status unchanged, modified, added or removed.
+    """
+    matcher = difflib.SequenceMatcher(
+        None, [u.fingerprint for u in old_units], [u.fingerprint for u in new_units], autojunk=False
+    )
+    changes = []
+
+    def change(status, old=None, new=None, **extra):
+        unit = new or old
+        changes.append({
+            "status": status,
+            "previousIndex": old.index if old else None,
+            "index": new.index if new else None,
+            "heading": unit.heading,
+            **extra,
+        })
+
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        old_block, new_block = old_units[i1:i2], new_units[j1:j2]
+        if tag == "equal":
+            for old, new in zip(old_block, new_block):
+                change(UNCHANGED, old, new)
+            continue
+        # Pair replaced units in order while they are similar enough to count as edits of each other.
+        pairs = 0
+        for old, new in zip(old_block, new_block):
+            similarity = _similarity(old.text, new.text)
+            if similarity < REVISION_MODIFIED_SIMILARITY:
+                break
+            change(MODIFIED, old, new, similarity=round(similarity, 3))
+            pairs += 1
+        for old in old_block[pairs:]:
+            change(REMOVED, old=old)
+        for new in new_block[pairs:]:
+            change(ADDED, new=new)
+    return changes
+
+
+# --- MAPPING CLAUSES TO UNITS ---
+
+def assign_clauses_to_units(units, clauses):
+    """
+    Attributes each analyzed clause to the unit it came from, by comparing its title with the unit
+    headings and text. Used for documents analyzed as a whole, whose clauses are not linked to units.
+    """
+    assigned = [[] for _ in units]
+    if not units:
+        return assigned
+    heads = [_normalize(unit.heading or unit.text[:120]).lower() for unit in units]
+    bodies = [unit.text.lower() for unit in units]
+    for clause in clauses:
+        title = _normalize(clause.get("title", "")).lower()
+        if not title or clause.get("id") == "error":
+            continue
+        scores = [
+            max(difflib.SequenceMatcher(None, title, head).ratio(), 1.0 if title in body[:200] else 0.0)
+            for head, body in zip(heads, bodies)
+        ]
+        best = max(range(len(units)), key=scores.__getitem__)
+        if scores[best] >= TITLE_MATCH_THRESHOLD:
+            assigned[best].append(clause)
+    return assigned
+
+
+def previous_unit_clauses(session):
+    """
+    Returns (units, clauses per unit) for a stored analysis. The clauses are None when the analysis
+    has no usable clauses, or too few of them can be attributed to a unit to be reused safely.
+    """
+    units = clause_units(session["text"])
+    stored = session.get("units")
+    if stored and [u["fingerprint"] for u in stored] == [u.fingerprint for u in units]:
+        return units, [u["clauses"] for u in stored]
+    clauses = [c for c in session["analysis"].get("clauses", []) if c.get("id") != "error"]
+    if not clauses:
+        return units, None
+    assigned = assign_clauses_to_units(units, clauses)
+    if sum(len(a) for a in assigned) < MIN_ASSIGNED_SHARE * len(clauses):
+        return units, None
+    return units, assigned
+
+
+def _needs_reanalysis(clauses):
+    # A unit no clause was attributed to has no results to reuse.
+    return not clauses or any(
+        c.get("id") == "error" or c.get("title", "").startswith("Error Processing Clauses")
+        or c.get("riskLevel") in ("Error", "Unknown", None)
+        for c in clauses
+    )
+
+
+# --- INCREMENTAL ANALYSIS ---
+
+def _is_large_change(changes, old_units, new_units):
+    changed_chars = 0
+    for c in changes:
+        if c["status"] == MODIFIED:
+            # An edited clause counts only for the share of it that changed.
+            changed_chars += len(new_units[c["index"]].text) * (1 - c["similarity"])
+        elif c["status"] == ADDED:
+            changed_chars += len(new_units[c["index"]].text)
+        elif c["status"] == REMOVED:
+            changed_chars += len(old_units[c["previousIndex"]].text)
+    return changed_chars >= REVISION_MATERIAL_CHANGE_RATIO * max(sum(len(u.text) for u in new_units), 1)
+
+
+def _is_risk_change(changes, old_clauses, new_clauses):
+    for c in changes:
+        if c["status"] == UNCHANGED:
+            continue
+        before = {cl.get("riskLevel") for cl in old_clauses[c["previousIndex"]]} if c["previousIndex"] is not None else set()
+        after = {cl.get("riskLevel") for cl in new_clauses.get(c["index"], [])} if c["index"] is not None else set()
+        if "High" in before | after or (c["status"] == MODIFIED and before != after):
+            return True
+    return False
+
+
+def _batch_units(units, max_chars=SEGMENT_MAX_CHARS):
+    """Groups changed units into batches of at most `max_chars` of text, each explained in one Gemini call."""
+    batches, size = [], 0
+    for unit in units:
+        if not batches or size + len(unit.text) > max_chars:
+            batches.append([])
+            size = 0
+        batches[-1].append(unit)
+        size += len(unit.text)
+    return batches
+
+
+def _split_by_section(batch, clauses):
+    """Attributes a batch's clauses to its units by their "section"; unlabeled clauses follow the previous one."""
+    by_unit = {unit.index: [] for unit in batch}
+    if any(c.get("id") == "error" for c in clauses):
+        for unit in batch:
+            by_unit[unit.index] = [dict(c) for c in clauses]
+        return by_unit
+    current = batch[0].index
+    for clause in clauses:
+        section = str(clause.pop("section", ""))
+        if section.isdigit() and int(section) in by_unit:
+            current = int(section)
+        by_unit[current].append(clause)
+    return by_unit
+
+
+def analyze_revision(text, previous_session, scheduler=None):
+    """
+    Re-analyzes a revised document against a previous version. Only added and modified clauses
+    are explained and risk-scored again; unchanged clauses keep their previous results, and the
+    summary is regenerated only if the changes are material.
+    Returns (analysis, unit_clauses, revision) where revision describes the clause diff.
+    """
+    scheduler = scheduler or StageScheduler()
+    old_units, old_clauses = previous_unit_clauses(previous_session)
+    new_units = clause_units(text)
+    changes = diff_units(old_units, new_units)
+    reused = {} if old_clauses is None else {
+        c["index"]: old_clauses[c["previousIndex"]] for c in changes
+        if c["status"] == UNCHANGED and not _needs_reanalysis(old_clauses[c["previousIndex"]])
+    }
+    to_analyze = [unit for unit in new_units if unit.index not in reused]
+
+    if old_clauses is None or len(to_analyze) > REVISION_FULL_REANALYSIS_RATIO * max(len(new_units), 1):
+        analysis = run_analysis_pipeline(text, scheduler)
+        unit_clauses = assign_clauses_to_units(new_units, analysis["clauses"])
+        return analysis, _units_payload(new_units, unit_clauses), _revision(changes, True, False)
+
+    # A large change is known to be material up front, so its summary runs alongside the clause work.
+    # Summaries go through submit_summary() so long documents are still summarized per segment.
+    material = _is_large_change(changes, old_units, new_units)
+    try:
+        summary_stages = submit_summary(scheduler, text) if material else []
+        batches = _batch_units(to_analyze)
+        for number, batch in enumerate(batches):
+            sections = [{"section": unit.index, "text": unit.text} for unit in batch]
+            scheduler.submit(f"clauses-{number}", explain_sections_with_gemini, sections)
+        new_clauses, fresh = {}, []
+        for number, batch in enumerate(batches):
+            clauses = [dict(c) for c in scheduler.result(f"clauses-{number}", fallback=_clauses_timeout)]
+            new_clauses.update(_split_by_section(batch, clauses))
+        for unit in to_analyze:
+            # Clauses get unique IDs before the changed units are scored together.
+            for position, clause in enumerate(new_clauses[unit.index], start=1):
+                clause["id"] = f"{unit.index}-{position}"
+            fresh.extend(new_clauses[unit.index])
+        scored = iter(collect_risk_batches(scheduler, submit_risk_batches(scheduler, fresh)))
+        for unit in to_analyze:
+            new_clauses[unit.index] = [next(scored) for _ in new_clauses[unit.index]]
+
+        if not material and _is_risk_change(changes, old_clauses, new_clauses):
+            material = True
+            summary_stages = submit_summary(scheduler, text)
+        summary = collect_summary(scheduler, summary_stages) if material else previous_session["analysis"]["summary"]
+    finally:
+        scheduler.cancel_all()
+
+    unit_clauses = [[dict(c) for c in reused[u.index]] if u.index in reused else new_clauses[u.index] for u in new_units]
+    clauses = []
+    for unit_list in unit_clauses:
+        for clause in unit_list:
+            clause["id"] = str(len(clauses) + 1)
+            clauses.append(clause)
+    analysis = {"summary": summary, "clauses": clauses}
+    return analysis, _units_payload(new_units, unit_clauses), _revision(changes, material, True, len(to_analyze))
+
+
+def _units_payload(units, unit_clauses):
+    """The per-unit results stored with the session, so the next revision needs no title matching."""
+    return [{"fingerprint": unit.fingerprint, "clauses": clauses} for unit, clauses in zip(units, unit_clauses)]
+
+
+def _revision(changes, summary_regenerated, incremental, reanalyzed=None):
+    counts = {status: 0 for status in (UNCHANGED, MODIFIED, ADDED, REMOVED)}
+    for c in changes:
+        counts[c["status"]] += 1
+    return {
+        "incremental": incremental,
+        "summaryRegenerated": summary_regenerated,
+        "clausesReanalyzed": reanalyzed if reanalyzed is not None else sum(1 for c in changes if c["index"] is not None),
+        "counts": counts,
+        "changes": changes,
+    }
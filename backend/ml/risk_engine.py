@@ -0,0 +1,299 @@
+"""
+Local clause risk scoring. A lexicon of clause patterns, optionally combined with a classifier
+trained on past Gemini assessments, scores every clause in one pass; only clauses it is not
+confident about are sent to Gemini.
+
+Train the classifier from the assessments the app has recorded (see RISK_EXAMPLES_PATH):
+
+    python -m ml.risk_engine train
+"""
+import argparse
+import json
+import os
+import pickle
+import re
+import threading
+
+import numpy as np
+
+from services import metrics
+from services.cache import CACHE_DIR, content_hash
+
+# --- CONFIGURATION ---
+# Clauses whose top risk level has at least this probability are scored locally; the rest go to Gemini.
+RISK_CONFIDENCE_THRESHOLD = float(os.environ.get("RISK_CONFIDENCE_THRESHOLD", 0.8))
+LOCAL_RISK_ENABLED = os.environ.get("LOCAL_RISK_ENABLED", "true").lower() == "true"
+# Gemini assessments are appended here as training examples; defaults to the shared cache directory.
+RISK_EXAMPLES_PATH = os.environ.get(
+    "RISK_EXAMPLES_PATH", os.path.join(CACHE_DIR, "risk_examples.jsonl") if CACHE_DIR else ""
+)
+RISK_MODEL_PATH = os.environ.get("RISK_MODEL_PATH", os.path.join(os.path.dirname(__file__), "risk_model.pkl"))
+RISK_MIN_TRAINING_EXAMPLES = int(os.environ.get("RISK_MIN_TRAINING_EXAMPLES", 50))
+# How much the lexicon counts against the classifier when both have an opinion.
+LEXICON_WEIGHT = float(os.environ.get("RISK_LEXICON_WEIGHT", 0.5))
+# Matches in the title are stronger evidence than matches in the explanation.
+TITLE_WEIGHT = 2.0
+
+LEVELS = ("Low", "Medium", "High")
+
+# (level, weight, pattern, justification)
+LEXICON = [
+    ("High", 3.0, r"\bunlimited liabilit|\bliabilit\w* (?:is |shall be )?unlimited|\bno (?:cap|limit) on liabilit",
+     "Liability is not capped, so losses could exceed the value of the contract."),
+    ("High", 2.5, r"\bauto(?:matic(?:ally)?)?[- ]?renew|\brenews? automatically|\bevergreen\b",
+     "The agreement renews automatically unless it is cancelled in time."),
+    ("High", 2.5, r"\bpersonal(?:ly)? guarant",
+     "An individual becomes personally liable for the obligations."),
+    ("High", 2.0, r"\bindemnif|\bhold harmless\b",
+     "One party must cover the other's losses and legal claims."),
+    ("High", 2.0, r"\bnon[- ]?compet|\brestrictive covenant|\bnon[- ]?solicit",
+     "Restricts work or business activity after the agreement ends."),
+    ("High", 2.0, r"\bliquidated damages\b|\bpenalt(?:y|ies)\b",
+     "Sets fixed financial penalties for a breach."),
+    ("High", 2.0, r"\bwaive[sd]?\b[^.]*\b(?:rights?|jury|claims?)\b|\bwaiver of (?:jury|rights|claims)",
+     "A party gives up legal rights or remedies."),
+    ("High", 2.0, r"\bsole (?:and absolute )?discretion\b|\bunilateral(?:ly)?\b",
+     "One party can act or change the terms on its own."),
+    ("High", 1.5, r"\birrevocabl|\bperpetual\b",
+     "Grants rights that cannot be withdrawn or never expire."),
+    ("Medium", 1.5, r"\blimitation of liabilit|\bliabilit\w* (?:is |shall be )?(?:capped|limited)\b",
+     "Caps the damages one party can recover."),
+    # Interest and termination are only matched in context: "Conflicts of Interest" or "terminates
+    # automatically at the end of the term" say nothing about late charges or early exit rights.
+    ("Medium", 1.5, r"\blate (?:fee|charge|payment)s?\b|\binterest (?:rate|at \d|of \d|(?:shall |will )?accrue"
+                    r"|(?:is |shall be |will be )?charged|on (?:late|overdue|unpaid|outstanding))"
+                    r"|\b(?:accrue|bear|charge|pay)s? interest\b",
+     "Adds charges for late or missed payments."),
+    ("Medium", 1.5, r"\b(?:may|can|right to|entitled to) terminat|\bterminat\w* (?:for|without|upon|at any time)\b"
+                    r"|\b(?:early )?termination (?:for|without|fee|right)|^\W*(?:\d+\W*)?(?:early )?termination\W*$",
+     "Sets out how and when the agreement can be ended."),
+    ("Medium", 1.5, r"\bconfidential",
+     "Imposes obligations to protect confidential information."),
+    ("Medium", 1.5, r"\bwarrant(?:y|ies)\b|\bas is\b",
+     "Defines what is promised about quality or performance."),
+    ("Medium", 1.5, r"\barbitrat",
+     "Disputes must go to arbitration rather than court."),
+    ("Medium", 1.5, r"\bintellectual property\b|\bownership of (?:work|deliverables)",
+     "Decides who owns the work and ideas produced under the agreement."),
+    ("Medium", 1.0, r"\bassign(?:ment|s)?\b",
+     "Controls whether rights can be transferred to someone else."),
+    ("Medium", 1.0, r"\bdeposit\b",
+     "Money is held and may not be returned in full."),
+    ("Low", 2.5, r"\bheadings?\b|\bcaptions?\b",
+     "Administrative clause about headings; it creates no obligations."),
+    ("Low", 2.5, r"\bcounterparts?\b",
+     "Administrative clause allowing the agreement to be signed in separate copies."),
+    ("Low", 2.5, r"\bseverab",
+     "Standard clause keeping the rest of the agreement valid if one part is not."),
+    ("Low", 2.0, r"\bgoverning law\b|\bchoice of law\b",
+     "Standard clause naming the law that applies to the agreement."),
+    ("Low", 2.0, r"\bentire agreement\b|\bintegration\b",
+     "Standard clause confirming this document is the whole agreement."),
+    ("Low", 2.0, r"\bdefinitions?\b|\binterpretation\b",
+     "Defines terms used elsewhere; it creates no obligations by itself."),
+    ("Low", 1.5, r"\bnotices?\b",
+     "Explains how formal notices must be delivered."),
+    ("Low", 1.5, r"\beffective date\b",
+     "States when the agreement takes effect."),
+    ("Low", 1.0, r"\bforce majeure\b",
+     "Excuses performance during events outside either party's control."),
+]
+_RULES = [(LEVELS.index(level), weight, re.compile(pattern, re.IGNORECASE), why) for level, weight, pattern, why in LEXICON]
+
+
+# --- LEXICON ---
+
+def clause_text(clause) -> str:
+    return f"{clause.get('title', '')}\n{clause.get('explanation', '')}"
+
+
+def lexicon_scores(clauses):
+    """Returns an (n, 3) matrix of Low/Medium/High evidence and, per clause, the strongest rule per level."""
+    scores = np.zeros((len(clauses), len(LEVELS)))
+    reasons = [[None] * len(LEVELS) for _ in clauses]
+    for row, clause in enumerate(clauses):
+        title, explanation = clause.get("title", ""), clause.get("explanation", "")
+        best = [0.0] * len(LEVELS)
+        for level, weight, pattern, why in _RULES:
+            evidence = weight * TITLE_WEIGHT if pattern.search(title) else weight if pattern.search(explanation) else 0.0
+            if evidence:
+                scores[row, level] += evidence
+                if evidence > best[level]:
+                    best[level], reasons[row][level] = evidence, why
+    return scores, reasons
+
+
+def _softmax(scores):
+    exp = np.exp(scores - scores.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+# --- CLASSIFIER ---
+
+_model = None
+_model_mtime = None
+_model_lock = threading.Lock()
+
+
+def _load_model():
+    """Returns the trained classifier, reloading it when the file changes, or None if there is none."""
+    global _model, _model_mtime
+    try:
+        mtime = os.path.getmtime(RISK_MODEL_PATH)
+    except OSError:
+        return None
+    with _model_lock:
+        if mtime != _model_mtime:
+            try:
+                with open(RISK_MODEL_PATH, "rb") as f:
+                    _model = pickle.load(f)
+            except Exception as e:
+                print(f"Could not load risk model from {RISK_MODEL_PATH}: {e}")
+                _model = None
+            _model_mtime = mtime
+        return _model
+
+
+def classifier_probabilities(model, clauses):
+    """Returns an (n, 3) matrix of Low/Medium/High probabilities from the trained classifier."""
+    predicted = model.predict_proba([clause_text(c) for c in clauses])
+    probabilities = np.zeros((len(clauses), len(LEVELS)))
+    for column, label in enumerate(model.classes_):
+        probabilities[:, LEVELS.index(label)] = predicted[:, column]
+    return probabilities
+
+
+# --- SCORING ---
+
+def prescore(clauses, threshold=RISK_CONFIDENCE_THRESHOLD):
+    """
+    Scores all clauses in one pass, setting riskLevel/riskJustification in place on those the local
+    engine is confident about. Returns the indexes of the clauses that still need Gemini.
+    """
+    if not LOCAL_RISK_ENABLED or not clauses:
+        return list(range(len(clauses)))
+
+    scores, reasons = lexicon_scores(clauses)
+    matched = scores.sum(axis=1) > 0
+    probabilities = _softmax(scores)
+    model = _load_model()
+    if model is not None:
+        learned = classifier_probabilities(model, clauses)
+        # Without any lexicon evidence the lexicon is uniform, so the classifier decides alone.
+        weight = np.where(matched, LEXICON_WEIGHT, 0.0)[:, None]
+        probabilities = weight * probabilities + (1 - weight) * learned
+
+    uncertain = []
+    for row, clause in enumerate(clauses):
+        level = int(probabilities[row].argmax())
+        if clause.get("id") == "error" or probabilities[row, level] < threshold:
+            uncertain.append(row)
+            continue
+        clause["riskLevel"] = LEVELS[level]
+        # A rule's justification is only given when the lexicon itself points to this level; when the
+        # classifier outweighed it, the rule that matched explains some other level.
+        lexicon_level = int(scores[row].argmax()) if matched[row] else None
+        clause["riskJustification"] = (
+            reasons[row][level] if lexicon_level == level
+            else f"Resembles clauses previously assessed as {LEVELS[level]} risk."
+        )
+        metrics.risk_decisions.inc(source="local", level=LEVELS[level])
+    return uncertain
+
+
+# --- TRAINING DATA ---
+
+_examples_lock = threading.Lock()
+_recorded = set()
+
+
+def record_assessments(clauses):
+    """Appends Gemini's assessments to RISK_EXAMPLES_PATH so the classifier can be retrained on them."""
+    examples = []
+    for clause in clauses:
+        level = clause.get("riskLevel")
+        if level not in LEVELS:
+            continue
+        metrics.risk_decisions.inc(source="gemini", level=level)
+        key = content_hash(clause_text(clause), level)
+        if key in _recorded:
+            continue
+        if len(_recorded) >= 100_000:
+            _recorded.clear()
+        _recorded.add(key)
+        examples.append({"title": clause.get("title", ""), "explanation": clause.get("explanation", ""), "riskLevel": level})
+    if not examples or not RISK_EXAMPLES_PATH:
+        return
+    try:
+        os.makedirs(os.path.dirname(RISK_EXAMPLES_PATH) or ".", exist_ok=True)
+        with _examples_lock, open(RISK_EXAMPLES_PATH, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(example) + "\n" for example in examples))
+    except OSError as e:
+        print(f"Could not record risk assessments: {e}")
+
+
+def load_examples(path=RISK_EXAMPLES_PATH):
+    """Returns the recorded examples, keeping the latest assessment of each distinct clause."""
+    latest = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                example = json.loads(line)
+            except ValueError:
+                continue
+            latest[clause_text(example)] = example
+    return list(latest.values())
+
+
+def build_classifier():
+    from sklearn.feature_extraction.text import HashingVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+
+    # Hashing keeps the model small and needs no vocabulary, so new clause wording costs nothing to vectorize.
+    return make_pipeline(
+        HashingVectorizer(n_features=2 ** 18, ngram_range=(1, 2), alternate_sign=False, norm="l2"),
+        LogisticRegression(max_iter=1000, class_weight="balanced"),
+    )
+
+
+def train_classifier(examples):
+    """Fits the classifier on recorded examples and returns (model, held-out accuracy or None)."""
+    order = np.random.RandomState(0).permutation(len(examples))
+    texts = [clause_text(examples[i]) for i in order]
+    labels = [examples[i]["riskLevel"] for i in order]
+    if len(set(labels)) < 2:
+        raise ValueError("Training needs examples of at least two risk levels")
+
+    accuracy = None
+    if len(examples) >= 2 * RISK_MIN_TRAINING_EXAMPLES:
+        held_out = len(examples) // 5
+        model = build_classifier().fit(texts[held_out:], labels[held_out:])
+        accuracy = float(np.mean(model.predict(texts[:held_out]) == np.asarray(labels[:held_out])))
+    return build_classifier().fit(texts, labels), accuracy
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the local clause risk classifier.")
+    parser.add_argument("command", choices=["train"])
+    parser.add_argument("--examples", default=RISK_EXAMPLES_PATH)
+    parser.add_argument("--model", default=RISK_MODEL_PATH)
+    args = parser.parse_args(argv)
+
+    if not args.examples or not os.path.exists(args.examples):
+        parser.error("no recorded examples; set RISK_EXAMPLES_PATH (or CACHE_DIR) and analyze some documents first")
+    examples = load_examples(args.examples)
+    if len(examples) < RISK_MIN_TRAINING_EXAMPLES:
+        parser.error(f"only {len(examples)} examples recorded; at least {RISK_MIN_TRAINING_EXAMPLES} are needed")
+
+    model, accuracy = train_classifier(examples)
+    tmp_path = f"{args.model}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(model, f)
+    os.replace(tmp_path, args.model)
+    print(f"Trained on {len(examples)} examples" + (f"; held-out accuracy {accuracy:.2f}" if accuracy is not None else ""))
+    print(f"Model written to {args.model}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,18 @@
 from flask import Blueprint, request, jsonify, Response
 from ml.embedding_service import generate_checklist_with_gemini
+from services.sessions import resolve_document_text
 
 export_bp = Blueprint('export', __name__)
 
 @export_bp.route('/checklist', methods=['POST'])
 def export_checklist():
     data = request.get_json()
-    text_content = data.get("textContent")
+    text_content, session_error = resolve_document_text(data)
 
+    if session_error:
+        return jsonify({"error": session_error}), 404
     if not text_content:
-        return jsonify({"error": "Document text is required"}), 400
+        return jsonify({"error": "A documentId or the document text is required"}), 400
 
     try:
         checklist_text = generate_checklist_with_gemini(text_content)
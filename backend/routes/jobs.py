@@ -0,0 +1,74 @@
+from flask import Blueprint, request, jsonify
+from services.jobs import JobQueue, QueueFullError, create_job_store, SUCCEEDED, FAILED
+
+jobs_bp = Blueprint('jobs', __name__)
+job_queue = None
+
+def init_job_queue(stages):
+    """Creates the process-wide job queue; called once by app.py with the analysis stages."""
+    global job_queue
+    job_queue = JobQueue(create_job_store(), stages)
+    return job_queue
+
+@jobs_bp.before_app_request
+def start_job_workers():
+    # Workers start on the first request rather than at import so they are created after gunicorn forks.
+    if job_queue is not None:
+        job_queue.start()
+
+def _job_status(job):
+    return {
+        "jobId": job["id"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "attempts": job["attempts"],
+        "error": job["error"],
+    }
+
+@jobs_bp.route('/', methods=['POST'])
+def submit_job():
+    """Queues a document for analysis and returns immediately with a job ID."""
+    data = request.get_json(silent=True) or {}
+    gcs_uri = data.get("gcs_uri")
+    mime_type = data.get("mime_type")
+
+    if not gcs_uri or not mime_type:
+        return jsonify({"error": "gcs_uri and mime_type are required fields"}), 400
+
+    try:
+        job_id = job_queue.submit({"gcs_uri": gcs_uri, "mime_type": mime_type})
+    except QueueFullError:
+        response = jsonify({"error": "The analysis queue is full. Please try again shortly."})
+        response.headers["Retry-After"] = "30"
+        return response, 429
+    except Exception as e:
+        print(f"An error occurred during /jobs submit: {e}")
+        return jsonify({"error": "An internal server error occurred while queueing the job."}), 500
+
+    return jsonify({"jobId": job_id, "status": "queued"}), 202
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(_job_status(job))
+
+@jobs_bp.route('/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Returns the same payload as /api/analyze once the job has succeeded."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job["status"] == FAILED:
+        return jsonify({**_job_status(job), "error": job["error"] or "The analysis failed."}), 500
+    if job["status"] != SUCCEEDED:
+        return jsonify(_job_status(job)), 202
+
+    results = job["results"]
+    return jsonify({
+        "documentId": results["session"],
+        "summary": results["analyze"]["summary"],
+        "originalText": results["extract"],
+        "clauses": results["analyze"]["clauses"]
+    })
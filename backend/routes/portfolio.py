@@ -0,0 +1,46 @@
+import json
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from ml.portfolio import resolve_documents, resume_portfolio, start_portfolio
+
+portfolio_bp = Blueprint('portfolio', __name__)
+
+def _ndjson_response(run, after=0):
+    def generate():
+        for line in run.stream(after=after):
+            yield json.dumps(line) + "\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Portfolio-ID": run.portfolio_id}
+    )
+
+@portfolio_bp.route('/', methods=['POST'])
+def analyze_portfolio():
+    """
+    Analyzes many documents at once, given as `gcs_uris` or a `gcs_prefix`. Streams one NDJSON line
+    per document as it finishes; the first line carries the portfolioId used to resume.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        documents, error = resolve_documents(data)
+    except Exception as e:
+        print(f"An error occurred while listing the portfolio: {e}")
+        return jsonify({"error": "An internal server error occurred while listing the documents."}), 500
+    if error:
+        return jsonify({"error": error}), 400
+
+    return _ndjson_response(start_portfolio(documents))
+
+@portfolio_bp.route('/<portfolio_id>', methods=['GET'])
+def resume_portfolio_stream(portfolio_id):
+    """
+    Reconnects to a portfolio. Documents finished with a sequence number above `after` are sent
+    again, and unfinished ones are processed if no run in this worker is already doing so.
+    """
+    after = request.args.get("after", 0, type=int)
+    run = resume_portfolio(portfolio_id)
+    if run is None:
+        return jsonify({"error": "Portfolio not found or expired"}), 404
+    return _ndjson_response(run, after=after)
@@ -1,5 +1,7 @@
 from flask import Blueprint, request, jsonify
 from ml.embedding_service import generate_answer_with_gemini
+from services.sessions import resolve_document
+from services.vector_search import retrieve_context
 
 qa_bp = Blueprint('qa', __name__)
 
@@ -7,13 +9,17 @@ qa_bp = Blueprint('qa', __name__)
 def qa():
     data = request.get_json()
     question = data.get("question")
-    text_content = data.get("textContent")
+    text_content, text_hash, session_error = resolve_document(data)
 
+    if session_error:
+        return jsonify({"error": session_error}), 404
     if not question or not text_content:
-        return jsonify({"error": "A question and the document text are required"}), 400
+        return jsonify({"error": "A question and a documentId or the document text are required"}), 400
 
     try:
-        answer = generate_answer_with_gemini(text_content, question)
+        # Only the passages most relevant to the question are sent, so prompt size no longer grows with the document.
+        context = retrieve_context(text_content, question, text_hash=text_hash)
+        answer = generate_answer_with_gemini(context, question)
         return jsonify({"answer": answer})
     except Exception as e:
         print(f"An error occurred during /qa: {e}")
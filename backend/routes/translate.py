@@ -1,8 +1,8 @@
 from flask import Blueprint, request, jsonify
-from google.cloud import translate_v2 as translate
+from services.sessions import get_session, translatable_texts
+from services.translation import translate_texts
 
 translate_bp = Blueprint('translate', __name__)
-translate_client = translate.Client()
 
 @translate_bp.route('/', methods=['POST'])
 def translate_text():
@@ -10,12 +10,20 @@ def translate_text():
     texts_to_translate = data.get("texts")
     target_language = data.get("target")
 
+    # With a documentId the texts come from the stored analysis, in the same order the Dashboard builds them.
+    document_id = data.get("documentId")
+    if document_id and not texts_to_translate:
+        session = get_session(document_id)
+        if session is None:
+            return jsonify({"error": "Document session not found or expired. Please analyze the document again."}), 404
+        texts_to_translate = translatable_texts(session["analysis"])
+
     if not texts_to_translate or not target_language:
-        return jsonify({"error": "A list of texts and a target language are required"}), 400
+        return jsonify({"error": "A list of texts or a documentId, and a target language are required"}), 400
 
     try:
-        result = translate_client.translate(texts_to_translate, target_language=target_language)
-        translated_texts = [item['translatedText'] for item in result]
+        # Deduplicated, cached and split into batches within the API's per-request limits.
+        translated_texts = translate_texts(texts_to_translate, target_language)
         return jsonify({"translated_texts": translated_texts})
     except Exception as e:
         print(f"An error occurred during /translate: {e}")
@@ -1,51 +1,121 @@
+import hashlib
 import os
 import uuid
 from flask import Blueprint, request, jsonify
-from google.cloud import storage
+from google.api_core.exceptions import PreconditionFailed
 from werkzeug.utils import secure_filename
+from services import metrics
+from services.storage import get_bucket
 
 # --- CONFIGURATION ---
-GCP_PROJECT_ID = os.environ.get("GCP_PROJECT_ID", "lexplain-472504")
 GCS_BUCKET_NAME = os.environ.get("GCS_BUCKET_NAME", "lexplain-storage")
+# Resumable upload chunk size; GCS requires a multiple of 256 KiB. At most one chunk is held in memory.
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))
+READ_SIZE = 256 * 1024
 
-# --- INITIALIZE SERVICES ---
-storage_client = storage.Client(project=GCP_PROJECT_ID)
+DOCUMENT_MIME_TYPES = {
+    "application/pdf": ".pdf",
+    "application/msword": ".doc",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": ".docx",
+}
 
 # --- BLUEPRINT SETUP ---
 upload_bp = Blueprint('upload', __name__)
 
-def upload_to_gcs(file_obj, filename, content_type):
-    """Core logic to upload a file object to a GCS bucket."""
-    bucket = storage_client.get_bucket(GCS_BUCKET_NAME)
-    blob = bucket.blob(filename)
-    blob.upload_from_file(file_obj, content_type=content_type)
-    return f"gs://{GCS_BUCKET_NAME}/{filename}", content_type
+def _hash_stream(stream):
+    digest = hashlib.sha256()
+    for block in iter(lambda: stream.read(READ_SIZE), b""):
+        digest.update(block)
+    return digest.hexdigest()
+
+def _stream_to_blob(stream, blob, content_type, **upload_kwargs):
+    """Streams a file object into a blob in resumable chunks, hashing the bytes as they pass through."""
+    digest = hashlib.sha256()
+    with metrics.external_call("gcs", "upload", input_size=0) as call:
+        with blob.open("wb", chunk_size=UPLOAD_CHUNK_SIZE, content_type=content_type, ignore_flush=True, **upload_kwargs) as writer:
+            for block in iter(lambda: stream.read(READ_SIZE), b""):
+                digest.update(block)
+                writer.write(block)
+                call["input_size"] += len(block)
+    return digest.hexdigest()
+
+def _get_blob(bucket, object_name):
+    with metrics.external_call("gcs", "get_blob"):
+        return bucket.get_blob(object_name)
+
+def upload_to_gcs(file_obj, file_extension, content_type, bucket=None):
+    """
+    Uploads a file under a content-addressed name (documents/<sha256><ext>) and returns
+    (gcs_uri, content_type, deduplicated). If identical content is already stored, nothing is uploaded.
+    """
+    bucket = bucket or get_bucket(GCS_BUCKET_NAME)
+
+    if file_obj.seekable():
+        # Multipart uploads are spooled by werkzeug, so hashing first is a cheap local pass
+        # that lets duplicates skip the upload entirely.
+        content_hash = _hash_stream(file_obj)
+        object_name = f"documents/{content_hash}{file_extension}"
+        if _get_blob(bucket, object_name) is not None:
+            return f"gs://{bucket.name}/{object_name}", content_type, True
+        file_obj.seek(0)
+        try:
+            # if_generation_match=0 makes the write fail rather than overwrite if another request stored it first.
+            _stream_to_blob(file_obj, bucket.blob(object_name), content_type, if_generation_match=0)
+        except PreconditionFailed:
+            return f"gs://{bucket.name}/{object_name}", content_type, True
+        return f"gs://{bucket.name}/{object_name}", content_type, False
+
+    # A raw request body can only be read once, so it is streamed to a staging object while
+    # hashing and then moved to its content-addressed name with a server-side copy.
+    staging = bucket.blob(f"incoming/{uuid.uuid4()}{file_extension}")
+    content_hash = _stream_to_blob(file_obj, staging, content_type)
+    object_name = f"documents/{content_hash}{file_extension}"
+    try:
+        deduplicated = _get_blob(bucket, object_name) is not None
+        if not deduplicated:
+            with metrics.external_call("gcs", "copy"):
+                bucket.copy_blob(staging, bucket, object_name)
+    finally:
+        # Removed even if the copy failed, so a failed upload leaves no staging object behind.
+        with metrics.external_call("gcs", "delete"):
+            staging.delete()
+    return f"gs://{bucket.name}/{object_name}", content_type, deduplicated
 
 @upload_bp.route("/", methods=["POST", "OPTIONS"])
 def upload_file():
-    """Handles file uploads, creating a secure, unique filename."""
+    """
+    Handles file uploads, storing each distinct file once under its content hash.
+    Accepts a multipart "file" field, or the raw document as the request body with a document Content-Type.
+    """
     if request.method == "OPTIONS": # Handle preflight request
         return jsonify(success=True)
-    
-    if "file" not in request.files:
-        return jsonify({"error": "No file part in the request"}), 400
 
-    file = request.files["file"]
-    if file.filename == "":
-        return jsonify({"error": "No file selected for uploading"}), 400
+    if request.mimetype in DOCUMENT_MIME_TYPES:
+        file_stream = request.stream
+        content_type = request.mimetype
+        file_extension = DOCUMENT_MIME_TYPES[content_type]
+    else:
+        if "file" not in request.files:
+            return jsonify({"error": "No file part in the request"}), 400
+
+        file = request.files["file"]
+        if file.filename == "":
+            return jsonify({"error": "No file selected for uploading"}), 400
+
+        file_stream = file.stream
+        content_type = file.content_type
+        # Taken from the content type where possible and lowercased otherwise, so "x.PDF" and "x.pdf"
+        # with identical bytes get the same content-addressed name.
+        file_extension = DOCUMENT_MIME_TYPES.get(content_type) or os.path.splitext(secure_filename(file.filename))[1].lower()
 
     try:
-        # Secure the filename and make it unique to prevent overwrites
-        original_filename = secure_filename(file.filename)
-        file_extension = os.path.splitext(original_filename)[1]
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
+        gcs_uri, mime_type, deduplicated = upload_to_gcs(file_stream, file_extension, content_type)
 
-        gcs_uri, mime_type = upload_to_gcs(file, unique_filename, file.content_type)
-        
         return jsonify({
             "message": "File uploaded successfully to GCS.",
             "gcs_uri": gcs_uri,
-            "mime_type": mime_type
+            "mime_type": mime_type,
+            "deduplicated": deduplicated
         })
     except Exception as e:
         print(f"An error occurred during upload: {str(e)}")
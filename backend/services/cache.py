@@ -0,0 +1,293 @@
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from services import metrics
+
+# --- CONFIGURATION ---
+# The disk tier is optional: leave CACHE_DIR unset to keep everything in memory.
+# When set (e.g. to a volume shared by all gunicorn workers) entries survive worker restarts.
+CACHE_DIR = os.environ.get("CACHE_DIR")
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 512))
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", 128 * 1024 * 1024))
+CACHE_TTL_SECONDS = float(os.environ.get("CACHE_TTL_SECONDS", 7 * 24 * 3600))
+# Per-namespace bound on the disk tier. Expired files are swept, and the entries closest to expiring
+# evicted past this size, at most once per CACHE_SWEEP_SECONDS by whichever worker writes next.
+CACHE_DISK_MAX_BYTES = int(os.environ.get("CACHE_DISK_MAX_BYTES", 1024 * 1024 * 1024))
+CACHE_SWEEP_SECONDS = float(os.environ.get("CACHE_SWEEP_SECONDS", 600))
+
+
+def content_hash(*parts) -> str:
+    """Returns a stable SHA-256 hex digest over a sequence of str/bytes parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+# --- IN-MEMORY TIER ---
+
+class LRUCache:
+    """Thread-safe LRU cache with entry-count, total-size and TTL eviction."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl_seconds=CACHE_TTL_SECONDS, max_bytes=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, _, value = entry
+            if expires_at < time.time():
+                self._remove(key)
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, size=0, ttl_seconds=None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.time() + ttl, size, value)
+            self._bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# --- TIERED (MEMORY + DISK) CACHE ---
+
+class TieredCache:
+    """JSON-value cache with an in-memory LRU tier backed by an optional on-disk tier."""
+
+    def __init__(self, namespace, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES,
+                 ttl_seconds=CACHE_TTL_SECONDS, disk_dir=CACHE_DIR, disk_max_bytes=CACHE_DISK_MAX_BYTES):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.memory = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds, max_bytes=max_bytes)
+        self.disk_dir = os.path.join(disk_dir, namespace) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+        self._update_lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self._next_sweep = 0.0
+
+    def get(self, key, default=None, fresh=False):
+        """`fresh` reads the disk tier first, for entries another worker may have changed since."""
+        # Values are stored serialized so every caller gets its own copy to mutate.
+        encoded = None if fresh and self.disk_dir else self.memory.get(key)
+        result = "memory_hit"
+        if encoded is None and self.disk_dir:
+            encoded = self._read_disk(key)
+            if encoded is not None:
+                self.disk_hits += 1
+                result = "disk_hit"
+                self.memory.set(key, encoded, size=len(encoded))
+        if encoded is None:
+            self.misses += 1
+            metrics.cache_requests.inc(namespace=self.namespace, result="miss")
+            return default
+        metrics.cache_requests.inc(namespace=self.namespace, result=result)
+        return json.loads(encoded)
+
+    def set(self, key, value, ttl_seconds=None):
+        encoded = json.dumps(value)
+        self.memory.set(key, encoded, size=len(encoded), ttl_seconds=ttl_seconds)
+        if self.disk_dir:
+            self._write_disk(key, encoded, ttl_seconds)
+            if time.time() >= self._next_sweep:
+                self.sweep_disk()
+
+    def delete(self, key):
+        self.memory.delete(key)
+        if self.disk_dir:
+            try:
+                os.remove(self._disk_path(key))
+            except FileNotFoundError:
+                pass
+
+    def update(self, key, fn, ttl_seconds=None):
+        """
+        Replaces the value for `key` with fn(current value or None) and returns the new value. With a disk
+        tier the current value is read from disk under a file lock, so concurrent updates from several
+        workers are applied one after another instead of overwriting each other.
+        """
+        with self._update_lock:
+            if not self.disk_dir:
+                value = fn(self.get(key))
+                self.set(key, value, ttl_seconds)
+                return value
+            os.makedirs(self.disk_dir, exist_ok=True)
+            with open(os.path.join(self.disk_dir, ".lock"), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    value = fn(self.get(key, fresh=True))
+                    self.set(key, value, ttl_seconds)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+            return value
+
+    def get_or_compute(self, key, compute, should_cache=None):
+        """Returns the cached value for `key`, computing and storing it on a miss."""
+        value = self.get(key)
+        if value is not None:
+            return value
+        value = compute()
+        if should_cache is None or should_cache(value):
+            self.set(key, value)
+        return value
+
+    def sweep_disk(self):
+        """
+        Deletes expired disk entries, then the entries closest to expiring until the tier fits in
+        disk_max_bytes. Returns the number of files removed.
+        """
+        if not self.disk_dir or not self._sweep_lock.acquire(blocking=False):
+            return 0
+        try:
+            self._next_sweep = time.time() + CACHE_SWEEP_SECONDS
+            now = time.time()
+            entries, total, removed = [], 0, 0
+            for directory, _, names in os.walk(self.disk_dir):
+                for name in names:
+                    if not name.endswith(".json"):
+                        continue
+                    path = os.path.join(directory, name)
+                    try:
+                        info = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    # Entry files carry their expiry time as their mtime (see _write_disk).
+                    if info.st_mtime < now:
+                        removed += self._remove_disk_file(path)
+                    else:
+                        entries.append((info.st_mtime, info.st_size, path))
+                        total += info.st_size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.disk_max_bytes:
+                    break
+                removed += self._remove_disk_file(path)
+                total -= size
+            self.disk_evictions += removed
+            return removed
+        finally:
+            self._sweep_lock.release()
+
+    @staticmethod
+    def _remove_disk_file(path):
+        try:
+            os.remove(path)
+            return 1
+        except FileNotFoundError:
+            # Another worker's sweep got there first.
+            return 0
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _read_disk(self, key):
+        try:
+            with open(self._disk_path(key), "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if record.get("expires_at", 0) < time.time():
+            self.delete(key)
+            return None
+        return record["value"]
+
+    def _write_disk(self, key, encoded, ttl_seconds=None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file and rename so concurrent workers never read a partial entry.
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            expires_at = time.time() + ttl
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": expires_at, "value": encoded}, f)
+            # The expiry doubles as the file's mtime so sweeps can find expired entries without reading them.
+            os.utime(tmp_path, (expires_at, expires_at))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not write {self.namespace} cache entry to disk: {e}")
+
+    def stats(self):
+        memory = self.memory.stats()
+        return {
+            "memory_entries": memory["entries"],
+            "memory_bytes": memory["bytes"],
+            "memory_hits": memory["hits"],
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": memory["evictions"],
+            "disk_evictions": self.disk_evictions,
+        }
+
+
+# --- NAMED CACHES ---
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(namespace, **kwargs) -> TieredCache:
+    """Returns the process-wide cache for `namespace`, creating it on first use."""
+    with _caches_lock:
+        if namespace not in _caches:
+            _caches[namespace] = TieredCache(namespace, **kwargs)
+        return _caches[namespace]
+
+
+def cache_stats() -> dict:
+    with _caches_lock:
+        return {namespace: cache.stats() for namespace, cache in _caches.items()}
@@ -1,4 +1,113 @@
-def parse_document(gcs_path: str):
-    # TODO: Call Document AI with gcs_path
-    # For now, return mock text
-    return "This is parsed text from Document AI (mocked)."
+import os
+import uuid
+
+from services import metrics, registry
+from services.storage import download_object, list_objects
+
+# --- CONFIGURATION ---
+GCP_PROJECT_ID = os.environ.get("GCP_PROJECT_ID", "lexplain-472504")
+DOCAI_PROCESSOR_ID = os.environ.get("DOCAI_PROCESSOR_ID", "19531a9534629747")
+DOCAI_LOCATION = os.environ.get("DOCAI_LOCATION", "us")
+# Synchronous process_document accepts at most 15 pages per request.
+DOCAI_MAX_PAGES_PER_REQUEST = int(os.environ.get("DOCAI_MAX_PAGES_PER_REQUEST", 15))
+# Batch processing writes its results to GCS under this prefix (a lifecycle rule can expire them).
+DOCAI_BATCH_OUTPUT_URI = os.environ.get(
+    "DOCAI_BATCH_OUTPUT_URI", f"gs://{os.environ.get('GCS_BUCKET_NAME', 'lexplain-storage')}/docai-batch"
+)
+DOCAI_BATCH_TIMEOUT_SECONDS = float(os.environ.get("DOCAI_BATCH_TIMEOUT_SECONDS", 1800))
+
+
+def _create_client():
+    from google.cloud import documentai
+    return documentai.DocumentProcessorServiceClient()
+
+
+registry.register("docai", _create_client)
+
+
+def processor_name() -> str:
+    return f"projects/{GCP_PROJECT_ID}/locations/{DOCAI_LOCATION}/processors/{DOCAI_PROCESSOR_ID}"
+
+
+def parse_document(gcs_path: str, mime_type: str) -> str:
+    """Runs OCR on a whole document stored in GCS and returns its text."""
+    from google.cloud import documentai
+
+    request = documentai.ProcessRequest(
+        name=processor_name(),
+        gcs_document=documentai.GcsDocument(gcs_uri=gcs_path, mime_type=mime_type),
+    )
+    with metrics.external_call("docai", "process_document") as call:
+        text = registry.get("docai").process_document(request=request).document.text
+        call["output_size"] = len(text)
+    return text
+
+
+def _layout_text(document, layout) -> str:
+    return "".join(
+        document.text[segment.start_index:segment.end_index]
+        for segment in layout.text_anchor.text_segments
+    )
+
+
+def parse_document_pages(content: bytes, mime_type: str, pages: list) -> dict:
+    """Runs OCR on selected 1-based pages of an in-memory document and returns {page_number: text}."""
+    from google.cloud import documentai
+
+    request = documentai.ProcessRequest(
+        name=processor_name(),
+        raw_document=documentai.RawDocument(content=content, mime_type=mime_type),
+        process_options=documentai.ProcessOptions(
+            individual_page_selector=documentai.ProcessOptions.IndividualPageSelector(pages=pages)
+        ),
+    )
+    with metrics.external_call("docai", "process_pages", input_size=len(content)) as call:
+        document = registry.get("docai").process_document(request=request).document
+        call["output_size"] = len(document.text)
+    return {page.page_number: _layout_text(document, page.layout) for page in document.pages}
+
+
+def _read_batch_output(output_uri: str) -> str:
+    """Joins the text of the JSON shards Document AI wrote for one document, in shard order."""
+    from google.cloud import documentai
+
+    shards = [
+        documentai.Document.from_json(download_object(uri), ignore_unknown_fields=True)
+        for uri in list_objects(output_uri.rstrip("/") + "/") if uri.endswith(".json")
+    ]
+    return "".join(shard.text for shard in sorted(shards, key=lambda shard: shard.shard_info.shard_index))
+
+
+def batch_parse_documents(documents: list) -> dict:
+    """
+    Runs OCR on many GCS documents, given as (gcs_uri, mime_type) pairs, with one batch request.
+    Unlike process_document this has no per-request page limit. Returns {gcs_uri: text}; documents
+    Document AI could not process are left out.
+    """
+    from google.cloud import documentai
+
+    output_uri = f"{DOCAI_BATCH_OUTPUT_URI.rstrip('/')}/{uuid.uuid4().hex}/"
+    request = documentai.BatchProcessRequest(
+        name=processor_name(),
+        input_documents=documentai.BatchDocumentsInputConfig(
+            gcs_documents=documentai.GcsDocuments(documents=[
+                documentai.GcsDocument(gcs_uri=gcs_uri, mime_type=mime_type) for gcs_uri, mime_type in documents
+            ])
+        ),
+        document_output_config=documentai.DocumentOutputConfig(
+            gcs_output_config=documentai.DocumentOutputConfig.GcsOutputConfig(gcs_uri=output_uri)
+        ),
+    )
+    with metrics.external_call("docai", "batch_process", input_size=len(documents)) as call:
+        operation = registry.get("docai").batch_process_documents(request=request)
+        operation.result(timeout=DOCAI_BATCH_TIMEOUT_SECONDS)
+        statuses = operation.metadata.individual_process_statuses
+
+        texts = {}
+        for status in statuses:
+            if status.status.code != 0:
+                print(f"Document AI batch processing failed for {status.input_gcs_source}: {status.status.message}")
+                continue
+            texts[status.input_gcs_source] = _read_batch_output(status.output_gcs_destination)
+        call["output_size"] = sum(len(text) for text in texts.values())
+    return texts
@@ -1,3 +1,74 @@
-def get_embeddings(text: str):
-    # TODO: Call Vertex AI embeddings
-    return [0.1, 0.2, 0.3]  # Mock vector
+import hashlib
+import os
+import re
+
+import numpy as np
+
+# --- CONFIGURATION ---
+# EMBEDDING_PROVIDER selects the backend: "gemini" (default) or "local" for the
+# deterministic offline embedder used in tests and local development.
+EMBEDDING_PROVIDER = os.environ.get("EMBEDDING_PROVIDER", "gemini")
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "models/text-embedding-004")
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", 100))
+LOCAL_EMBEDDING_DIM = 512
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+# --- PROVIDERS ---
+
+class GeminiEmbeddingProvider:
+    """Embeds texts with the Gemini embedding API, batching requests."""
+
+    def __init__(self, model_name=EMBEDDING_MODEL, batch_size=EMBEDDING_BATCH_SIZE):
+        self.model_name = model_name
+        self.batch_size = batch_size
+
+    def embed(self, texts, task_type="retrieval_document"):
+        # Imported here so the local provider works without the Gemini SDK configured.
+        from ml.gateway import embed_texts
+
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            vectors.extend(embed_texts(batch, self.model_name, task_type))
+        return np.asarray(vectors, dtype=np.float32)
+
+
+class HashingEmbeddingProvider:
+    """Deterministic bag-of-words embedder using the hashing trick; needs no network access."""
+
+    def __init__(self, dim=LOCAL_EMBEDDING_DIM):
+        self.dim = dim
+
+    def embed(self, texts, task_type="retrieval_document"):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in TOKEN_PATTERN.findall(text.lower()):
+                digest = hashlib.md5(token.encode("utf-8")).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                vectors[row, bucket] += 1.0 if digest[4] & 1 else -1.0
+        return vectors
+
+
+_provider = None
+
+
+def set_embedding_provider(provider):
+    """Overrides the embedding provider, e.g. with HashingEmbeddingProvider in tests."""
+    global _provider
+    _provider = provider
+
+
+def get_embedding_provider():
+    global _provider
+    if _provider is None:
+        _provider = HashingEmbeddingProvider() if EMBEDDING_PROVIDER == "local" else GeminiEmbeddingProvider()
+    return _provider
+
+
+def get_embeddings(texts, task_type="retrieval_document"):
+    """Returns a (len(texts), dim) float32 matrix of embeddings."""
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    return get_embedding_provider().embed(list(texts), task_type=task_type)
@@ -0,0 +1,184 @@
+import io
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from PyPDF2 import PdfReader
+
+from services import docai, metrics
+from services.cache import content_hash, get_cache
+from services.storage import download_object, get_object_fingerprint
+
+# --- CONFIGURATION ---
+# Set LOCAL_EXTRACTION_ENABLED=false to send every document to Document AI as before.
+LOCAL_EXTRACTION_ENABLED = os.environ.get("LOCAL_EXTRACTION_ENABLED", "true").lower() != "false"
+EXTRACTION_WORKERS = int(os.environ.get("EXTRACTION_WORKERS", 4))
+# A page's text layer is trusted if it has enough characters and most of them look like real words.
+MIN_PAGE_CHARS = int(os.environ.get("MIN_PAGE_CHARS", 40))
+MIN_ALPHA_RATIO = float(os.environ.get("MIN_ALPHA_RATIO", 0.6))
+PAGES_PER_WORKER = 8
+
+# Bump when the extraction logic changes so text cached from the old logic is not reused.
+EXTRACTION_VERSION = "3"
+
+PDF_MIME_TYPE = "application/pdf"
+DOCX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+# Glyphs PyPDF2 emits when a font has no usable Unicode mapping.
+UNMAPPED_GLYPHS = re.compile(r"\(cid:\d+\)|�")
+
+_executor = ThreadPoolExecutor(max_workers=EXTRACTION_WORKERS, thread_name_prefix="extraction")
+
+
+# --- TEXT LAYER QUALITY ---
+
+def is_usable_text(text: str) -> bool:
+    """Heuristic check that a page's embedded text layer is real text rather than empty or garbled."""
+    stripped = "".join(text.split())
+    if len(stripped) < MIN_PAGE_CHARS:
+        return False
+    if len(UNMAPPED_GLYPHS.findall(text)) > len(stripped) * 0.01:
+        return False
+    alpha = sum(1 for ch in stripped if ch.isalpha())
+    return alpha / len(stripped) >= MIN_ALPHA_RATIO
+
+
+def needs_ocr(page) -> bool:
+    """
+    True if a PDF page's text layer is unusable and OCR could do better. A page without images that
+    has little text (blank, or just a signature line) is kept as it is; only a page with images, or
+    with plenty of text that is garbled, goes to Document AI.
+    """
+    if is_usable_text(page.text):
+        return False
+    return page.has_images or len("".join(page.text.split())) >= MIN_PAGE_CHARS
+
+
+# --- LOCAL EXTRACTORS ---
+
+class PdfPage(NamedTuple):
+    text: str
+    has_images: bool
+
+
+def _has_images(resources, depth=0) -> bool:
+    # Scans are image XObjects, either drawn directly or wrapped in a form XObject.
+    xobjects = (resources or {}).get("/XObject")
+    if not xobjects or depth > 2:
+        return False
+    for ref in xobjects.get_object().values():
+        xobject = ref.get_object()
+        subtype = xobject.get("/Subtype")
+        if subtype == "/Image" or (subtype == "/Form" and _has_images(xobject.get("/Resources"), depth + 1)):
+            return True
+    return False
+
+
+def _extract_pdf_page_range(content: bytes, start: int, stop: int) -> list:
+    # Each worker opens its own reader because PdfReader is not safe to share between threads.
+    reader = PdfReader(io.BytesIO(content))
+    pages = []
+    for i in range(start, stop):
+        page = reader.pages[i]
+        pages.append(PdfPage(page.extract_text() or "", _has_images(page.get("/Resources"))))
+    return pages
+
+
+def extract_pdf_pages(content: bytes) -> list:
+    """Returns a PdfPage (embedded text, whether it has images) for every page, extracting page ranges in parallel."""
+    page_count = len(PdfReader(io.BytesIO(content)).pages)
+    ranges = [(start, min(start + PAGES_PER_WORKER, page_count)) for start in range(0, page_count, PAGES_PER_WORKER)]
+    futures = [metrics.submit_in_context(_executor, _extract_pdf_page_range, content, start, stop) for start, stop in ranges]
+    return [page for future in futures for page in future.result()]
+
+
+def extract_docx_text(content: bytes) -> str:
+    from docx import Document
+
+    document = Document(io.BytesIO(content))
+    parts = [paragraph.text for paragraph in document.paragraphs]
+    for table in document.tables:
+        for row in table.rows:
+            parts.append("\t".join(cell.text for cell in row.cells))
+    return "\n".join(parts)
+
+
+# --- ROUTER ---
+
+def _ocr_pages(content: bytes, mime_type: str, page_numbers: list) -> dict:
+    """Sends only the given pages to Document AI, in concurrent requests within its page limit."""
+    size = docai.DOCAI_MAX_PAGES_PER_REQUEST
+    groups = [page_numbers[i:i + size] for i in range(0, len(page_numbers), size)]
+    futures = [metrics.submit_in_context(_executor, docai.parse_document_pages, content, mime_type, group) for group in groups]
+    ocr_text = {}
+    for future in futures:
+        ocr_text.update(future.result())
+    return ocr_text
+
+
+def _extract_pdf(gcs_uri: str, content: bytes) -> str:
+    pages = extract_pdf_pages(content)
+    scanned = [number for number, page in enumerate(pages, start=1) if needs_ocr(page)]
+    texts = [page.text for page in pages]
+    if scanned:
+        print(f"Sending {len(scanned)} of {len(pages)} pages of {gcs_uri} to Document AI.")
+        ocr_text = _ocr_pages(content, PDF_MIME_TYPE, scanned)
+        texts = [ocr_text.get(number, text) for number, text in enumerate(texts, start=1)]
+    return "\n".join(texts)
+
+
+def extract_text(gcs_uri: str, mime_type: str) -> str:
+    """
+    Returns a document's text, reading the embedded text layer locally where it is good enough
+    and using Document AI only for scanned or unreadable pages (or unsupported formats).
+    """
+    if not LOCAL_EXTRACTION_ENABLED or mime_type not in (PDF_MIME_TYPE, DOCX_MIME_TYPE):
+        return docai.parse_document(gcs_uri, mime_type)
+    try:
+        content = download_object(gcs_uri)
+        if mime_type == DOCX_MIME_TYPE:
+            text = extract_docx_text(content)
+            if is_usable_text(text):
+                return text
+            return docai.parse_document(gcs_uri, mime_type)
+        return _extract_pdf(gcs_uri, content)
+    except Exception as e:
+        # Local parsing is best-effort; Document AI can still read documents PyPDF2 or python-docx cannot.
+        print(f"Local extraction failed for {gcs_uri}, falling back to Document AI: {e}")
+        return docai.parse_document(gcs_uri, mime_type)
+
+
+def extract_text_locally(gcs_uri: str, mime_type: str):
+    """
+    Returns a document's text if its embedded text layer is usable throughout, or None if any of
+    it needs OCR. Used for bulk extraction, where such documents go to Document AI batch processing.
+    """
+    if not LOCAL_EXTRACTION_ENABLED or mime_type not in (PDF_MIME_TYPE, DOCX_MIME_TYPE):
+        return None
+    try:
+        content = download_object(gcs_uri)
+        if mime_type == DOCX_MIME_TYPE:
+            text = extract_docx_text(content)
+            return text if is_usable_text(text) else None
+        pages = extract_pdf_pages(content)
+        return None if any(needs_ocr(page) for page in pages) else "\n".join(page.text for page in pages)
+    except Exception as e:
+        print(f"Local extraction failed for {gcs_uri}, leaving it to Document AI: {e}")
+        return None
+
+
+def extraction_cache_key(gcs_uri: str, mime_type: str) -> str:
+    """Keys extracted text by file content, so identical uploads under different names share it."""
+    try:
+        fingerprint = get_object_fingerprint(gcs_uri) or gcs_uri
+    except Exception as e:
+        print(f"Could not read object metadata for {gcs_uri}: {e}")
+        fingerprint = gcs_uri
+    return content_hash("extract", EXTRACTION_VERSION, docai.processor_name(), mime_type, fingerprint)
+
+
+def extract_document_text(gcs_uri: str, mime_type: str) -> str:
+    """Extracts a document's text, reusing the cached text for identical file contents."""
+    cache_key = extraction_cache_key(gcs_uri, mime_type)
+    return get_cache("docai").get_or_compute(cache_key, lambda: extract_text(gcs_uri, mime_type))
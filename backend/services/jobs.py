@@ -0,0 +1,325 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# --- CONFIGURATION ---
+# JOB_BACKEND is "memory" (default, jobs are lost on restart) or "sqlite" (jobs persist in JOB_DB_PATH
+# and are shared by every gunicorn worker pointing at the same file).
+JOB_BACKEND = os.environ.get("JOB_BACKEND", "memory")
+JOB_DB_PATH = os.environ.get("JOB_DB_PATH", "jobs.sqlite3")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+JOB_QUEUE_SIZE = int(os.environ.get("JOB_QUEUE_SIZE", 50))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 3))
+JOB_RETRY_BACKOFF_SECONDS = float(os.environ.get("JOB_RETRY_BACKOFF_SECONDS", 2))
+# A running job's lease is renewed every JOB_HEARTBEAT_SECONDS while a stage runs. A job whose lease
+# has not been renewed for JOB_STALE_SECONDS is assumed orphaned by a dead worker and requeued; its
+# stages then run again, so they must be safe to repeat (the analysis stages are served from the cache).
+JOB_HEARTBEAT_SECONDS = float(os.environ.get("JOB_HEARTBEAT_SECONDS", 30))
+JOB_STALE_SECONDS = float(os.environ.get("JOB_STALE_SECONDS", 180))
+# Finished jobs keep their full results (extracted text and analysis), so they are deleted once older
+# than JOB_RESULT_TTL_SECONDS; the in-memory store also keeps at most JOB_MAX_FINISHED of them.
+JOB_RESULT_TTL_SECONDS = float(os.environ.get("JOB_RESULT_TTL_SECONDS", 3600))
+JOB_MAX_FINISHED = int(os.environ.get("JOB_MAX_FINISHED", 200))
+JOB_MAINTENANCE_SECONDS = 60
+JOB_POLL_SECONDS = 1.0
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue is at capacity; the API maps it to 429."""
+
+
+def _new_job(payload):
+    now = time.time()
+    return {
+        "id": uuid.uuid4().hex,
+        "status": QUEUED,
+        "payload": payload,
+        "stage": None,
+        "results": {},
+        "attempts": {},
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+# --- STORES ---
+
+class InMemoryJobStore:
+    """Process-local job store; the default when no persistence is configured."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, payload, max_queued):
+        with self._lock:
+            if sum(1 for job in self._jobs.values() if job["status"] == QUEUED) >= max_queued:
+                raise QueueFullError()
+            job = _new_job(payload)
+            self._jobs[job["id"]] = job
+            return dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields, updated_at=time.time())
+
+    def claim_next(self):
+        """Atomically moves the oldest queued job to running and returns it."""
+        with self._lock:
+            queued = [job for job in self._jobs.values() if job["status"] == QUEUED]
+            if not queued:
+                return None
+            job = min(queued, key=lambda j: j["created_at"])
+            job.update(status=RUNNING, updated_at=time.time())
+            return dict(job)
+
+    def heartbeat(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job["status"] == RUNNING:
+                job["updated_at"] = time.time()
+
+    def requeue_stale(self, stale_seconds):
+        cutoff = time.time() - stale_seconds
+        with self._lock:
+            for job in self._jobs.values():
+                if job["status"] == RUNNING and job["updated_at"] < cutoff:
+                    job["status"] = QUEUED
+
+    def purge_finished(self, ttl_seconds, max_finished=JOB_MAX_FINISHED):
+        """Deletes finished jobs older than the TTL, and the oldest ones beyond `max_finished`."""
+        cutoff = time.time() - ttl_seconds
+        with self._lock:
+            finished = sorted(
+                (job for job in self._jobs.values() if job["status"] in (SUCCEEDED, FAILED)),
+                key=lambda job: job["updated_at"],
+                reverse=True,
+            )
+            for index, job in enumerate(finished):
+                if index >= max_finished or job["updated_at"] < cutoff:
+                    del self._jobs[job["id"]]
+
+
+class SQLiteJobStore:
+    """Job store persisted in SQLite so queued and partially finished jobs survive restarts."""
+
+    JSON_FIELDS = ("payload", "results", "attempts")
+
+    def __init__(self, path=JOB_DB_PATH):
+        # Nothing is opened here: the store is created at import, which with preload_app happens in the
+        # gunicorn master, and SQLite connections must not be used across a fork.
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        # One connection per thread and process; sqlite3 connections must not be shared across threads,
+        # and a connection inherited from the parent process is abandoned rather than used.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, status TEXT NOT NULL, payload TEXT, stage TEXT,"
+                " results TEXT, attempts TEXT, error TEXT, created_at REAL, updated_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _row_to_job(self, row):
+        job = dict(row)
+        for field in self.JSON_FIELDS:
+            job[field] = json.loads(job[field]) if job[field] else {}
+        return job
+
+    def create(self, payload, max_queued):
+        conn = self._connect()
+        job = _new_job(payload)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            (queued,) = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()
+            if queued >= max_queued:
+                raise QueueFullError()
+            conn.execute(
+                "INSERT INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job["id"], job["status"], json.dumps(payload), None, "{}", "{}", None,
+                 job["created_at"], job["updated_at"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return job
+
+    def get(self, job_id):
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def update(self, job_id, **fields):
+        fields["updated_at"] = time.time()
+        for field in self.JSON_FIELDS:
+            if field in fields:
+                fields[field] = json.dumps(fields[field])
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._connect().execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def claim_next(self):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?", (RUNNING, time.time(), row["id"]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        job = self._row_to_job(row)
+        job["status"] = RUNNING
+        return job
+
+    def heartbeat(self, job_id):
+        self._connect().execute(
+            "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = ?", (time.time(), job_id, RUNNING)
+        )
+
+    def requeue_stale(self, stale_seconds):
+        self._connect().execute(
+            "UPDATE jobs SET status = ? WHERE status = ? AND updated_at < ?",
+            (QUEUED, RUNNING, time.time() - stale_seconds),
+        )
+
+    def purge_finished(self, ttl_seconds, max_finished=JOB_MAX_FINISHED):
+        # Rows are only deleted by age: the store is shared by every worker and lives on disk.
+        self._connect().execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+            (SUCCEEDED, FAILED, time.time() - ttl_seconds),
+        )
+
+
+# --- QUEUE AND WORKERS ---
+
+class JobQueue:
+    """
+    Bounded job queue drained by a fixed pool of worker threads.
+    A job runs a list of named stages, each `fn(payload, results, final_attempt) -> result`.
+    Each stage's result is saved as soon as it finishes, so a retried or recovered job resumes at the
+    stage that failed instead of starting over. While a stage runs, the job's lease is renewed so that
+    a slow but live job is not mistaken for an orphaned one.
+    """
+
+    def __init__(self, store, stages, workers=JOB_WORKERS, max_queued=JOB_QUEUE_SIZE,
+                 max_attempts=JOB_MAX_ATTEMPTS, backoff_seconds=JOB_RETRY_BACKOFF_SECONDS):
+        self.store = store
+        self.stages = stages
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self._wakeup = threading.Condition()
+        self._threads = []
+        self._started = False
+        self._start_lock = threading.Lock()
+        self._maintained_at = 0.0
+        self._maintenance_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._started:
+                return
+            self._maintain(force=True)
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self._started = True
+
+    def submit(self, payload):
+        """Queues a job and returns its ID, or raises QueueFullError when the queue is at capacity."""
+        job = self.store.create(payload, self.max_queued)
+        with self._wakeup:
+            self._wakeup.notify()
+        return job["id"]
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def _maintain(self, force=False):
+        """Requeues orphaned jobs and deletes expired finished ones, at most every JOB_MAINTENANCE_SECONDS."""
+        with self._maintenance_lock:
+            if not force and time.monotonic() - self._maintained_at < JOB_MAINTENANCE_SECONDS:
+                return
+            self._maintained_at = time.monotonic()
+        try:
+            self.store.requeue_stale(JOB_STALE_SECONDS)
+            self.store.purge_finished(JOB_RESULT_TTL_SECONDS)
+        except Exception as e:
+            print(f"Job store maintenance failed: {e}")
+
+    def _heartbeat(self, job_id, stop):
+        while not stop.wait(JOB_HEARTBEAT_SECONDS):
+            try:
+                self.store.heartbeat(job_id)
+            except Exception as e:
+                print(f"Could not renew the lease of job {job_id}: {e}")
+
+    def _work(self):
+        while True:
+            self._maintain()
+            job = self.store.claim_next()
+            if job is None:
+                # Polling also picks up jobs submitted by other processes sharing a persistent store.
+                with self._wakeup:
+                    self._wakeup.wait(timeout=JOB_POLL_SECONDS)
+                continue
+            self._run(job)
+
+    def _run(self, job):
+        stop = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job["id"], stop), name="job-heartbeat", daemon=True).start()
+        try:
+            self._run_stages(job)
+        finally:
+            stop.set()
+
+    def _run_stages(self, job):
+        results, attempts = job["results"], job["attempts"]
+        for name, fn in self.stages:
+            if name in results:
+                continue
+            while True:
+                attempt = attempts.get(name, 0) + 1
+                attempts[name] = attempt
+                self.store.update(job["id"], stage=name, attempts=attempts)
+                try:
+                    results[name] = fn(job["payload"], results, attempt >= self.max_attempts)
+                    self.store.update(job["id"], results=results)
+                    break
+                except Exception as e:
+                    print(f"Job {job['id']} stage '{name}' failed (attempt {attempt}/{self.max_attempts}): {e}")
+                    if attempt >= self.max_attempts:
+                        self.store.update(job["id"], status=FAILED, error=f"Stage '{name}' failed.")
+                        return
+                    time.sleep(self.backoff_seconds * 2 ** (attempt - 1))
+        self.store.update(job["id"], status=SUCCEEDED, stage=None)
+
+
+def create_job_store():
+    return SQLiteJobStore(JOB_DB_PATH) if JOB_BACKEND == "sqlite" else InMemoryJobStore()
@@ -0,0 +1,325 @@
+import contextvars
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# --- CONFIGURATION ---
+# Metrics are kept per process. When METRICS_DIR is set (e.g. to a directory shared by all gunicorn
+# workers), each worker periodically writes a snapshot there and /metrics sums every snapshot, so a
+# scrape that lands on any one worker still reports the whole server.
+METRICS_DIR = os.environ.get("METRICS_DIR")
+METRICS_FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", 5))
+METRICS_PREFIX = "lexplain_"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (100, 1_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 10_000_000)
+
+
+# --- METRIC TYPES ---
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = METRICS_PREFIX + name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def snapshot(self):
+        with self._lock:
+            return {json.dumps(key): self._copy(value) for key, value in self._values.items()}
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+    @staticmethod
+    def merge(total, value):
+        return (total or 0) + value
+
+    def samples(self, key, value):
+        yield self.name + "_total", key, value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            counts = [c + (1 if value <= bound else 0) for c, bound in zip(counts, self.buckets)]
+            self._values[key] = (counts, total + value, count + 1)
+
+    @staticmethod
+    def _copy(value):
+        counts, total, count = value
+        return [list(counts), total, count]
+
+    @staticmethod
+    def merge(total, value):
+        if total is None:
+            return [list(value[0]), value[1], value[2]]
+        return [[a + b for a, b in zip(total[0], value[0])], total[1] + value[1], total[2] + value[2]]
+
+    def samples(self, key, value):
+        counts, total, count = value
+        for bound, bucket_count in zip(self.buckets, counts):
+            yield self.name + "_bucket", key + (("le", _format_number(bound)),), bucket_count
+        yield self.name + "_bucket", key + (("le", "+Inf"),), count
+        yield self.name + "_sum", key, total
+        yield self.name + "_count", key, count
+
+
+_metrics = []
+
+
+# --- EXPOSITION ---
+
+def _format_number(value):
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def snapshot():
+    return {metric.name: metric.snapshot() for metric in _metrics}
+
+
+_last_flush = 0.0
+
+
+def _snapshot_path():
+    return os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+
+
+def flush(force=False):
+    """Writes this process's snapshot to METRICS_DIR, at most every METRICS_FLUSH_SECONDS unless forced."""
+    global _last_flush
+    if not METRICS_DIR:
+        return
+    now = time.monotonic()
+    if not force and now - _last_flush < METRICS_FLUSH_SECONDS:
+        return
+    _last_flush = now
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=METRICS_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(snapshot(), f)
+        os.replace(tmp_path, _snapshot_path())
+    except OSError as e:
+        print(f"Could not write metrics snapshot: {e}")
+
+
+def _collect():
+    """Returns {metric name: {label key: value}}, summed over every worker's snapshot when METRICS_DIR is set."""
+    if not METRICS_DIR:
+        return snapshot()
+    flush(force=True)
+    snapshots = []
+    for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    merged = {}
+    for metric in _metrics:
+        values = merged.setdefault(metric.name, {})
+        for data in snapshots:
+            for key, value in data.get(metric.name, {}).items():
+                values[key] = metric.merge(values.get(key), value)
+    return merged
+
+
+def render() -> str:
+    """Renders every metric in the Prometheus text exposition format."""
+    collected = _collect()
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for key, value in sorted(collected.get(metric.name, {}).items()):
+            labels = tuple(zip(metric.labelnames, json.loads(key)))
+            for sample_name, sample_labels, sample_value in metric.samples(labels, value):
+                lines.append(f"{sample_name}{_format_labels(sample_labels)} {_format_number(sample_value)}")
+    return "\n".join(lines) + "\n"
+
+
+# --- APPLICATION METRICS ---
+
+http_requests = Counter("http_requests", "HTTP requests by endpoint and status.", ("method", "endpoint", "status"))
+http_duration = Histogram("http_request_duration_seconds", "HTTP request latency.", ("method", "endpoint"))
+stage_duration = Histogram("stage_duration_seconds", "Duration of analysis pipeline stages.", ("stage",))
+external_duration = Histogram("external_call_duration_seconds", "Latency of calls to external services.",
+                              ("service", "operation"))
+external_errors = Counter("external_call_errors", "Failed calls to external services.", ("service", "operation"))
+external_bytes = Histogram("external_call_size", "Input and output sizes of external calls (bytes or characters).",
+                           ("service", "operation", "direction"), buckets=SIZE_BUCKETS)
+gemini_tokens = Counter("gemini_tokens", "Gemini tokens used, by generator.", ("generator", "kind"))
+gemini_retries = Counter("gemini_retries", "Gemini calls retried after a transient error.", ("generator",))
+cache_requests = Counter("cache_requests", "Cache lookups by namespace and result.", ("namespace", "result"))
+risk_decisions = Counter("risk_decisions", "Clause risk levels assigned, by source (local engine or Gemini).",
+                         ("source", "level"))
+
+
+# --- REQUEST CONTEXT ---
+# The current request's timings travel in a context variable. Work handed to thread pools is run with
+# submit_in_context() so external calls made from worker threads are attributed to the right request.
+
+class RequestTimings:
+    def __init__(self, request_id):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.calls = {}
+        self.tokens = {"prompt": 0, "output": 0}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            count, total = self.calls.get(name, (0, 0.0))
+            self.calls[name] = (count + 1, total + seconds)
+
+    def add_tokens(self, prompt, output):
+        with self._lock:
+            self.tokens["prompt"] += prompt
+            self.tokens["output"] += output
+
+    def log_record(self, **fields):
+        with self._lock:
+            calls = {name: {"count": count, "ms": round(total * 1000, 1)} for name, (count, total) in self.calls.items()}
+            tokens = dict(self.tokens)
+        return {
+            "event": "request",
+            "request_id": self.request_id,
+            **fields,
+            "duration_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "timings": calls,
+            "tokens": tokens,
+        }
+
+
+_current_request = contextvars.ContextVar("current_request", default=None)
+_current_generator = contextvars.ContextVar("current_generator", default=None)
+
+
+def start_request(request_id=None):
+    timings = RequestTimings(request_id or uuid.uuid4().hex)
+    _current_request.set(timings)
+    return timings
+
+
+def current_request():
+    return _current_request.get()
+
+
+def submit_in_context(executor, fn, *args, **kwargs):
+    """executor.submit() that runs `fn` in a copy of the caller's context (request and generator)."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def _record_timing(name, seconds):
+    timings = _current_request.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def external_call(service, operation, input_size=None):
+    """
+    Times a call to an external service and counts its failures. Sizes only known during the
+    call can be set as "input_size" / "output_size" entries of the yielded dict.
+    """
+    call = {"input_size": input_size}
+    started = time.perf_counter()
+    try:
+        yield call
+    except Exception:
+        external_errors.inc(service=service, operation=operation)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        external_duration.observe(elapsed, service=service, operation=operation)
+        _record_timing(f"{service}.{operation}", elapsed)
+        if call.get("input_size") is not None:
+            external_bytes.observe(call["input_size"], service=service, operation=operation, direction="in")
+        if call.get("output_size") is not None:
+            external_bytes.observe(call["output_size"], service=service, operation=operation, direction="out")
+
+
+@contextmanager
+def stage(name):
+    """Times one analysis stage; numbered stages such as "risk-1-0" are reported under their kind ("risk")."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        label = name.split("-")[0]
+        stage_duration.observe(elapsed, stage=label)
+        _record_timing(f"stage.{label}", elapsed)
+
+
+@contextmanager
+def gemini_generator(name):
+    """Attributes the Gemini calls made inside the block to generator `name`."""
+    token = _current_generator.set(name)
+    try:
+        yield
+    finally:
+        _current_generator.reset(token)
+
+
+def record_gemini_call(info):
+    """Gateway call listener: latency, sizes, tokens, retries and errors per generator."""
+    generator = _current_generator.get() or info["operation"]
+    external_duration.observe(info["latency"], service="gemini", operation=generator)
+    external_bytes.observe(info["prompt_chars"], service="gemini", operation=generator, direction="in")
+    if info.get("output_chars") is not None:
+        external_bytes.observe(info["output_chars"], service="gemini", operation=generator, direction="out")
+    if not info["ok"]:
+        external_errors.inc(service="gemini", operation=generator)
+    if info["retries"]:
+        gemini_retries.inc(info["retries"], generator=generator)
+    gemini_tokens.inc(info["prompt_tokens"], generator=generator, kind="prompt")
+    gemini_tokens.inc(info["output_tokens"], generator=generator, kind="output")
+
+    timings = _current_request.get()
+    if timings is not None:
+        timings.add(f"gemini.{generator}", info["latency"])
+        timings.add_tokens(info["prompt_tokens"], info["output_tokens"])
@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+
+# --- SERVICE REGISTRY ---
+# External clients (Document AI, GCS, Translate, Gemini) are registered as factories and only
+# constructed on first use, once per process. Factories also import their client library, so
+# importing the app (e.g. in tests) needs no credentials and skips loading the gRPC stacks, a large
+# part of cold start; gunicorn workers can build clients ahead of traffic with warm_up().
+
+_factories = {}
+_instances = {}
+_locks = {}
+_timings = {}
+_startup = {}
+_owner_pid = os.getpid()
+_guard = threading.Lock()
+
+
+def register(name, factory):
+    """Registers a zero-argument factory for a service; nothing is constructed until get()."""
+    with _guard:
+        _factories[name] = factory
+        _locks.setdefault(name, threading.Lock())
+
+
+def _check_fork():
+    # Clients hold sockets and gRPC channels that must not be shared with a forked child.
+    global _owner_pid
+    if os.getpid() != _owner_pid:
+        _instances.clear()
+        _timings.clear()
+        _owner_pid = os.getpid()
+
+
+def get(name):
+    """Returns the process's instance of a service, constructing it on first use (thread-safe)."""
+    with _guard:
+        _check_fork()
+        if name in _instances:
+            return _instances[name]
+        if name not in _factories:
+            raise KeyError(f"No service registered under '{name}'")
+        lock = _locks[name]
+    # Construction happens outside the global guard so one slow client does not block the others.
+    with lock:
+        with _guard:
+            if name in _instances:
+                return _instances[name]
+        started = time.perf_counter()
+        instance = _factories[name]()
+        with _guard:
+            _instances[name] = instance
+            _timings[name] = time.perf_counter() - started
+        return instance
+
+
+def override(name, instance):
+    """Installs a ready-made instance, e.g. a local fake in tests and benchmarks."""
+    with _guard:
+        _check_fork()
+        _locks.setdefault(name, threading.Lock())
+        _instances[name] = instance
+        _timings.pop(name, None)
+
+
+def reset(name=None):
+    """Drops constructed instances so the next get() builds them again."""
+    with _guard:
+        if name is None:
+            _instances.clear()
+            _timings.clear()
+        else:
+            _instances.pop(name, None)
+            _timings.pop(name, None)
+
+
+def warm_up(names=None):
+    """Constructs the given services (default: all registered) and returns {name: error or None}."""
+    results = {}
+    for name in names or list(_factories):
+        try:
+            get(name)
+            results[name] = None
+        except Exception as e:
+            print(f"Warm-up of service '{name}' failed: {e}")
+            results[name] = str(e)
+    return results
+
+
+def record_startup(phase, seconds):
+    _startup[phase] = seconds
+
+
+def startup_report():
+    """Reports how long app import and each constructed client took in this process, in seconds."""
+    with _guard:
+        return {
+            "pid": os.getpid(),
+            "phases": {phase: round(seconds, 4) for phase, seconds in _startup.items()},
+            "services": {name: round(seconds, 4) for name, seconds in _timings.items()},
+            "registered": sorted(_factories),
+        }
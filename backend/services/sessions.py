@@ -0,0 +1,87 @@
+import os
+import re
+import uuid
+
+from services.cache import LRUCache, content_hash, get_cache
+
+# --- CONFIGURATION ---
+# Sessions live in the same tiered cache as analysis results. With CACHE_DIR set they are
+# shared by every gunicorn worker; otherwise each worker only knows its own sessions.
+SESSION_MAX_DOCUMENTS = int(os.environ.get("SESSION_MAX_DOCUMENTS", 200))
+SESSION_MAX_BYTES = int(os.environ.get("SESSION_MAX_BYTES", 256 * 1024 * 1024))
+SESSION_TTL_SECONDS = float(os.environ.get("SESSION_TTL_SECONDS", 6 * 3600))
+# Recently used sessions are also kept decoded, so follow-up questions do not parse the full text each time.
+SESSION_PARSED_CACHE_SIZE = int(os.environ.get("SESSION_PARSED_CACHE_SIZE", 32))
+
+DOCUMENT_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# Sessions never change once created, so a decoded copy stays valid until the session expires.
+_parsed = LRUCache(max_entries=SESSION_PARSED_CACHE_SIZE, ttl_seconds=SESSION_TTL_SECONDS)
+
+
+def _store():
+    return get_cache(
+        "sessions",
+        max_entries=SESSION_MAX_DOCUMENTS,
+        max_bytes=SESSION_MAX_BYTES,
+        ttl_seconds=SESSION_TTL_SECONDS,
+    )
+
+
+def create_session(text_content: str, analysis: dict, **metadata) -> str:
+    """
+    Stores a document's text and analysis and returns the ID clients use to refer to it.
+    Extra keyword arguments (e.g. the per-clause results of a revision) are stored alongside.
+    The text's hash is stored too, so per-question lookups never hash the full text again.
+    """
+    document_id = uuid.uuid4().hex
+    _store().set(document_id, {
+        "text": text_content, "textHash": content_hash(text_content), "analysis": analysis, **metadata,
+    })
+    return document_id
+
+
+def get_session(document_id: str):
+    """
+    Returns the stored session, or None if the ID is malformed, unknown or evicted.
+    The returned session is shared with other requests and must not be modified.
+    """
+    if not document_id or not DOCUMENT_ID_PATTERN.match(document_id):
+        return None
+    session = _parsed.get(document_id)
+    if session is None:
+        session = _store().get(document_id)
+        if session is not None:
+            _parsed.set(document_id, session)
+    return session
+
+
+def resolve_document(data: dict):
+    """
+    Returns (text, text_hash, error_message) from either a `documentId` or an inline `textContent`.
+    The hash is None for inline text and for sessions stored before hashes were recorded.
+    """
+    document_id = data.get("documentId")
+    if document_id:
+        session = get_session(document_id)
+        if session is None:
+            return None, None, "Document session not found or expired. Please analyze the document again."
+        return session["text"], session.get("textHash"), None
+    return data.get("textContent"), None, None
+
+
+def resolve_document_text(data: dict):
+    """Returns (text, error_message) from either a `documentId` or an inline `textContent`."""
+    text, _, error = resolve_document(data)
+    return text, error
+
+
+def translatable_texts(analysis: dict) -> list:
+    """Flattens an analysis in the order the Dashboard expects translations back."""
+    clauses = analysis.get("clauses", [])
+    return [
+        *analysis.get("summary", []),
+        *[clause.get("title", "") for clause in clauses],
+        *[clause.get("explanation", "") for clause in clauses],
+        *[clause.get("riskJustification", "") for clause in clauses],
+    ]
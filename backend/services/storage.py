@@ -1,10 +1,64 @@
-from google.cloud import storage as gcs
+import os
+import threading
+
+from services import metrics, registry
 
 BUCKET_NAME = "lexplain-docs-bucket"
+GCP_PROJECT_ID = os.environ.get("GCP_PROJECT_ID", "lexplain-472504")
+
+def _create_client():
+    from google.cloud import storage as gcs
+    return gcs.Client(project=GCP_PROJECT_ID)
+
+# Shared by the upload route and the extraction router so each process opens one client.
+registry.register("storage", _create_client)
+_buckets = {}
+_buckets_lock = threading.Lock()
 
 def upload_file(file, filename):
-    client = gcs.Client()
-    bucket = client.bucket(BUCKET_NAME)
+    bucket = get_bucket(BUCKET_NAME)
     blob = bucket.blob(filename)
     blob.upload_from_file(file, content_type=file.content_type)
     return f"gs://{BUCKET_NAME}/{filename}"
+
+def set_storage_client(client):
+    """Replaces the GCS client, e.g. with a local fake in tests and benchmarks."""
+    registry.override("storage", client)
+
+def get_bucket(bucket_name: str):
+    """Returns a cached bucket handle. Unlike client.get_bucket(), this makes no metadata request."""
+    client = registry.get("storage")
+    with _buckets_lock:
+        # Handles are tied to the client that made them, so a new client (after fork or an override) gets new ones.
+        cached = _buckets.get(bucket_name)
+        if cached is None or cached[0] is not client:
+            cached = (client, client.bucket(bucket_name))
+            _buckets[bucket_name] = cached
+        return cached[1]
+
+def parse_gcs_uri(gcs_uri: str):
+    bucket_name, _, blob_name = gcs_uri.removeprefix("gs://").partition("/")
+    return bucket_name, blob_name
+
+def get_object_fingerprint(gcs_uri: str):
+    """Returns the stored MD5 of a GCS object so identical uploads share cache entries."""
+    bucket_name, blob_name = parse_gcs_uri(gcs_uri)
+    with metrics.external_call("gcs", "get_blob"):
+        blob = get_bucket(bucket_name).get_blob(blob_name)
+    if blob is None or not blob.md5_hash:
+        return None
+    return blob.md5_hash
+
+def list_objects(gcs_prefix: str) -> list:
+    """Returns the gs:// URIs of every object under a prefix, skipping folder placeholders."""
+    bucket_name, prefix = parse_gcs_uri(gcs_prefix)
+    with metrics.external_call("gcs", "list"):
+        blobs = registry.get("storage").list_blobs(bucket_name, prefix=prefix or None)
+        return [f"gs://{bucket_name}/{blob.name}" for blob in blobs if not blob.name.endswith("/")]
+
+def download_object(gcs_uri: str) -> bytes:
+    bucket_name, blob_name = parse_gcs_uri(gcs_uri)
+    with metrics.external_call("gcs", "download") as call:
+        content = get_bucket(bucket_name).blob(blob_name).download_as_bytes()
+        call["output_size"] = len(content)
+    return content
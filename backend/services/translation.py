@@ -0,0 +1,86 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from services import metrics, registry
+from services.cache import content_hash, get_cache
+
+# --- CONFIGURATION ---
+# Cloud Translation v2 accepts at most 128 segments per request and recommends keeping requests
+# well under 100K characters; batches are packed to stay within both limits.
+TRANSLATE_MAX_SEGMENTS = int(os.environ.get("TRANSLATE_MAX_SEGMENTS", 128))
+TRANSLATE_MAX_CHARS = int(os.environ.get("TRANSLATE_MAX_CHARS", 30000))
+TRANSLATE_WORKERS = int(os.environ.get("TRANSLATE_WORKERS", 4))
+TRANSLATION_CACHE_SIZE = int(os.environ.get("TRANSLATION_CACHE_SIZE", 20000))
+
+_executor = ThreadPoolExecutor(max_workers=TRANSLATE_WORKERS, thread_name_prefix="translate")
+
+
+def _create_client():
+    from google.cloud import translate_v2 as translate
+    return translate.Client()
+
+
+registry.register("translate", _create_client)
+
+
+def normalize_segment(text) -> str:
+    """Collapses whitespace so segments that differ only in spacing share one translation."""
+    return " ".join(text.split()) if isinstance(text, str) else ""
+
+
+def _cache():
+    return get_cache("translations", max_entries=TRANSLATION_CACHE_SIZE)
+
+
+def _cache_key(segment, target_language):
+    return content_hash("translate", target_language, segment)
+
+
+def pack_batches(segments, max_segments=TRANSLATE_MAX_SEGMENTS, max_chars=TRANSLATE_MAX_CHARS):
+    """Groups segments into batches within the per-request segment and character limits."""
+    batches, current, current_chars = [], [], 0
+    for segment in segments:
+        if current and (len(current) >= max_segments or current_chars + len(segment) > max_chars):
+            batches.append(current)
+            current, current_chars = [], 0
+        current.append(segment)
+        current_chars += len(segment)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _translate_batch(client, batch, target_language):
+    with metrics.external_call("translate", "translate", input_size=sum(len(s) for s in batch)) as call:
+        results = client.translate(batch, target_language=target_language)
+        call["output_size"] = sum(len(item["translatedText"]) for item in results)
+    return results
+
+
+def translate_texts(texts, target_language, client=None):
+    """
+    Translates a list of texts, returning results in the original order. Segments are
+    normalized and deduplicated, served from the cache where possible, and the misses are
+    sent in concurrent batches.
+    """
+    client = client or registry.get("translate")
+    normalized = [normalize_segment(text) for text in texts]
+    unique = list(dict.fromkeys(segment for segment in normalized if segment))
+
+    cache = _cache()
+    translations, misses = {}, []
+    for segment in unique:
+        cached = cache.get(_cache_key(segment, target_language))
+        if cached is None:
+            misses.append(segment)
+        else:
+            translations[segment] = cached
+
+    batches = pack_batches(misses)
+    futures = [metrics.submit_in_context(_executor, _translate_batch, client, batch, target_language) for batch in batches]
+    for batch, future in zip(batches, futures):
+        for segment, item in zip(batch, future.result()):
+            translations[segment] = item["translatedText"]
+            cache.set(_cache_key(segment, target_language), item["translatedText"])
+
+    return [translations.get(segment, "") for segment in normalized]
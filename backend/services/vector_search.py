@@ -1,3 +1,88 @@
-def search_vector(query_vector):
-    # TODO: Connect to FAISS or Vertex Matching Engine
-    return ["Relevant chunk 1", "Relevant chunk 2"]
+import os
+import threading
+
+import numpy as np
+
+from services.cache import LRUCache, content_hash
+from services.embeddings import get_embeddings
+from utils.segmenter import iter_segments
+
+# --- CONFIGURATION ---
+RETRIEVAL_TOP_K = int(os.environ.get("RETRIEVAL_TOP_K", 6))
+RETRIEVAL_CHUNK_SIZE = int(os.environ.get("RETRIEVAL_CHUNK_SIZE", 1200))
+# Documents shorter than this are sent whole; retrieval would not make the prompt meaningfully smaller.
+RETRIEVAL_MIN_CHARS = int(os.environ.get("RETRIEVAL_MIN_CHARS", 8000))
+INDEX_CACHE_SIZE = int(os.environ.get("INDEX_CACHE_SIZE", 64))
+
+_indexes = LRUCache(max_entries=INDEX_CACHE_SIZE)
+_build_locks = {}
+_build_locks_guard = threading.Lock()
+
+
+# --- INDEX ---
+
+class VectorIndex:
+    """In-process index of unit-normalized chunk vectors with vectorized cosine top-k search."""
+
+    def __init__(self, chunks, vectors):
+        self.chunks = list(chunks)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.vectors = (vectors / np.maximum(norms, 1e-12)).astype(np.float32)
+
+    def search(self, query_vector, k=RETRIEVAL_TOP_K):
+        """Returns up to k (chunk_index, score) pairs, best match first."""
+        if not self.chunks:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32).ravel()
+        query = query / max(np.linalg.norm(query), 1e-12)
+        scores = self.vectors @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+
+def build_index(text_content):
+    """Chunks a document once along clause boundaries and embeds the chunks in batches."""
+    chunks = [segment.text for segment in iter_segments(text_content, max_chars=RETRIEVAL_CHUNK_SIZE)]
+    return VectorIndex(chunks, get_embeddings(chunks, task_type="retrieval_document"))
+
+
+def get_document_index(text_content, text_hash=None):
+    """Returns the cached index for a document, building it on first use. Pass `text_hash` if it is known."""
+    key = text_hash or content_hash(text_content)
+    index = _indexes.get(key)
+    if index is None:
+        # One lock per document so concurrent questions on a new document embed it only once.
+        with _build_locks_guard:
+            lock = _build_locks.setdefault(key, threading.Lock())
+        with lock:
+            index = _indexes.get(key)
+            if index is None:
+                index = build_index(text_content)
+                _indexes.set(key, index)
+        with _build_locks_guard:
+            _build_locks.pop(key, None)
+    return index
+
+
+# --- RETRIEVAL ---
+
+def search_vector(query_vector, index, k=RETRIEVAL_TOP_K):
+    """Returns the text of the k chunks closest to `query_vector`."""
+    return [index.chunks[i] for i, _ in index.search(query_vector, k)]
+
+
+def retrieve_context(text_content, question, k=RETRIEVAL_TOP_K, text_hash=None):
+    """Returns the passages of a document most relevant to a question, in document order."""
+    if len(text_content) <= RETRIEVAL_MIN_CHARS:
+        return text_content
+    try:
+        index = get_document_index(text_content, text_hash)
+        query_vector = get_embeddings([question], task_type="retrieval_query")[0]
+        hits = sorted(i for i, _ in index.search(query_vector, k))
+        return "\n...\n".join(index.chunks[i] for i in hits)
+    except Exception as e:
+        # Retrieval is an optimization; answering from the full text is still correct.
+        print(f"Retrieval failed, falling back to full document text: {e}")
+        return text_content
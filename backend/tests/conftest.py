@@ -0,0 +1,19 @@
+import pytest
+
+from bench import fakes
+from ml import gateway
+from services import registry
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    """A test client for the app with every external service replaced by the bench fakes."""
+    import app
+
+    # Install the fakes into a copy of the registry so other tests keep the real factories.
+    monkeypatch.setattr(registry, "_factories", dict(registry._factories))
+    monkeypatch.setattr(registry, "_instances", {})
+    monkeypatch.setattr(gateway, "_models", {})
+    fakes.install({name: fakes.ServiceProfile(size=20) for name in ("gemini", "docai", "storage", "translate")})
+    monkeypatch.setattr(fakes, "FAKE_GCS_DIR", str(tmp_path))
+    return app.app.test_client()
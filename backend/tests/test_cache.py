@@ -0,0 +1,68 @@
+import time
+
+from services.cache import LRUCache, TieredCache, content_hash
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_lru_expires_entries_after_ttl():
+    cache = LRUCache(ttl_seconds=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+
+    assert cache.get("a") is None
+
+
+def test_tiered_cache_survives_restart_via_disk(tmp_path):
+    key = content_hash("summary", "model", "1", "document text")
+    TieredCache("gemini", disk_dir=str(tmp_path)).set(key, ["point"])
+
+    fresh = TieredCache("gemini", disk_dir=str(tmp_path))
+    calls = []
+    value = fresh.get_or_compute(key, lambda: calls.append(1) or ["recomputed"])
+
+    assert value == ["point"]
+    assert calls == []
+    assert fresh.stats()["disk_hits"] == 1
+
+
+def test_get_or_compute_skips_uncacheable_results():
+    cache = TieredCache("test", disk_dir=None)
+    cache.get_or_compute("k", lambda: "Error: boom", should_cache=lambda v: not v.startswith("Error"))
+
+    assert cache.get("k") is None
+
+
+def test_updates_from_workers_sharing_a_disk_tier_are_merged(tmp_path):
+    worker_a = TieredCache("test", disk_dir=str(tmp_path))
+    worker_b = TieredCache("test", disk_dir=str(tmp_path))
+    worker_a.set("k", {"a": 1})
+    worker_b.get("k")
+
+    worker_a.update("k", lambda value: {**value, "b": 2})
+    worker_b.update("k", lambda value: {**value, "c": 3})
+
+    assert worker_a.get("k", fresh=True) == {"a": 1, "b": 2, "c": 3}
+
+
+def test_disk_sweep_removes_expired_entries_then_the_soonest_to_expire(tmp_path):
+    cache = TieredCache("sessions", disk_dir=str(tmp_path), disk_max_bytes=10_000)
+    cache.set("expired", "x", ttl_seconds=-1)
+    for i, ttl in enumerate([100, 300, 200]):
+        cache.set(f"entry-{i}", "y" * 4000, ttl_seconds=ttl)
+
+    cache.sweep_disk()
+
+    assert cache.stats()["disk_evictions"] == 2
+    fresh = TieredCache("sessions", disk_dir=str(tmp_path))
+    assert [fresh.get(key) is not None for key in ["expired", "entry-0", "entry-1", "entry-2"]] == [False, False, True, True]
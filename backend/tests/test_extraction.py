@@ -0,0 +1,64 @@
+import io
+
+import pytest
+
+from bench.documents import make_scanned_pdf
+from services import docai, extraction
+from services.extraction import PdfPage
+
+TEXT_PAGE = "The supplier delivers the goods to the client's warehouse within ten business days."
+
+
+@pytest.mark.parametrize("text, usable", [
+    (TEXT_PAGE, True),
+    ("", False),
+    ("Page 3", False),
+    ("(cid:12)(cid:7)(cid:44) " * 20, False),
+    ("4 7 19 | 2021-03-04 | 00017 | 88.10 | 42 | 7 | 11 | 2022-01-01", False),
+])
+def test_is_usable_text(text, usable):
+    assert extraction.is_usable_text(text) is usable
+
+
+def test_only_scanned_pages_are_ocred_and_stitched_back_in_page_order(monkeypatch):
+    garbled = "(cid:12)(cid:7)(cid:44) " * 20
+    pages = [
+        PdfPage(TEXT_PAGE, False),
+        PdfPage("", True),
+        PdfPage(TEXT_PAGE.upper(), False),
+        PdfPage(garbled, False),
+        PdfPage("", True),
+        PdfPage("Signed: ____", False),  # A signature page in a digital PDF keeps its text.
+        PdfPage("", False),
+    ]
+    sent = []
+
+    def fake_ocr(content, mime_type, page_numbers):
+        assert content == b"%PDF" and mime_type == extraction.PDF_MIME_TYPE
+        sent.append(page_numbers)
+        return {number: f"OCR page {number}" for number in page_numbers}
+
+    monkeypatch.setattr(extraction, "download_object", lambda gcs_uri: b"%PDF")
+    monkeypatch.setattr(extraction, "extract_pdf_pages", lambda content: list(pages))
+    monkeypatch.setattr(docai, "parse_document_pages", fake_ocr)
+    monkeypatch.setattr(docai, "parse_document", lambda *args: pytest.fail("the whole document went to OCR"))
+    monkeypatch.setattr(docai, "DOCAI_MAX_PAGES_PER_REQUEST", 2)
+
+    text = extraction.extract_text("gs://bucket/mixed.pdf", extraction.PDF_MIME_TYPE)
+
+    assert sorted(sent) == [[2, 4], [5]]
+    assert text.split("\n") == [
+        TEXT_PAGE, "OCR page 2", TEXT_PAGE.upper(), "OCR page 4", "OCR page 5", "Signed: ____", "",
+    ]
+
+
+def test_pages_drawn_from_images_are_detected():
+    from PyPDF2 import PdfWriter
+
+    writer = PdfWriter()
+    writer.add_blank_page(width=612, height=792)
+    blank = io.BytesIO()
+    writer.write(blank)
+
+    assert extraction.extract_pdf_pages(make_scanned_pdf("scan", pages=2)) == [PdfPage("", True)] * 2
+    assert extraction.extract_pdf_pages(blank.getvalue()) == [PdfPage("", False)]
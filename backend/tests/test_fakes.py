@@ -0,0 +1,25 @@
+import io
+
+import pytest
+
+from bench.documents import make_docx, make_scanned_pdf, synthetic_contract
+
+
+@pytest.mark.parametrize("filename, content, mime_type", [
+    ("contract.docx", make_docx(synthetic_contract("test")), "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+    ("scan.pdf", make_scanned_pdf("test", pages=2), "application/pdf"),
+])
+def test_full_workflow_against_fakes(client, filename, content, mime_type):
+    uploaded = client.post("/api/upload/", data={"file": (io.BytesIO(content), filename, mime_type)})
+    assert uploaded.status_code == 200
+
+    analyzed = client.post("/api/analyze", json={"gcs_uri": uploaded.get_json()["gcs_uri"], "mime_type": mime_type})
+    analysis = analyzed.get_json()
+    assert analyzed.status_code == 200
+    assert analysis["clauses"] and all(c["riskLevel"] in ("Low", "Medium", "High") for c in analysis["clauses"])
+
+    document_id = analysis["documentId"]
+    assert client.post("/api/qa/", json={"documentId": document_id, "question": "When is payment due?"}).status_code == 200
+    translated = client.post("/api/translate/", json={"documentId": document_id, "target": "es"}).get_json()
+    assert translated["translated_texts"][0].startswith("[es] ")
+    assert client.post("/api/export/checklist", json={"documentId": document_id}).status_code == 200
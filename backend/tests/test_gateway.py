@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+from ml import gateway, pipeline
+from services import registry
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+
+class FlakyModel:
+    def __init__(self, failures=0, release=None):
+        self.calls = 0
+        self.failures = failures
+        self.release = release
+        self.timeouts = []
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        self.calls += 1
+        self.timeouts.append((request_options or {}).get("timeout"))
+        if self.release is not None:
+            self.release.wait(timeout=2)
+        if self.calls <= self.failures:
+            raise google_exceptions.ResourceExhausted("quota")
+        return FakeResponse(f"answer to {prompt}")
+
+
+def _use_model(monkeypatch, model):
+    client = type("FakeGemini", (), {"GenerativeModel": staticmethod(lambda model_name: model)})()
+    monkeypatch.setattr(registry, "_instances", {"gemini": client})
+    monkeypatch.setattr(gateway, "_models", {})
+
+
+def test_retries_transient_errors(monkeypatch):
+    model = FlakyModel(failures=2)
+    monkeypatch.setattr(gateway, "_backoff", lambda attempt: 0)
+    _use_model(monkeypatch, model)
+
+    assert gateway.generate_text("p", "test-model") == "answer to p"
+    assert model.calls == 3
+
+
+def test_identical_inflight_prompts_share_one_call(monkeypatch):
+    release = threading.Event()
+    model = FlakyModel(release=release)
+    _use_model(monkeypatch, model)
+    coalesced_before = gateway.gateway_stats()["coalesced"]
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(gateway.generate_text("same", "test-model")))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    deadline = time.time() + 2
+    while gateway.gateway_stats()["coalesced"] - coalesced_before < 3 and time.time() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["answer to same"] * 4
+    assert model.calls == 1
+
+
+def test_calls_carry_the_stage_deadline_and_stop_retrying_once_it_passes(monkeypatch):
+    model = FlakyModel(failures=100)
+    monkeypatch.setattr(gateway, "_backoff", lambda attempt: 0.05)
+    _use_model(monkeypatch, model)
+
+    started = time.monotonic()
+    with gateway.call_deadline(started + 0.2):
+        with pytest.raises(google_exceptions.ResourceExhausted):
+            gateway.generate_text("deadline", "test-model")
+
+    assert time.monotonic() - started < 0.3
+    assert 1 <= model.calls <= 4
+    assert all(0 < timeout <= 0.2 for timeout in model.timeouts)
+
+
+def test_timed_out_stage_releases_its_worker(monkeypatch):
+    model = FlakyModel(failures=100)
+    monkeypatch.setattr(gateway, "_backoff", lambda attempt: 1.0)
+    _use_model(monkeypatch, model)
+    scheduler = pipeline.StageScheduler(timeout=0.1)
+
+    started = time.monotonic()
+    future = scheduler.submit("summary", gateway.generate_text, "stage", "test-model")
+
+    # Without the deadline the stage would keep retrying (and hold its thread) for GEMINI_MAX_RETRIES rounds.
+    assert isinstance(future.exception(timeout=1), google_exceptions.ResourceExhausted)
+    assert time.monotonic() - started < 0.3
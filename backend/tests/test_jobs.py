@@ -0,0 +1,112 @@
+import time
+
+import pytest
+
+from services import jobs
+from services.jobs import InMemoryJobStore, JobQueue, QueueFullError, SQLiteJobStore
+
+
+def wait_for(queue, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_failed_stage_is_retried_without_repeating_earlier_stages():
+    calls = {"extract": 0, "analyze": 0}
+
+    def extract(payload, results, final_attempt):
+        calls["extract"] += 1
+        return "text"
+
+    def analyze(payload, results, final_attempt):
+        calls["analyze"] += 1
+        if calls["analyze"] < 2:
+            raise RuntimeError("quota")
+        return results["extract"].upper()
+
+    queue = JobQueue(InMemoryJobStore(), [("extract", extract), ("analyze", analyze)], workers=1, backoff_seconds=0)
+    queue.start()
+    job = wait_for(queue, queue.submit({"n": 1}))
+
+    assert job["status"] == "succeeded"
+    assert job["results"] == {"extract": "text", "analyze": "TEXT"}
+    assert calls == {"extract": 1, "analyze": 2}
+
+
+def test_submit_rejects_when_queue_is_full():
+    queue = JobQueue(InMemoryJobStore(), [], max_queued=1)
+    queue.submit({})
+
+    with pytest.raises(QueueFullError):
+        queue.submit({})
+
+
+def test_sqlite_store_keeps_jobs_across_instances(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    job = SQLiteJobStore(path).create({"gcs_uri": "gs://b/doc.pdf"}, max_queued=10)
+
+    reopened = SQLiteJobStore(path)
+    claimed = reopened.claim_next()
+
+    assert claimed["id"] == job["id"]
+    assert claimed["payload"] == {"gcs_uri": "gs://b/doc.pdf"}
+    assert reopened.get(job["id"])["status"] == "running"
+
+
+def test_slow_job_keeps_its_lease_and_is_not_run_twice(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_HEARTBEAT_SECONDS", 0.01)
+    store, calls = InMemoryJobStore(), []
+
+    def slow(payload, results, final_attempt):
+        calls.append(payload)
+        time.sleep(0.3)
+        # Another worker checking for orphaned jobs while this one is still running.
+        store.requeue_stale(0.1)
+        return "done"
+
+    queue = JobQueue(store, [("slow", slow)], workers=2)
+    queue.start()
+    job = wait_for(queue, queue.submit({"n": 1}))
+
+    assert job["status"] == "succeeded"
+    assert len(calls) == 1
+
+
+def test_finished_jobs_are_purged_by_age_and_count(tmp_path):
+    memory = InMemoryJobStore()
+    ids = [memory.create({"n": n}, max_queued=10)["id"] for n in range(4)]
+    for n, job_id in enumerate(ids[:3]):
+        memory.update(job_id, status="succeeded")
+    memory._jobs[ids[0]]["updated_at"] -= 7200
+
+    memory.purge_finished(3600, max_finished=1)
+
+    assert [job_id for job_id in ids if memory.get(job_id)] == [ids[2], ids[3]]
+
+    sqlite = SQLiteJobStore(str(tmp_path / "jobs.sqlite3"))
+    old, recent = (sqlite.create({}, max_queued=10)["id"] for _ in range(2))
+    sqlite.update(old, status="failed")
+    sqlite.update(recent, status="failed")
+    sqlite._connect().execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time() - 7200, old))
+
+    sqlite.purge_finished(3600)
+
+    assert sqlite.get(old) is None and sqlite.get(recent) is not None
+
+
+def test_sqlite_store_opens_nothing_until_used_and_reconnects_after_fork(tmp_path, monkeypatch):
+    path = tmp_path / "jobs.sqlite3"
+    store = SQLiteJobStore(str(path))
+    assert not path.exists()
+
+    job = store.create({"n": 1}, max_queued=10)
+    parent_conn = store._connect()
+    monkeypatch.setattr(jobs.os, "getpid", lambda: -1)
+
+    assert store._connect() is not parent_conn
+    assert store.get(job["id"])["payload"] == {"n": 1}
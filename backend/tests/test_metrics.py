@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from services import metrics
+
+
+def test_histogram_and_counter_render_in_prometheus_format(monkeypatch):
+    monkeypatch.setattr(metrics, "_metrics", [])
+    latency = metrics.Histogram("test_latency_seconds", "Test latency.", ("op",), buckets=(0.1, 1))
+    errors = metrics.Counter("test_errors", "Test errors.", ("op",))
+    latency.observe(0.05, op="a")
+    latency.observe(0.5, op="a")
+    errors.inc(op="a")
+
+    text = metrics.render()
+
+    assert "# TYPE lexplain_test_latency_seconds histogram" in text
+    assert 'lexplain_test_latency_seconds_bucket{op="a",le="0.1"} 1' in text
+    assert 'lexplain_test_latency_seconds_bucket{op="a",le="1"} 2' in text
+    assert 'lexplain_test_latency_seconds_bucket{op="a",le="+Inf"} 2' in text
+    assert 'lexplain_test_latency_seconds_count{op="a"} 2' in text
+    assert 'lexplain_test_errors_total{op="a"} 1' in text
+
+
+def test_external_call_counts_errors_and_attributes_time_to_the_request(monkeypatch):
+    monkeypatch.setattr(metrics, "_current_request", metrics.contextvars.ContextVar("test_request", default=None))
+    timings = metrics.start_request("req-1")
+
+    with metrics.external_call("translate", "translate", input_size=10) as call:
+        call["output_size"] = 12
+    with pytest.raises(RuntimeError):
+        with metrics.external_call("translate", "translate"):
+            raise RuntimeError("boom")
+
+    record = timings.log_record(status=200)
+    assert record["request_id"] == "req-1"
+    assert record["timings"]["translate.translate"]["count"] == 2
+    assert metrics.external_errors.snapshot()[json.dumps(["translate", "translate"])] >= 1
+
+
+def test_snapshots_from_all_workers_are_summed(monkeypatch, tmp_path):
+    monkeypatch.setattr(metrics, "_metrics", [])
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    requests = metrics.Counter("test_requests", "Test requests.")
+    requests.inc(3)
+    # Another worker's snapshot, as written by its own flush().
+    (tmp_path / "99999.json").write_text(json.dumps({"lexplain_test_requests": {"[]": 4}}))
+
+    assert "lexplain_test_requests_total 7" in metrics.render()
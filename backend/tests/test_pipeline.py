@@ -0,0 +1,105 @@
+import threading
+import time
+
+from ml import pipeline
+
+
+def test_summary_and_clauses_run_concurrently(monkeypatch):
+    both_started = threading.Barrier(2, timeout=2)
+
+    def fake_summary(text):
+        both_started.wait()
+        return ["point"]
+
+    def fake_clauses(text):
+        both_started.wait()
+        return [{"id": str(i), "title": f"Clause {i}", "explanation": "..."} for i in range(5)]
+
+    def fake_risk(clauses):
+        for clause in clauses:
+            clause["riskLevel"] = "Low"
+            clause["riskJustification"] = "ok"
+        return clauses
+
+    monkeypatch.setattr(pipeline, "generate_summary_with_gemini", fake_summary)
+    monkeypatch.setattr(pipeline, "generate_clause_explanations_with_gemini", fake_clauses)
+    monkeypatch.setattr(pipeline, "generate_risk_scores_with_gemini", fake_risk)
+
+    result = pipeline.run_analysis_pipeline("text", pipeline.StageScheduler())
+
+    assert result["summary"] == ["point"]
+    assert [c["id"] for c in result["clauses"]] == ["0", "1", "2", "3", "4"]
+    assert all(c["riskLevel"] == "Low" for c in result["clauses"])
+
+
+def test_stage_timeout_returns_fallback(monkeypatch):
+    monkeypatch.setattr(pipeline, "generate_summary_with_gemini", lambda text: time.sleep(0.5) or ["late"])
+    monkeypatch.setattr(pipeline, "generate_clause_explanations_with_gemini", lambda text: [])
+    monkeypatch.setattr(pipeline, "generate_risk_scores_with_gemini", lambda clauses: clauses)
+
+    result = pipeline.run_analysis_pipeline("text", pipeline.StageScheduler(timeout=0.05))
+
+    assert result["summary"][0].startswith("Error:")
+    assert result["clauses"] == []
+
+
+
+def test_stage_timeout_counts_from_when_the_stage_starts_running(monkeypatch):
+    monkeypatch.setattr(pipeline.StageScheduler, "POLL_SECONDS", 0.02)
+    executor = pipeline.ThreadPoolExecutor(max_workers=1)
+    scheduler = pipeline.StageScheduler(executor, timeout=0.3, request_timeout=0.8)
+    scheduler.submit("first", lambda: time.sleep(0.2) or "first")
+    scheduler.submit("queued", lambda: time.sleep(0.2) or "queued")
+
+    # "queued" waits 0.2s behind "first" and then needs 0.2s itself, more than its 0.3s timeout in
+    # total, so it only succeeds if the wait does not count against it.
+    assert scheduler.result("first", lambda: "timeout") == "first"
+    assert scheduler.result("queued", lambda: "timeout") == "queued"
+
+    blocked = pipeline.StageScheduler(executor, timeout=5, request_timeout=0.1)
+    blocked.submit("blocker", time.sleep, 0.3)
+    blocked.submit("waiting", lambda: "waiting")
+    started = time.monotonic()
+    assert blocked.result("waiting", lambda: "timeout") == "timeout"
+    assert time.monotonic() - started < 0.3
+    executor.shutdown()
+
+def test_long_documents_are_analyzed_per_segment_and_merged(monkeypatch):
+    merged_inputs = []
+    monkeypatch.setattr(pipeline, "generate_summary_with_gemini", lambda text: [text.split("\n", 1)[0]])
+    monkeypatch.setattr(pipeline, "merge_summaries_with_gemini", lambda points: merged_inputs.append(points) or ["merged"])
+    monkeypatch.setattr(pipeline, "generate_clause_explanations_with_gemini",
+                        lambda text: [{"id": "1", "title": text.split("\n", 1)[0], "explanation": "..."}])
+    monkeypatch.setattr(pipeline, "generate_risk_scores_with_gemini",
+                        lambda clauses: [dict(c, riskLevel="Low", riskJustification="ok") for c in clauses])
+    monkeypatch.setattr(pipeline, "MAP_REDUCE_THRESHOLD_CHARS", 100)
+    text = "\n".join(f"{i}. Section {i}\nThe parties agree to term {i}. " + "x " * 40 for i in range(1, 4))
+
+    result = pipeline.run_map_reduce_pipeline(text, pipeline.StageScheduler(), max_chars=200)
+
+    assert result["summary"] == ["merged"]
+    assert merged_inputs == [["1. Section 1", "2. Section 2", "3. Section 3"]]
+    assert [c["id"] for c in result["clauses"]] == ["1-1", "2-1", "3-1"]
+    assert all(c["riskLevel"] == "Low" for c in result["clauses"])
+
+
+def test_pipeline_emits_events_as_parts_complete(monkeypatch):
+    def fake_stream_summary(text, on_token):
+        on_token("- point")
+        return ["point"]
+
+    monkeypatch.setattr(pipeline, "stream_summary_with_gemini", fake_stream_summary)
+    monkeypatch.setattr(pipeline, "generate_clause_explanations_with_gemini",
+                        lambda text: [{"id": "1", "title": "Term", "explanation": "..."}])
+    monkeypatch.setattr(pipeline, "generate_risk_scores_with_gemini",
+                        lambda clauses: [dict(c, riskLevel="High", riskJustification="why") for c in clauses])
+    events = []
+
+    result = pipeline.run_analysis_pipeline("text", pipeline.StageScheduler(), on_event=lambda n, p: events.append((n, p)))
+
+    names = [name for name, _ in events]
+    assert names.count("summary_token") == 1
+    assert ("summary", {"summary": ["point"]}) in events
+    assert names.index("clause") < names.index("risk")
+    assert events[-1] == ("risk", {"id": "1", "riskLevel": "High", "riskJustification": "why"})
+    assert result["clauses"][0]["riskLevel"] == "High"
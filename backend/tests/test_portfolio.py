@@ -0,0 +1,97 @@
+import io
+import json
+
+from bench.documents import make_docx, make_scanned_pdf, synthetic_contract
+from ml import portfolio
+from services import docai
+
+DOCX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_portfolio_streams_every_document_and_resumes_without_reprocessing(client, monkeypatch):
+    for filename, content, mime_type in [
+        ("a.docx", make_docx(synthetic_contract("a")), DOCX_MIME_TYPE),
+        ("b.docx", make_docx(synthetic_contract("b")), DOCX_MIME_TYPE),
+        ("scan.pdf", make_scanned_pdf("c", pages=2), "application/pdf"),
+    ]:
+        assert client.post("/api/upload/", data={"file": (io.BytesIO(content), filename, mime_type)}).status_code == 200
+    batches = []
+    batch_parse = docai.batch_parse_documents
+    monkeypatch.setattr(docai, "batch_parse_documents", lambda documents: batches.append(documents) or batch_parse(documents))
+
+    response = client.post("/api/portfolio/", json={"gcs_prefix": "gs://lexplain-storage/documents/"})
+    lines = _lines(response)
+
+    assert response.mimetype == "application/x-ndjson"
+    header, documents, done = lines[0], [l for l in lines if l["event"] == "document"], lines[-1]
+    assert header["total"] == 3
+    assert sorted(d["seq"] for d in documents) == [1, 2, 3]
+    assert all(d["status"] == "succeeded" and d["clauses"] for d in documents)
+    assert done == {"event": "done", "total": 3, "succeeded": 3, "failed": 0, "expired": 0}
+    # Only the scanned PDF needs OCR, and it goes through batch processing.
+    assert [[uri.endswith(".pdf") for uri, _ in batch] for batch in batches] == [[True]]
+
+    resumed = _lines(client.get(f"/api/portfolio/{header['portfolioId']}?after=1"))
+
+    assert sorted(l["seq"] for l in resumed if l["event"] == "document") == [2, 3]
+    assert len(batches) == 1
+
+
+def test_resolve_documents_validates_inputs():
+    documents, error = portfolio.resolve_documents({"gcs_uris": [
+        "gs://bucket/a.pdf", {"gcs_uri": "gs://bucket/b", "mime_type": "image/png"}, "gs://bucket/a.pdf",
+    ]})
+    assert error is None
+    assert documents == [{"gcs_uri": "gs://bucket/a.pdf", "mime_type": "application/pdf"},
+                         {"gcs_uri": "gs://bucket/b", "mime_type": "image/png"}]
+
+    assert portfolio.resolve_documents({"gcs_uris": ["gs://bucket/notes.txt"]})[1].startswith("Unsupported")
+    assert portfolio.resolve_documents({})[1]
+
+
+def test_concurrent_runs_merge_results_and_number_retries_after_failures(monkeypatch):
+    monkeypatch.setattr(portfolio, "get_session", lambda document_id: {"analysis": {}})
+    documents = [{"gcs_uri": f"gs://bucket/{name}.pdf", "mime_type": "application/pdf"} for name in "abc"]
+    portfolio_id = portfolio.create_portfolio(documents)
+    portfolio._store().update(portfolio_id, lambda record: {**record, "results": {
+        "gs://bucket/a.pdf": {"seq": 1, "gcsUri": "gs://bucket/a.pdf", "status": "succeeded", "documentId": "x"},
+        "gs://bucket/b.pdf": {"seq": 2, "gcsUri": "gs://bucket/b.pdf", "status": "failed", "error": "..."},
+    }})
+    # The same portfolio resumed on two workers at once.
+    first = portfolio.PortfolioRun(portfolio_id, portfolio.get_portfolio(portfolio_id))
+    second = portfolio.PortfolioRun(portfolio_id, portfolio.get_portfolio(portfolio_id))
+    assert [d["gcs_uri"] for d in first.pending] == ["gs://bucket/b.pdf", "gs://bucket/c.pdf"]
+
+    first._finish(documents[1], status="succeeded", documentId="y")
+    second._finish(documents[2], status="succeeded", documentId="z")
+    second._finish(documents[1], status="succeeded", documentId="duplicate")
+
+    results = portfolio.get_portfolio(portfolio_id)["results"]
+    assert {uri[-5:]: (r["seq"], r["documentId"]) for uri, r in results.items()} == {
+        "a.pdf": (1, "x"), "b.pdf": (5, "y"), "c.pdf": (4, "z"),
+    }
+    assert [r["seq"] for r in first.results] == [1, 3]
+
+
+def test_documents_whose_session_expired_are_reported_and_analyzed_again_on_resume(monkeypatch):
+    live = {"x": {"analysis": {"summary": ["s"], "clauses": []}}, "y": {"analysis": {"summary": ["s"], "clauses": []}}}
+    monkeypatch.setattr(portfolio, "get_session", live.get)
+    documents = [{"gcs_uri": f"gs://bucket/{name}.pdf", "mime_type": "application/pdf"} for name in "ab"]
+    portfolio_id = portfolio.create_portfolio(documents)
+    portfolio._store().update(portfolio_id, lambda record: {**record, "results": {
+        f"gs://bucket/{name}.pdf": {"seq": seq, "gcsUri": f"gs://bucket/{name}.pdf", "status": "succeeded", "documentId": document_id}
+        for seq, name, document_id in [(1, "a", "x"), (2, "b", "y")]
+    }})
+    run = portfolio.PortfolioRun(portfolio_id, portfolio.get_portfolio(portfolio_id))
+    del live["y"]
+
+    lines = list(run.stream())
+
+    assert [l["status"] for l in lines if l["event"] == "document"] == ["succeeded", "expired"]
+    assert lines[-1] == {"event": "done", "total": 2, "succeeded": 1, "failed": 0, "expired": 1}
+    resumed = portfolio.PortfolioRun(portfolio_id, portfolio.get_portfolio(portfolio_id))
+    assert [d["gcs_uri"] for d in resumed.pending] == ["gs://bucket/b.pdf"]
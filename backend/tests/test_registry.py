@@ -0,0 +1,34 @@
+import threading
+
+from services import registry
+
+
+def test_service_is_constructed_once_on_first_use():
+    built = []
+    registry.register("test-lazy", lambda: built.append(object()) or built[-1])
+    assert built == []
+
+    instances = []
+    threads = [threading.Thread(target=lambda: instances.append(registry.get("test-lazy"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(built) == 1
+    assert all(instance is built[0] for instance in instances)
+    assert "test-lazy" in registry.startup_report()["services"]
+
+    fake = object()
+    registry.override("test-lazy", fake)
+    assert registry.get("test-lazy") is fake
+    registry.reset("test-lazy")
+
+
+def test_app_imports_without_credentials():
+    import app
+
+    response = app.app.test_client().get("/api/startup")
+    assert response.status_code == 200
+    assert "app_import" in response.get_json()["phases"]
+    assert {"docai", "gemini", "storage", "translate"} <= set(response.get_json()["registered"])
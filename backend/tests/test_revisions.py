@@ -0,0 +1,98 @@
+from ml import pipeline, revisions, risk_engine
+
+BASE = (
+    "1. Payment\nThe client pays the invoice within thirty days of receipt.\n"
+    "2. Delivery\nThe supplier delivers the goods to the client's warehouse.\n"
+    "3. Notices\nNotices are sent by email to the addresses on the first page.\n"
+    "4. Term\nThis agreement lasts for two years from the effective date.\n"
+)
+
+
+def test_diff_detects_edits_insertions_and_removals_but_not_renumbering():
+    revised = (
+        "1. Scope\nThe supplier provides maintenance services for the delivered goods.\n"
+        "2. Payment\nThe client pays the invoice within thirty days of receipt.\n"
+        "3. Delivery\nThe supplier delivers the goods to the client's main warehouse.\n"
+        "5. Term\nThis agreement lasts for two years from the effective date.\n"
+    )
+
+    changes = revisions.diff_units(revisions.clause_units(BASE), revisions.clause_units(revised))
+
+    assert [(c["status"], c["previousIndex"], c["index"]) for c in changes] == [
+        ("added", None, 0),
+        ("unchanged", 0, 1),
+        ("modified", 1, 2),
+        ("removed", 2, None),
+        ("unchanged", 3, 3),
+    ]
+
+
+def _fake_gemini(monkeypatch, explained, summarized):
+    monkeypatch.setattr(risk_engine, "RISK_MODEL_PATH", "/nonexistent/risk_model.pkl")
+
+    def fake_sections(sections):
+        explained.append([s["section"] for s in sections])
+        return [{"section": s["section"], "id": "1", "title": s["text"].split("\n", 1)[0],
+                 "explanation": "The parties agree on this."} for s in sections]
+
+    monkeypatch.setattr(revisions, "explain_sections_with_gemini", fake_sections)
+    monkeypatch.setattr(pipeline, "generate_summary_with_gemini", lambda text: summarized.append(text) or ["new"])
+    monkeypatch.setattr(pipeline, "merge_summaries_with_gemini", lambda points: ["merged"])
+    monkeypatch.setattr(pipeline, "generate_risk_scores_with_gemini",
+                        lambda clauses: [dict(c, riskLevel="Low", riskJustification="ok") for c in clauses])
+
+
+TITLES = ["Payment", "Delivery", "Notices", "Term"] + [f"Schedule Item {i}" for i in range(5, 13)]
+LONG_BASE = BASE + "".join(f"{i}. Schedule Item {i}\nThe supplier performs task {i} each month.\n" for i in range(5, 13))
+PREVIOUS = {
+    "text": LONG_BASE,
+    "analysis": {"summary": ["old"], "clauses": [
+        {"id": str(i), "title": title, "explanation": "...", "riskLevel": "Low", "riskJustification": "ok"}
+        for i, title in enumerate(TITLES, start=1)
+    ]},
+}
+
+
+def test_revision_reanalyzes_only_changed_clauses_in_one_call_and_keeps_the_summary(monkeypatch):
+    explained, summarized = [], []
+    _fake_gemini(monkeypatch, explained, summarized)
+    revised = LONG_BASE.replace("within thirty days", "within thirty calendar days").replace("two years", "three years")
+
+    analysis, units, revision = revisions.analyze_revision(revised, PREVIOUS, pipeline.StageScheduler())
+
+    assert explained == [[0, 3]]
+    assert summarized == [] and analysis["summary"] == ["old"]
+    assert [c["title"] for c in analysis["clauses"]] == ["1. Payment", "Delivery", "Notices", "4. Term"] + TITLES[4:]
+    assert [c["id"] for c in analysis["clauses"]] == [str(i) for i in range(1, 13)]
+    assert revision["incremental"] and revision["counts"]["modified"] == 2 and revision["clausesReanalyzed"] == 2
+    assert [u["clauses"] for u in units][1:3] == [[c] for c in analysis["clauses"][1:3]]
+
+
+def test_material_revision_of_a_long_document_is_summarized_per_segment(monkeypatch):
+    explained, summarized = [], []
+    _fake_gemini(monkeypatch, explained, summarized)
+    monkeypatch.setattr(pipeline, "MAP_REDUCE_THRESHOLD_CHARS", 300)
+    monkeypatch.setattr(pipeline, "SEGMENT_MAX_CHARS", 300)
+    revised = LONG_BASE.replace("4. Term\nThis agreement lasts for two years from the effective date.",
+                                "4. Exclusivity\nThe client buys these goods from no other supplier.")
+
+    analysis, _, revision = revisions.analyze_revision(revised, PREVIOUS, pipeline.StageScheduler())
+
+    assert revision["summaryRegenerated"] and analysis["summary"] == ["merged"]
+    assert len(summarized) > 1 and all(len(text) <= 300 for text in summarized)
+
+
+def test_previous_analysis_with_only_error_clauses_is_not_reused(monkeypatch):
+    analyzed = []
+    monkeypatch.setattr(revisions, "run_analysis_pipeline",
+                        lambda text, scheduler: analyzed.append(text) or {"summary": ["new"], "clauses": []})
+    previous = {"text": LONG_BASE, "analysis": {"summary": ["Error: ..."], "clauses": [
+        {"id": "error", "title": "Error Processing Clauses", "explanation": "..."},
+    ]}}
+    revised = LONG_BASE.replace("two years", "three years")
+
+    assert revisions.previous_unit_clauses(previous)[1] is None
+    analysis, _, revision = revisions.analyze_revision(revised, previous, pipeline.StageScheduler())
+
+    assert analyzed == [revised] and analysis["summary"] == ["new"]
+    assert not revision["incremental"]
@@ -0,0 +1,80 @@
+import random
+
+from ml import pipeline, risk_engine
+
+
+def test_obvious_clauses_are_scored_locally_and_ambiguous_ones_escalated(monkeypatch):
+    monkeypatch.setattr(risk_engine, "RISK_MODEL_PATH", "/nonexistent/risk_model.pkl")
+    clauses = [
+        {"id": "1", "title": "Governing Law", "explanation": "The laws of Delaware apply."},
+        {"id": "2", "title": "Automatic Renewal", "explanation": "The contract auto-renews every year."},
+        {"id": "3", "title": "Payment", "explanation": "The client pays monthly."},
+    ]
+
+    uncertain = risk_engine.prescore(clauses)
+
+    assert uncertain == [2]
+    assert clauses[0]["riskLevel"] == "Low"
+    assert clauses[1]["riskLevel"] == "High" and clauses[1]["riskJustification"]
+    assert "riskLevel" not in clauses[2]
+
+
+def test_generic_words_in_a_title_do_not_decide_a_risk_level(monkeypatch):
+    monkeypatch.setattr(risk_engine, "RISK_MODEL_PATH", "/nonexistent/risk_model.pkl")
+    clauses = [
+        {"id": "1", "title": "Conflicts of Interest", "explanation": "Each party discloses any conflict."},
+        {"id": "2", "title": "Term", "explanation": "The agreement terminates at the end of the second year."},
+        {"id": "3", "title": "Late Payment", "explanation": "Interest accrues on overdue invoices at 2% per month."},
+    ]
+
+    assert risk_engine.prescore(clauses) == [0, 1]
+    assert clauses[2]["riskLevel"] == "Medium"
+
+
+def test_pipeline_sends_only_uncertain_clauses_to_gemini(monkeypatch):
+    monkeypatch.setattr(risk_engine, "RISK_MODEL_PATH", "/nonexistent/risk_model.pkl")
+    sent = []
+
+    def fake_risk(clauses):
+        sent.extend(c["id"] for c in clauses)
+        return [dict(c, riskLevel="Medium", riskJustification="model") for c in clauses]
+
+    monkeypatch.setattr(pipeline, "generate_risk_scores_with_gemini", fake_risk)
+    clauses = [
+        {"id": "1", "title": "Headings", "explanation": "Headings are for convenience only."},
+        {"id": "2", "title": "Payment", "explanation": "The client pays monthly."},
+        {"id": "3", "title": "Indemnification", "explanation": "The contractor indemnifies the client."},
+    ]
+
+    result = pipeline.score_risks_in_batches(pipeline.StageScheduler(), clauses)
+
+    assert sent == ["2"]
+    assert [c["id"] for c in result] == ["1", "2", "3"]
+    assert [c["riskLevel"] for c in result] == ["Low", "Medium", "High"]
+
+
+def test_classifier_trained_on_recorded_assessments_is_used(monkeypatch, tmp_path):
+    examples_path, model_path = tmp_path / "examples.jsonl", tmp_path / "model.pkl"
+    monkeypatch.setattr(risk_engine, "RISK_EXAMPLES_PATH", str(examples_path))
+    monkeypatch.setattr(risk_engine, "_recorded", set())
+    rng = random.Random(0)
+    phrases = {"High": "the supplier may seize the equipment at any moment",
+               "Low": "the parties will meet for a quarterly review"}
+    risk_engine.record_assessments([
+        {"title": f"Clause {i}", "explanation": f"{phrases[level]} {rng.random()}", "riskLevel": level}
+        for i, level in enumerate(["High", "Low"] * 30)
+    ])
+
+    risk_engine.main(["train", "--examples", str(examples_path), "--model", str(model_path)])
+    monkeypatch.setattr(risk_engine, "RISK_MODEL_PATH", str(model_path))
+    clauses = [{"id": "1", "title": "Equipment", "explanation": "The supplier may seize the equipment at any moment."}]
+
+    assert risk_engine.prescore(clauses, threshold=0.6) == []
+    assert clauses[0]["riskLevel"] == "High"
+
+    # The lexicon leans Low ("Notices"); when the classifier outweighs it, the justification is not
+    # taken from the weaker High rule ("perpetual") that happened to match.
+    clauses = [{"id": "2", "title": "Notices", "explanation": "The supplier may seize the perpetual equipment at any moment."}]
+    assert risk_engine.prescore(clauses, threshold=0.4) == []
+    assert clauses[0]["riskLevel"] == "High"
+    assert clauses[0]["riskJustification"] == "Resembles clauses previously assessed as High risk."
@@ -0,0 +1,38 @@
+from utils.segmenter import is_boundary, iter_segments, split_clauses
+
+CONTRACT = """MASTER SERVICES AGREEMENT
+This agreement is made between Acme and Beta.
+1. Definitions
+"Services" means the services described in Schedule A.
+2. Payment
+2.1 Customer shall pay each invoice within thirty days.
+3. Termination
+Either party may terminate this agreement on written notice.
+"""
+
+
+def test_segments_start_at_section_boundaries():
+    segments = list(iter_segments(CONTRACT, max_chars=120))
+
+    assert [s.heading for s in segments] == ["MASTER SERVICES AGREEMENT", "1. Definitions", "2. Payment", "3. Termination"]
+    assert "".join(s.text for s in segments).replace("\n", "") == CONTRACT.replace("\n", "")
+
+
+def test_oversized_sections_split_at_sentences_within_budget():
+    text = "4. Liability\n" + "The supplier is liable for direct damages only. " * 20
+
+    segments = list(iter_segments(text, max_chars=200))
+
+    assert all(len(s.text) <= 200 for s in segments)
+    assert all(s.text.endswith(".") for s in segments)
+
+
+def test_wrapped_lines_starting_with_numbers_are_not_boundaries():
+    text = (
+        "2. Payment\nThe client pays the invoice within\n30 days of receipt, and late amounts bear\n"
+        "1.5 percent interest per month.\nSECTION 3 Termination\nEither party may terminate.\n"
+    )
+
+    assert not is_boundary("30 days after receipt of the invoice")
+    assert is_boundary("Article iv Remedies") and is_boundary("3.1 Fees")
+    assert [s.heading for s in split_clauses(text)] == ["2. Payment", "SECTION 3 Termination"]
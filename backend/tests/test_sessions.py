@@ -0,0 +1,28 @@
+import pytest
+
+from services import sessions
+from services.cache import content_hash
+
+
+def test_session_round_trip_and_text_resolution():
+    analysis = {"summary": ["s1"], "clauses": [{"id": "1", "title": "T", "explanation": "E", "riskJustification": "R"}]}
+    document_id = sessions.create_session("full text", analysis)
+
+    assert sessions.resolve_document_text({"documentId": document_id}) == ("full text", None)
+    assert sessions.translatable_texts(sessions.get_session(document_id)["analysis"]) == ["s1", "T", "E", "R"]
+
+
+def test_unknown_or_malformed_ids_are_rejected():
+    text, error = sessions.resolve_document_text({"documentId": "../../etc/passwd"})
+
+    assert text is None and error
+    assert sessions.resolve_document_text({"textContent": "inline"}) == ("inline", None)
+
+
+def test_sessions_are_decoded_once_and_carry_their_text_hash(monkeypatch):
+    document_id = sessions.create_session("full text", {"summary": [], "clauses": []})
+    first = sessions.get_session(document_id)
+    monkeypatch.setattr(sessions, "_store", lambda: pytest.fail("the session should not be decoded again"))
+
+    assert sessions.get_session(document_id) is first
+    assert sessions.resolve_document({"documentId": document_id}) == ("full text", content_hash("full text"), None)
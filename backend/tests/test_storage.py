@@ -0,0 +1,20 @@
+from bench.fakes import FakeStorageClient, ServiceProfile
+from services import registry, storage
+
+
+def test_bucket_handles_are_cached_per_client_and_listing_filters_by_prefix(tmp_path, monkeypatch):
+    monkeypatch.setattr(registry, "_instances", {})
+    client = FakeStorageClient(ServiceProfile(), root=str(tmp_path))
+    storage.set_storage_client(client)
+    bucket = storage.get_bucket("lexplain-storage")
+    for name in ["documents/a.pdf", "documents/b.docx", "other/c.pdf"]:
+        with bucket.blob(name).open("wb") as writer:
+            writer.write(b"content")
+
+    assert storage.get_bucket("lexplain-storage") is bucket
+    assert storage.list_objects("gs://lexplain-storage/documents/") == [
+        "gs://lexplain-storage/documents/a.pdf", "gs://lexplain-storage/documents/b.docx",
+    ]
+
+    storage.set_storage_client(FakeStorageClient(ServiceProfile(), root=str(tmp_path)))
+    assert storage.get_bucket("lexplain-storage") is not bucket
@@ -0,0 +1,33 @@
+from services import translation
+
+
+class FakeTranslateClient:
+    def __init__(self):
+        self.requests = []
+
+    def translate(self, values, target_language):
+        self.requests.append(list(values))
+        return [{"translatedText": f"{target_language}:{value}"} for value in values]
+
+
+def test_deduplicates_and_preserves_order():
+    client = FakeTranslateClient()
+
+    result = translation.translate_texts(["Governing  law", "Term", "Governing law", ""], "xx-dedupe", client=client)
+
+    assert result == ["xx-dedupe:Governing law", "xx-dedupe:Term", "xx-dedupe:Governing law", ""]
+    assert client.requests == [["Governing law", "Term"]]
+
+
+def test_repeat_translations_come_from_cache():
+    client = FakeTranslateClient()
+    translation.translate_texts(["Notices"], "xx-cache", client=client)
+
+    assert translation.translate_texts(["Notices"], "xx-cache", client=client) == ["xx-cache:Notices"]
+    assert len(client.requests) == 1
+
+
+def test_batches_respect_segment_and_character_limits():
+    batches = translation.pack_batches(["a" * 10] * 5 + ["b" * 50], max_segments=2, max_chars=25)
+
+    assert [len(batch) for batch in batches] == [2, 2, 1, 1]
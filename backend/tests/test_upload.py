@@ -0,0 +1,93 @@
+import hashlib
+import io
+
+import pytest
+
+from bench.fakes import FakeBlob, FakeStorageClient, ServiceProfile
+from routes import upload
+from routes.upload import upload_to_gcs
+
+CONTENT = b"%PDF-1.4 contract body"
+OBJECT_NAME = f"documents/{hashlib.sha256(CONTENT).hexdigest()}.pdf"
+
+
+class RawBody(io.BytesIO):
+    """A request body that, like a WSGI input stream, can only be read once."""
+
+    def seekable(self):
+        return False
+
+
+def _bucket(tmp_path):
+    return FakeStorageClient(ServiceProfile(), root=str(tmp_path)).bucket("lexplain-storage")
+
+
+def _count_writes(monkeypatch):
+    writes = []
+    open_blob = FakeBlob.open
+    monkeypatch.setattr(FakeBlob, "open", lambda blob, *args, **kwargs: writes.append(blob.name) or open_blob(blob, *args, **kwargs))
+    return writes
+
+
+def test_uploads_are_named_by_content_hash_and_stored_once(tmp_path, monkeypatch):
+    bucket = _bucket(tmp_path)
+    writes = _count_writes(monkeypatch)
+
+    first = upload_to_gcs(io.BytesIO(CONTENT), ".pdf", "application/pdf", bucket)
+    second = upload_to_gcs(io.BytesIO(CONTENT), ".pdf", "application/pdf", bucket)
+
+    assert first == (f"gs://lexplain-storage/{OBJECT_NAME}", "application/pdf", False)
+    assert second == (f"gs://lexplain-storage/{OBJECT_NAME}", "application/pdf", True)
+    assert writes == [OBJECT_NAME]
+    assert bucket.blob(OBJECT_NAME).download_as_bytes() == CONTENT
+
+
+def test_losing_the_upload_race_counts_as_a_duplicate(tmp_path, monkeypatch):
+    bucket = _bucket(tmp_path)
+    upload_to_gcs(io.BytesIO(CONTENT), ".pdf", "application/pdf", bucket)
+    # Another request stores the same content between the existence check and the write.
+    monkeypatch.setattr(upload, "_get_blob", lambda bucket, name: None)
+
+    result = upload_to_gcs(io.BytesIO(CONTENT), ".pdf", "application/pdf", bucket)
+
+    assert result == (f"gs://lexplain-storage/{OBJECT_NAME}", "application/pdf", True)
+    assert bucket.blob(OBJECT_NAME).download_as_bytes() == CONTENT
+
+
+def test_raw_bodies_are_staged_then_copied_to_their_content_hash(tmp_path, monkeypatch):
+    bucket = _bucket(tmp_path)
+    writes = _count_writes(monkeypatch)
+
+    first = upload_to_gcs(RawBody(CONTENT), ".pdf", "application/pdf", bucket)
+    second = upload_to_gcs(RawBody(CONTENT), ".pdf", "application/pdf", bucket)
+
+    assert [first[2], second[2]] == [False, True]
+    assert first[0] == second[0] == f"gs://lexplain-storage/{OBJECT_NAME}"
+    assert [name.split("/")[0] for name in writes] == ["incoming", "documents", "incoming"]
+    assert bucket.blob(OBJECT_NAME).download_as_bytes() == CONTENT
+    # Staging objects are removed whether or not the content was new.
+    assert not list(tmp_path.glob("lexplain-storage/incoming/*"))
+
+
+def test_failed_copy_still_removes_the_staging_object(tmp_path, monkeypatch):
+    bucket = _bucket(tmp_path)
+
+    def failing_copy(*args):
+        raise OSError("copy failed")
+
+    monkeypatch.setattr(bucket, "copy_blob", failing_copy)
+
+    with pytest.raises(OSError):
+        upload_to_gcs(RawBody(CONTENT), ".pdf", "application/pdf", bucket)
+
+    assert not list(tmp_path.glob("lexplain-storage/incoming/*"))
+
+
+def test_extension_case_does_not_defeat_deduplication(client):
+    for filename, content_type in [("x.PDF", "application/pdf"), ("x.pdf", "application/pdf"),
+                                   ("notes.TXT", "text/plain"), ("notes.txt", "text/plain")]:
+        response = client.post("/api/upload/", data={"file": (io.BytesIO(CONTENT), filename, content_type)})
+        assert response.status_code == 200
+        uri = response.get_json()["gcs_uri"]
+        assert uri.endswith(".pdf" if content_type == "application/pdf" else ".txt")
+        assert response.get_json()["deduplicated"] == filename.islower()
@@ -0,0 +1,26 @@
+from services import embeddings, vector_search
+from services.embeddings import HashingEmbeddingProvider
+from services.vector_search import VectorIndex
+
+
+def test_index_returns_most_similar_chunk_first():
+    provider = HashingEmbeddingProvider()
+    chunks = ["payment is due within thirty days", "either party may terminate this agreement", "governing law is delaware"]
+    index = VectorIndex(chunks, provider.embed(chunks))
+
+    hits = index.search(provider.embed(["how can a party terminate the agreement"])[0], k=2)
+
+    assert hits[0][0] == 1
+    assert len(hits) == 2
+
+
+def test_retrieve_context_sends_only_relevant_passages(monkeypatch):
+    monkeypatch.setattr(embeddings, "_provider", HashingEmbeddingProvider())
+    monkeypatch.setattr(vector_search, "RETRIEVAL_MIN_CHARS", 100)
+    filler = " ".join(f"Section {i}. The supplier shall deliver widgets on schedule." for i in range(200))
+    text = filler + " Termination. Either party may terminate with ninety days written notice."
+
+    context = vector_search.retrieve_context(text, "What notice is required to terminate?", k=2)
+
+    assert "ninety days written notice" in context
+    assert len(context) < len(text) / 4
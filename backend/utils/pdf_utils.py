@@ -1,3 +1,18 @@
-def chunk_pdf_text(text: str, chunk_size=500):
-    # Splits text into smaller pieces
-    return [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
+def chunk_pdf_text(text: str, chunk_size=500, overlap=0):
+    # Splits text into pieces of at most chunk_size characters, preferring to cut at whitespace.
+    # Consecutive chunks share `overlap` characters so a sentence cut at a boundary appears whole in one of them.
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            cut = text.rfind(" ", start + overlap + 1, end)
+            if cut != -1:
+                end = cut
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
@@ -0,0 +1,114 @@
+import io
+import re
+from typing import NamedTuple
+
+from utils.pdf_utils import chunk_pdf_text
+
+# --- BOUNDARY PATTERNS ---
+# A new structural unit starts at a line that looks like a numbered section, a heading or a definition.
+# Only the keyword form is case-insensitive: a numbered heading must continue with a capital letter,
+# so a hard-wrapped line such as "30 days after receipt" is not mistaken for one.
+NUMBERED_SECTION = re.compile(
+    r"^\s*(?:(?i:(?:article|section|clause|schedule|exhibit|annex|appendix)\s+[0-9ivxlc]+)(?:\.\d+)*\b"
+    r"|\d+(?:\.\d+)*[.)]?\s+[A-Z])"
+)
+CAPS_HEADING = re.compile(r"^\s*[A-Z][A-Z0-9 ,&'/\-]{3,79}:?\s*$")
+DEFINITION = re.compile(r"^\s*[\"“][A-Z][^\"”]{0,79}[\"”]\s+(?:means|shall mean|has the meaning|includes)\b")
+SENTENCE_END = re.compile(r"(?<=[.;:])\s+")
+
+
+class Segment(NamedTuple):
+    index: int
+    heading: str
+    text: str
+
+
+def is_boundary(line: str) -> bool:
+    return bool(NUMBERED_SECTION.match(line) or CAPS_HEADING.match(line) or DEFINITION.match(line))
+
+
+def _is_bare_heading(line: str) -> bool:
+    stripped = line.strip()
+    return is_boundary(line) and len(stripped) <= 60 and not stripped.endswith((".", ";"))
+
+
+def _iter_units(lines):
+    """Groups lines into structural units, each starting at a boundary line."""
+    unit, has_body = [], False
+    for line in lines:
+        # A bare heading ("2. Payment") stays attached to the body that follows it.
+        if has_body and is_boundary(line):
+            yield "".join(unit)
+            unit, has_body = [], False
+        unit.append(line)
+        if line.strip() and not _is_bare_heading(line):
+            has_body = True
+    if unit:
+        yield "".join(unit)
+
+
+def _split_oversized(unit: str, max_chars: int):
+    """Splits a unit larger than the budget at sentence ends, then at whitespace."""
+    pieces, current = [], ""
+    for sentence in SENTENCE_END.split(unit):
+        if len(sentence) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.extend(chunk_pdf_text(sentence, chunk_size=max_chars))
+        elif len(current) + len(sentence) + 1 > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def iter_segments(text, max_chars=20000):
+    """
+    Streams a document into segments of at most `max_chars`, cutting only at section,
+    heading or definition boundaries where possible. Small units are packed together;
+    a unit larger than the budget is split at sentence ends.
+    `text` may be a string or any iterable of lines (e.g. pages read incrementally).
+    """
+    lines = io.StringIO(text) if isinstance(text, str) else text
+    index = 0
+    buffer = ""
+
+    def make_segment(body):
+        first_line = body.strip().split("\n", 1)[0]
+        heading = first_line[:120] if is_boundary(first_line) else ""
+        return Segment(index, heading, body.strip())
+
+    for unit in _iter_units(lines):
+        if len(buffer) + len(unit) <= max_chars:
+            buffer += unit
+            continue
+        if buffer.strip():
+            yield make_segment(buffer)
+            index += 1
+        buffer = ""
+        if len(unit) <= max_chars:
+            buffer = unit
+            continue
+        for piece in _split_oversized(unit, max_chars):
+            if piece.strip():
+                yield make_segment(piece)
+                index += 1
+    if buffer.strip():
+        yield make_segment(buffer)
+
+
+def split_clauses(text: str) -> list:
+    """Splits a document into its structural units (sections, headings, definitions), without packing or size limits."""
+    clauses = []
+    for unit in _iter_units(io.StringIO(text)):
+        body = unit.strip()
+        if not body:
+            continue
+        first_line = body.split("\n", 1)[0]
+        heading = first_line[:120] if is_boundary(first_line) else ""
+        clauses.append(Segment(len(clauses), heading, body))
+    return clauses
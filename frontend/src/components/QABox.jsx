@@ -1,7 +1,7 @@
 import { useState } from 'react';
 import { askQuestion } from '../lib/api'; // Import the API function
 
-function QABox({ docText }) { 
+function QABox({ documentId, docText }) { 
   const [question, setQuestion] = useState('');
   const [answer, setAnswer] = useState('');
   const [loading, setLoading] = useState(false);
@@ -18,7 +18,7 @@ function QABox({ docText }) {
     setAnswer('');
 
     try {
-      const data = await askQuestion(question, docText); // Use the imported function
+      const data = await askQuestion(question, documentId, docText); // Use the imported function
       setAnswer(data.answer);
 
     } catch (err) {
@@ -29,7 +29,9 @@ const apiFetch = async (endpoint, options = {}) => {
   if (!response.ok) {
     // Try to parse a JSON error message from the backend, otherwise use the status text.
     const errorData = await response.json().catch(() => ({ error: response.statusText }));
-    throw new Error(errorData.error || 'An unknown API error occurred.');
+    const error = new Error(errorData.error || 'An unknown API error occurred.');
+    error.status = response.status;
+    throw error;
   }
 
   // Handle cases where the response might not have a body (like a 204 No Content)
@@ -42,6 +44,28 @@ const apiFetch = async (endpoint, options = {}) => {
 };
 
 
+/**
+ * Refers to a document by its server-side session ID, falling back to the full text
+ * only if the session has expired (404). This keeps request payloads small for large documents.
+ * @param {string|undefined} documentId - The documentId returned by /api/analyze.
+ * @param {string|undefined} textContent - The full text of the document.
+ * @param {(docRef: object) => Promise<any>} send - Performs the request with the given document reference.
+ */
+const withDocumentRef = async (documentId, textContent, send) => {
+  if (!documentId) {
+    return send({ textContent });
+  }
+  try {
+    return await send({ documentId });
+  } catch (error) {
+    if (error.status === 404 && textContent) {
+      return send({ textContent });
+    }
+    throw error;
+  }
+};
+
+
 // --- API SERVICE FUNCTIONS ---
 
 /**
@@ -80,17 +104,53 @@ export const analyzeDocument = async (gcs_uri, mime_type) => {
 };
 
 /**
- * Asks a question about the document text.
+ * Streams the analysis of a document via Server-Sent Events so results render as they arrive.
+ * @param {string} gcs_uri - The GCS URI returned from the upload step.
+ * @param {string} mime_type - The mime type of the uploaded file.
+ * @param {object} handlers - Callbacks keyed by event name: text, summary_token, summary, clause, risk, done, error.
+ * @returns {() => void} A function that closes the stream.
+ */
+export const streamAnalyzeDocument = (gcs_uri, mime_type, handlers) => {
+  const params = new URLSearchParams({ gcs_uri, mime_type });
+  const source = new EventSource(`${API_BASE_URL}/api/analyze/stream?${params.toString()}`);
+  let finished = false;
+
+  ['text', 'summary_token', 'summary', 'clause', 'risk'].forEach((name) => {
+    source.addEventListener(name, (event) => handlers[name]?.(JSON.parse(event.data)));
+  });
+  source.addEventListener('done', (event) => {
+    finished = true;
+    source.close();
+    handlers.done?.(JSON.parse(event.data));
+  });
+  // Named "error" events come from the backend; plain error events mean the connection failed.
+  source.addEventListener('error', (event) => {
+    if (finished) return;
+    finished = true;
+    source.close();
+    const message = event.data ? JSON.parse(event.data).error : 'The analysis stream was interrupted.';
+    handlers.error?.(new Error(message));
+  });
+
+  return () => {
+    finished = true;
+    source.close();
+  };
+};
+
+/**
+ * Asks a question about an analyzed document.
  * @param {string} question - The user's question.
- * @param {string} textContent - The full text of the document.
+ * @param {string} documentId - The documentId returned by /api/analyze.
+ * @param {string} [textContent] - The full text, only sent if the session has expired.
  * @returns {Promise<{answer: string}>}
  */
-export const askQuestion = async (question, textContent) => {
-  return apiFetch('/api/qa/', { // Added trailing slash for consistency
+export const askQuestion = async (question, documentId, textContent) => {
+  return withDocumentRef(documentId, textContent, (docRef) => apiFetch('/api/qa/', { // Added trailing slash for consistency
     method: 'POST',
     headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ question, textContent }),
-  });
+    body: JSON.stringify({ question, ...docRef }),
+  }));
 };
 
 /**
@@ -107,17 +167,33 @@ export const translateTexts = async (texts, target) => {
   });
 };
 
+/**
+ * Translates an analyzed document's summary, clause titles, explanations and risk justifications.
+ * The backend reads them from the document session, so only the ID is sent.
+ * @param {string} documentId - The documentId returned by /api/analyze.
+ * @param {string} target - The target language code (e.g., 'es', 'fr', 'hi').
+ * @returns {Promise<{translated_texts: string[]}>}
+ */
+export const translateDocument = async (documentId, target) => {
+  return apiFetch('/api/translate/', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ documentId, target }),
+  });
+};
+
 /**
  * Requests the checklist for the document and triggers a download.
- * @param {string} textContent - The full text of the document.
+ * @param {string} documentId - The documentId returned by /api/analyze.
+ * @param {string} [textContent] - The full text, only sent if the session has expired.
  */
-export const exportChecklist = async (textContent) => {
+export const exportChecklist = async (documentId, textContent) => {
   try {
-    const response = await apiFetch('/api/export/checklist', {
+    const response = await withDocumentRef(documentId, textContent, (docRef) => apiFetch('/api/export/checklist', {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ textContent }),
-    });
+      body: JSON.stringify(docRef),
+    }));
 
     const blob = await response.blob();
     const url = window.URL.createObjectURL(blob);
@@ -1,7 +1,7 @@
 import { useEffect, useState } from 'react';
 import { useSearchParams } from 'react-router-dom';
 import QABox from '../components/QABox';
-import { analyzeDocument, translateTexts, exportChecklist as apiExportChecklist } from '../lib/api'; // Import API functions
+import { streamAnalyzeDocument, translateTexts, translateDocument, exportChecklist as apiExportChecklist } from '../lib/api'; // Import API functions
 
 const getRiskColor = (riskLevel) => {
   switch (riskLevel?.toLowerCase()) {
@@ -23,6 +23,7 @@ function Dashboard() {
 
   const gcsUri = searchParams.get('gcs_uri');
   const mimeType = searchParams.get('mime_type');
+  const fileName = searchParams.get('filename') || gcsUri?.split('/').pop();
 
   useEffect(() => {
     if (!gcsUri) {
@@ -30,21 +31,44 @@ function Dashboard() {
       return;
     }
 
-    const doAnalyzeDocument = async () => {
-      setLoading(true);
-      setError(null);
-      try {
-        const data = await analyzeDocument(gcsUri, mimeType); // Use the imported function
+    setLoading(true);
+    setError(null);
+
+    // Results are rendered as they stream in; the loader only shows until the extracted text arrives.
+    let summaryDraft = '';
+    const updateDocData = (update) => {
+      setOriginalDocData((prev) => update(prev));
+      setDisplayDocData((prev) => update(prev));
+    };
+
+    const closeStream = streamAnalyzeDocument(gcsUri, mimeType, {
+      text: ({ originalText }) => {
+        setOriginalDocData({ originalText, summary: [], clauses: [] });
+        setDisplayDocData({ originalText, summary: [], clauses: [] });
+        setLoading(false);
+      },
+      summary_token: ({ text }) => {
+        summaryDraft += text;
+        updateDocData((prev) => ({ ...prev, summary: [summaryDraft] }));
+      },
+      summary: ({ summary }) => updateDocData((prev) => ({ ...prev, summary })),
+      clause: (clause) => updateDocData((prev) => ({ ...prev, clauses: [...prev.clauses, clause] })),
+      risk: (risk) => updateDocData((prev) => ({
+        ...prev,
+        clauses: prev.clauses.map((clause) => (clause.id === risk.id ? { ...clause, ...risk } : clause)),
+      })),
+      done: (data) => {
         setOriginalDocData(data);
         setDisplayDocData(data);
-      } catch (err) {
+        setLoading(false);
+      },
+      error: (err) => {
         setError(err.message);
-      } finally {
         setLoading(false);
-      }
-    };
+      },
+    });
 
-    doAnalyzeDocument();
+    return closeStream;
   }, [gcsUri, mimeType]);
 
   const handleLanguageChange = async (e) => {
@@ -66,7 +90,13 @@ function Dashboard() {
         ...originalDocData.clauses.map(c => c.riskJustification)
       ];
 
-      const { translated_texts } = await translateTexts(textsToTranslate, targetLang); // Use the imported function
+      // With a documentId the backend rebuilds this same list from the session, so the texts are not re-sent.
+      const { translated_texts } = originalDocData.documentId
+        ? await translateDocument(originalDocData.documentId, targetLang).catch((err) => {
+            if (err.status === 404) return translateTexts(textsToTranslate, targetLang);
+            throw err;
+          })
+        : await translateTexts(textsToTranslate, targetLang);
 
       let currentIndex = 0;
       const translatedSummary = translated_texts.slice(currentIndex, currentIndex + originalDocData.summary.length);
@@ -100,7 +130,7 @@ function Dashboard() {
   const handleExportChecklist = async () => {
     if (!originalDocData?.originalText) return;
     try {
-      await apiExportChecklist(originalDocData.originalText); 
+      await apiExportChecklist(originalDocData.documentId, originalDocData.originalText);
     } catch (err) {
       setError(`Export failed: ${err.message}`);
     }
@@ -127,7 +157,7 @@ function Dashboard() {
       <div className="page-header">
         <div>
           <h1>Document Analysis</h1>
-          <p>Showing results for: <strong>{gcsUri.split('/').pop()}</strong></p>
+          <p>Showing results for: <strong>{fileName}</strong></p>
         </div>
         <div className="header-controls">
           <select onChange={handleLanguageChange} disabled={isTranslating} className="language-selector">
@@ -171,7 +201,7 @@ function Dashboard() {
       
       <div className="analysis-card">
         <h3>Ask a Question</h3>
-        <QABox docText={originalDocData.originalText} />
+        <QABox documentId={originalDocData.documentId} docText={originalDocData.originalText} />
       </div>
     </div>
   );
@@ -24,7 +24,8 @@ function Upload() {
       
       const searchParams = new URLSearchParams({
         gcs_uri: uploadResult.gcs_uri,
-        mime_type: uploadResult.mime_type
+        mime_type: uploadResult.mime_type,
+        filename: file.name // Stored objects are named by content hash, so keep the original name for display
       });
       navigate(`/dashboard?${searchParams.toString()}`);
 